@@ -3,24 +3,39 @@ import pandas as pd
 from datetime import datetime, time
 import time as time_module
 from utils.excel_processor import ExcelProcessor
-from utils.api_client import SiigoAPI
-from utils.scheduler import TaskScheduler
+from utils.api_client import SiigoAPI, company_env
+from utils.scheduler import get_scheduler, SPREAD_MINUTES
+from utils.database import task_db
+from utils.blob_store import blob_store
+from utils.event_loop import run_sync
+from utils.processing import DocumentRecorder, process_documents
+from utils.profiling import profiled, list_profiles
+from utils.run_manager import get_run_manager
+from utils.preview import DataPreview
+from utils.catalog_search import CatalogIndex
 import os
-import asyncio
 
 # Initialize session state
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'api_client' not in st.session_state:
     st.session_state.api_client = None
-if 'scheduler' not in st.session_state:
-    st.session_state.scheduler = TaskScheduler()
 if 'schedule_time' not in st.session_state:
     st.session_state.schedule_time = time(9, 0)  # Default to 9:00 AM
 if 'cost_centers' not in st.session_state:
     st.session_state.cost_centers = None
 if 'document_types' not in st.session_state:
     st.session_state.document_types = None
+if 'catalog_indexes' not in st.session_state:
+    st.session_state.catalog_indexes = {}
+if 'last_run_id' not in st.session_state:
+    st.session_state.last_run_id = None
+
+RUNS_PAGE_SIZE = 20
+DOCUMENTS_PAGE_SIZE = 50
+PREVIEW_PAGE_SIZE = 100
+CATALOG_PAGE_SIZE = 50
+PROGRESS_POLL_SECONDS = 1
 
 def authenticate():
     """Authenticate with Siigo API"""
@@ -33,30 +48,192 @@ def authenticate():
         
     api_client = SiigoAPI(username, access_key)
     if api_client.authenticate():
+        # Scheduled runs of this company log in with its own credentials, not the last login's
+        os.environ[company_env('SIIGO_USERNAME', api_client.company_name)] = username
+        os.environ[company_env('SIIGO_ACCESS_KEY', api_client.company_name)] = access_key
         st.session_state.authenticated = True
         st.session_state.api_client = api_client
         return True
     return False
 
-def process_entries(df):
-    """Process journal entries"""
-    results = []
-    for doc_id, group in df.groupby('document_id'):
-        try:
-            payload = ExcelProcessor(None).format_entries_for_api(group)
-            response = st.session_state.api_client.create_journal_entry(payload)
-            results.append({
-                'document_id': doc_id,
-                'status': 'Success',
-                'response': response
-            })
-        except Exception as e:
-            results.append({
-                'document_id': doc_id,
-                'status': 'Failed',
-                'error': str(e)
-            })
-    return results
+def process_entries(df, file=None, profile=False):
+    """Start processing journal entries in the background, returning the run id"""
+    company_name = st.session_state.api_client.company_name
+    # Keep the upload so the run can be resumed if it is interrupted
+    file_hash = blob_store.put_file(file) if file is not None else None
+    recorder = DocumentRecorder(company_name, file_hash=file_hash)
+    return get_run_manager().start(
+        company_name, profiled(process_documents, company_name, force=profile),
+        df, st.session_state.api_client, recorder, expected=df['document_id'].nunique()
+    )
+
+def resume_run(run):
+    """Resume an interrupted manual run from its checkpoint in the background"""
+    recorder = DocumentRecorder.resume(run)
+    remaining = run['expected'] - run['total'] if run['expected'] else None
+    return get_run_manager().start(
+        run['company_name'], process_documents, blob_store.open(run['file_hash']),
+        st.session_state.api_client, recorder, expected=remaining
+    )
+
+def format_seconds(seconds):
+    """Format a duration for progress displays"""
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def render_progress(snapshot, key):
+    """Render a run's progress bar, counters and cancel button"""
+    fraction = min(snapshot['done'] / snapshot['expected'], 1.0) if snapshot['expected'] else 0.0
+    st.progress(fraction, text=f"{snapshot['done']} of {snapshot['expected'] or '?'} documents ({snapshot['state']})")
+    cols = st.columns(4)
+    cols[0].metric("Succeeded", snapshot['succeeded'])
+    cols[1].metric("Failed", snapshot['failed'])
+    cols[2].metric("Rate", f"{snapshot['rate_per_second']:.1f}/s")
+    cols[3].metric("ETA", format_seconds(snapshot['eta_seconds']))
+    if snapshot['state'] != 'cancelling' and st.button("Cancel Run", key=key):
+        get_run_manager().cancel(snapshot['run_id'])
+
+def render_run(run_id):
+    """Show live progress of a background run, then its results once it ends"""
+    progress = get_run_manager().get(run_id)
+    if progress is None:
+        return
+    polling = progress.finished_at is None
+    
+    def show():
+        snapshot = progress.snapshot()
+        if snapshot['state'] in ('queued', 'running', 'cancelling'):
+            render_progress(snapshot, key=f"cancel_run_{run_id}")
+            return
+        if polling:
+            # The run just ended; rerun the page once to stop polling
+            st.rerun()
+        if snapshot['state'] == 'failed':
+            st.error(f"Run failed: {snapshot['error']}")
+            return
+        if snapshot['state'] == 'cancelled':
+            st.warning("Run cancelled; it can be resumed from Interrupted Runs")
+        summary, pipeline_stats = progress.summary, progress.stats
+        if summary is None:
+            return
+        
+        # Display results
+        st.write(f"Processed {summary.total} documents in {format_seconds(snapshot['elapsed_seconds'])}:")
+        st.write(f"- ✅ {summary.succeeded} successful")
+        st.write(f"- ❌ {summary.failed} failed")
+        
+        if summary.recent_failures:
+            with st.expander(f"Latest Failures ({len(summary.recent_failures)})"):
+                for failure in summary.recent_failures:
+                    st.error(
+                        f"Document {failure['document_id']}: Failed\n"
+                        f"Error: {failure['error']}"
+                    )
+        
+        with st.expander("Pipeline Statistics"):
+            st.write(
+                f"Finished in {pipeline_stats['elapsed_seconds']}s; reading was held back "
+                f"{pipeline_stats['source']['blocked_seconds']}s by slower stages"
+            )
+            st.dataframe(
+                pd.DataFrame(pipeline_stats['stages']).T[[
+                    'workers', 'processed', 'errors', 'throughput_per_second',
+                    'busy_seconds', 'blocked_seconds', 'avg_queued', 'max_queued'
+                ]]
+            )
+    
+    st.fragment(run_every=PROGRESS_POLL_SECONDS if polling else None)(show)()
+
+def render_active_runs(company_name):
+    """Show live progress of every background run of the company"""
+    polling = bool(get_run_manager().list_runs(company_name, active_only=True))
+    
+    def show():
+        active = get_run_manager().list_runs(company_name, active_only=True)
+        if not active:
+            if polling:
+                st.rerun()
+            st.info("No runs in progress")
+            return
+        for snapshot in active:
+            st.write(f"Run {snapshot['run_id'][:8]} - {format_seconds(snapshot['elapsed_seconds'])} elapsed")
+            render_progress(snapshot, key=f"cancel_active_{snapshot['run_id']}")
+    
+    st.fragment(run_every=PROGRESS_POLL_SECONDS if polling else None)(show)()
+
+def page_cursor(key):
+    """Get the keyset cursor for the current page of a listing"""
+    return st.session_state.get(f'{key}_cursors', [None])[-1]
+
+def reset_pages(key):
+    """Go back to the first page of a listing"""
+    st.session_state[f'{key}_cursors'] = [None]
+
+def render_pager(key, rows, page_size):
+    """Render newer/older buttons for a keyset-paginated listing"""
+    cursors = st.session_state.setdefault(f'{key}_cursors', [None])
+    col_newer, col_older = st.columns(2)
+    with col_newer:
+        if len(cursors) > 1 and st.button("← Newer", key=f'{key}_newer'):
+            cursors.pop()
+            st.rerun()
+    with col_older:
+        if len(rows) == page_size and st.button("Older →", key=f'{key}_older'):
+            cursors.append(rows[-1]['id'])
+            st.rerun()
+
+def load_upload(uploaded_file):
+    """Read and validate an upload once, keeping it and its preview across reruns"""
+    upload = st.session_state.get('upload')
+    if upload is None or upload['file_id'] != uploaded_file.file_id:
+        df = ExcelProcessor(uploaded_file).read_excel()
+        upload = {'file_id': uploaded_file.file_id, 'df': df, 'preview': DataPreview(df)}
+        st.session_state.upload = upload
+        reset_preview_page()
+    return upload['df'], upload['preview']
+
+def reset_preview_page():
+    """Go back to the first page of the data preview"""
+    st.session_state.preview_page = 1
+
+@st.fragment
+def render_preview(preview):
+    """Render upload statistics and one filtered, sorted page of its rows"""
+    summary = preview.summary
+    totals = summary['totals_by_movement']
+    cols = st.columns(5)
+    cols[0].metric("Rows", summary['rows'])
+    cols[1].metric("Documents", summary['documents'])
+    cols[2].metric("Cost Centers", summary['cost_centers'])
+    cols[3].metric("Total Debit", f"{totals.get('Debit', 0):,.2f}")
+    cols[4].metric("Total Credit", f"{totals.get('Credit', 0):,.2f}")
+    
+    filter_cols = st.columns(4)
+    search = filter_cols[0].text_input("Search", key='preview_search', on_change=reset_preview_page)
+    movement = filter_cols[1].selectbox(
+        "Movement", ['All', 'Debit', 'Credit'], key='preview_movement', on_change=reset_preview_page
+    )
+    sort_by = filter_cols[2].selectbox(
+        "Sort by", [None] + list(preview.df.columns), key='preview_sort',
+        format_func=lambda column: 'File order' if column is None else column
+    )
+    descending = filter_cols[3].toggle("Descending", key='preview_descending')
+    
+    filters = {} if movement == 'All' else {'movement': movement}
+    _, matched = preview.page(1, PREVIEW_PAGE_SIZE, search, filters, sort_by, not descending)
+    pages = max(-(-matched // PREVIEW_PAGE_SIZE), 1)
+    if st.session_state.get('preview_page', 1) > pages:
+        reset_preview_page()
+    page = st.session_state.get('preview_page', 1)
+    rows, _ = preview.page(page, PREVIEW_PAGE_SIZE, search, filters, sort_by, not descending)
+    st.dataframe(rows, hide_index=True)
+    first = (page - 1) * PREVIEW_PAGE_SIZE
+    st.number_input(
+        f"Page (of {pages})", min_value=1, max_value=pages, key='preview_page',
+        help=f"Rows {first + 1 if matched else 0}-{first + len(rows)} of {matched} matching"
+    )
 
 def schedule_processing(file, time, frequency='daily', params=None):
     """Schedule file processing"""
@@ -67,23 +244,25 @@ def schedule_processing(file, time, frequency='daily', params=None):
         raise Exception("File required")
         
     # Schedule the task
-    schedule_info = st.session_state.scheduler.schedule_task(
+    schedule_info = get_scheduler().schedule_task(
         time=time,
         file=file,
         company_name=st.session_state.api_client.company_name,
         frequency=frequency,
         day_of_week=params.get('day_of_week') if params else None,
-        day_of_month=params.get('day_of_month') if params else None
+        day_of_month=params.get('day_of_month') if params else None,
+        spread_minutes=params.get('spread_minutes') if params else None
     )
     
     return schedule_info
 
-async def load_scheduled_tasks():
+def load_scheduled_tasks():
     """Load scheduled tasks from database"""
     if st.session_state.authenticated:
-        return await st.session_state.scheduler.get_scheduled_tasks(
+        scheduler = get_scheduler()
+        return scheduler.run(scheduler.get_scheduled_tasks(
             st.session_state.api_client.company_name
-        )
+        ))
     return []
 
 def load_catalogs():
@@ -92,9 +271,32 @@ def load_catalogs():
         try:
             st.session_state.cost_centers = st.session_state.api_client.get_cost_centers()
             st.session_state.document_types = st.session_state.api_client.get_document_types()
+            # Search indexes are built once per load, not on every search
+            st.session_state.catalog_indexes = {
+                'cost_centers': CatalogIndex(st.session_state.cost_centers),
+                'document_types': CatalogIndex(st.session_state.document_types)
+            }
         except Exception as e:
             st.error(f"Error loading catalogs: {str(e)}")
 
+@st.fragment
+def render_catalog(name, label):
+    """Render a ranked, paged search of one loaded catalog"""
+    index = st.session_state.catalog_indexes.get(name)
+    if index is None or index.df.empty:
+        st.info(f"No {label.lower()} found")
+        return
+    search = st.text_input(f"Search {label}", key=f'{name}_search',
+                           on_change=lambda: st.session_state.update({f'{name}_page': 1}))
+    _, matched = index.page(search, 1, CATALOG_PAGE_SIZE)
+    pages = max(-(-matched // CATALOG_PAGE_SIZE), 1)
+    if st.session_state.get(f'{name}_page', 1) > pages:
+        st.session_state[f'{name}_page'] = 1
+    rows, _ = index.page(search, st.session_state.get(f'{name}_page', 1), CATALOG_PAGE_SIZE)
+    st.dataframe(rows, hide_index=True)
+    st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key=f'{name}_page',
+                    help=f"{matched} matching {label.lower()}")
+
 def main():
     st.set_page_config(
         page_title="Siigo Journal Entry Processor",
@@ -123,7 +325,8 @@ def main():
                 st.error("❌ Authentication failed. Please check your credentials.")
         st.stop()  # Don't show rest of UI until authenticated
         
-    # Main interface
+    # Main interface; the shared scheduler starts with the first authenticated session
+    scheduler = get_scheduler()
     st.title(f"📊 Siigo Journal Entry Processor")
     st.caption(f"Connected as: {st.session_state.api_client.company_name}")
     
@@ -140,6 +343,27 @@ def main():
     with tab1:
         st.header("Upload and Process")
         
+        company_name = st.session_state.api_client.company_name
+        # A run in progress here is 'running' in the database too, but is not interrupted
+        in_progress = {run['run_id'] for run in get_run_manager().list_runs(company_name, active_only=True)}
+        interrupted = [
+            run for run in run_sync(task_db.get_resumable_runs(company_name, source='manual'))
+            if run['run_id'] not in in_progress
+        ]
+        if interrupted:
+            st.subheader("Interrupted Runs")
+            for run in interrupted:
+                with st.expander(f"Run {run['run_id'][:8]} ({run['state']}) - started {run['started_at']}"):
+                    st.write(f"Documents journaled: {run['total']} of {run['expected'] or '?'}")
+                    col1, col2 = st.columns(2)
+                    if col1.button("Resume", key=f"resume_{run['run_id']}"):
+                        st.session_state.last_run_id = resume_run(run)
+                        reset_pages('run_results')
+                        st.rerun()
+                    if col2.button("Discard", key=f"discard_{run['run_id']}"):
+                        run_sync(task_db.finish_processing_run(run['run_id'], run['company_name'], 'abandoned'))
+                        st.rerun()
+        
         # File upload
         uploaded_file = st.file_uploader(
             "Choose an Excel file",
@@ -149,39 +373,47 @@ def main():
         
         if uploaded_file:
             try:
-                processor = ExcelProcessor(uploaded_file)
-                df = processor.read_excel()
+                df, preview = load_upload(uploaded_file)
                 
                 st.success("✅ File validated successfully!")
                 
-                # Display preview
+                # Display preview; only one page of rows is sent to the browser
                 with st.expander("Preview Data"):
-                    st.dataframe(df)
+                    render_preview(preview)
                     
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.subheader("Process Now")
+                    profile_run = st.checkbox(
+                        "Profile this run",
+                        help="Record CPU hotspots and memory use; the report appears under Processing Status"
+                    )
                     if st.button("Process Entries", type="primary"):
-                        with st.spinner("Processing entries..."):
-                            results = process_entries(df)
-                            
-                            # Display results
-                            success_count = sum(1 for r in results if r['status'] == 'Success')
-                            st.write(f"Processed {len(results)} documents:")
-                            st.write(f"- ✅ {success_count} successful")
-                            st.write(f"- ❌ {len(results) - success_count} failed")
+                        st.session_state.last_run_id = process_entries(df, uploaded_file, profile=profile_run)
+                        reset_pages('run_results')
+                    
+                    if st.session_state.last_run_id:
+                        render_run(st.session_state.last_run_id)
                             
-                            # Show detailed results
-                            with st.expander("Detailed Results"):
-                                for result in results:
-                                    if result['status'] == 'Success':
-                                        st.success(f"Document {result['document_id']}: Success")
-                                    else:
-                                        st.error(
-                                            f"Document {result['document_id']}: Failed\n"
-                                            f"Error: {result['error']}"
-                                        )
+                    # Detailed results are paged from the database rather than kept in memory
+                    if st.session_state.last_run_id:
+                        with st.expander("Detailed Results"):
+                            run_results = run_sync(task_db.get_processed_documents(
+                                st.session_state.api_client.company_name,
+                                run_id=st.session_state.last_run_id,
+                                before_id=page_cursor('run_results'),
+                                limit=DOCUMENTS_PAGE_SIZE
+                            ))
+                            if run_results:
+                                st.dataframe(
+                                    pd.DataFrame(run_results)[['document_id', 'status', 'siigo_id',
+                                                               'latency_ms', 'error']],
+                                    hide_index=True
+                                )
+                                render_pager('run_results', run_results, DOCUMENTS_PAGE_SIZE)
+                            else:
+                                st.info("No results recorded for this run")
                                         
                 with col2:
                     st.subheader("Schedule Processing")
@@ -212,6 +444,15 @@ def main():
                         value=st.session_state.schedule_time
                     )
                     
+                    schedule_params['spread_minutes'] = st.number_input(
+                        "Spread Window (minutes)",
+                        min_value=0,
+                        max_value=240,
+                        value=SPREAD_MINUTES,
+                        help="Start at a fixed point within this many minutes after the processing "
+                             "time, so runs scheduled for the same time do not all start at once"
+                    )
+                    
                     if st.button("Schedule Processing", type="primary"):
                         try:
                             schedule_info = schedule_processing(
@@ -236,7 +477,7 @@ def main():
             st.rerun()
             
         # Load scheduled tasks
-        tasks = asyncio.run(load_scheduled_tasks())
+        tasks = load_scheduled_tasks()
         
         if tasks:
             for task in tasks:
@@ -250,7 +491,7 @@ def main():
                     # Add cancel button
                     if st.button("Cancel Schedule", key=f"cancel_{task['id']}"):
                         try:
-                            asyncio.run(st.session_state.scheduler.cancel_task(
+                            scheduler.run(scheduler.cancel_task(
                                 task['id'],
                                 st.session_state.api_client.company_name
                             ))
@@ -261,23 +502,122 @@ def main():
         else:
             st.info("No scheduled documents found")
             
+        st.subheader("Projected Load (next 24 hours)")
+        load = scheduler.run(scheduler.get_projected_load(
+            hours=24, company_name=st.session_state.api_client.company_name
+        ))
+        if load:
+            col1, col2 = st.columns(2)
+            col1.metric("Peak Runs per Minute", max(load.values()))
+            col2.metric("Busy Minutes", len(load))
+            st.bar_chart(pd.Series(load, name="Scheduled runs"))
+        else:
+            st.info("No scheduled runs in the next 24 hours")
+            
     # Processing Status Tab
     with tab3:
         st.header("Processing Status")
         if st.button("Refresh Status"):
             st.rerun()
             
-        # Add processing status information here
-        st.info("Processing status information will be displayed here")
+        st.subheader("Active Runs")
+        render_active_runs(st.session_state.api_client.company_name)
+        
+        st.subheader("Recent Runs")
+        runs = run_sync(task_db.get_processing_runs(
+            st.session_state.api_client.company_name,
+            before_id=page_cursor('runs'),
+            limit=RUNS_PAGE_SIZE
+        ))
+        
+        if runs:
+            runs_df = pd.DataFrame(runs)
+            runs_df['avg_latency_ms'] = (runs_df['total_latency_ms'] / runs_df['total']).round(1)
+            st.dataframe(
+                runs_df[['run_id', 'source', 'task_id', 'state', 'started_at', 'updated_at',
+                         'total', 'succeeded', 'failed', 'avg_latency_ms']],
+                hide_index=True
+            )
+            render_pager('runs', runs, RUNS_PAGE_SIZE)
+        else:
+            st.info("No processing runs recorded yet")
+            
+        st.subheader("Work Queue")
+        queue_stats = scheduler.run(scheduler.get_queue_stats(
+            st.session_state.api_client.company_name
+        ))[st.session_state.api_client.company_name]
+        queue_cols = st.columns(4)
+        queue_cols[0].metric("Queued", sum(queue_stats['queued'].values()))
+        queue_cols[1].metric("Running", queue_stats['running'])
+        queue_cols[2].metric("Avg Wait", f"{queue_stats['avg_wait_seconds']:.1f}s")
+        queue_cols[3].metric("Oldest Queued", f"{queue_stats['oldest_queued_seconds']:.1f}s")
+            
+        st.subheader("Scheduled Run Statistics")
+        stats = scheduler.run(scheduler.get_history_stats(
+            st.session_state.api_client.company_name,
+            granularity='daily',
+            start_period=(datetime.now() - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+        ))
+        if stats:
+            st.dataframe(
+                pd.DataFrame(stats)[['period', 'task_id', 'runs', 'succeeded', 'partial', 'failed',
+                                     'documents_posted', 'p50_duration_ms', 'p95_duration_ms']],
+                hide_index=True
+            )
+        else:
+            st.info("No scheduled run statistics for the last 30 days")
+            
+        st.subheader("Profiles")
+        profiles = list_profiles(st.session_state.api_client.company_name)
+        if profiles:
+            selected = st.selectbox(
+                "Profiled run",
+                range(len(profiles)),
+                format_func=lambda i: f"{profiles[i]['started_at']} - "
+                                      f"{'task ' + str(profiles[i]['task_id']) if profiles[i]['task_id'] else 'manual'}"
+            )
+            profile = profiles[selected]
+            profile_cols = st.columns(2)
+            profile_cols[0].metric("Wall Time", f"{profile['wall_seconds']:.2f}s")
+            profile_cols[1].metric("Peak Memory", f"{profile['peak_memory_bytes'] / 1e6:.1f} MB")
+            st.write("Top hotspots (by time spent in the function itself)")
+            st.dataframe(pd.DataFrame(profile['hotspots']), hide_index=True)
+            with st.expander("Top Allocation Sites"):
+                st.dataframe(pd.DataFrame(profile['allocations']), hide_index=True)
+            st.caption(f"Full profile: {profile['profile_file']} (open with pstats or snakeviz)")
+        else:
+            st.info("No profiled runs; tick \"Profile this run\" or set SIIGO_PROFILE")
         
     # Processed Documents Tab
     with tab4:
         st.header("Processed Documents")
         if st.button("Refresh Documents"):
+            reset_pages('documents')
             st.rerun()
             
-        # Add processed documents information here
-        st.info("Processed documents information will be displayed here")
+        status_filter = st.selectbox(
+            "Status",
+            ['All', 'Success', 'Failed'],
+            key='documents_status',
+            on_change=reset_pages,
+            args=('documents',)
+        )
+        documents = run_sync(task_db.get_processed_documents(
+            st.session_state.api_client.company_name,
+            status=None if status_filter == 'All' else status_filter,
+            before_id=page_cursor('documents'),
+            limit=DOCUMENTS_PAGE_SIZE
+        ))
+        
+        if documents:
+            st.dataframe(
+                pd.DataFrame(documents)[['processed_at', 'document_id', 'status', 'siigo_id',
+                                         'latency_ms', 'error', 'run_id']],
+                hide_index=True
+            )
+            render_pager('documents', documents, DOCUMENTS_PAGE_SIZE)
+        else:
+            st.info("No processed documents found")
 
     # Catalogs Tab
     with tab5:
@@ -290,37 +630,15 @@ def main():
             
         # Cost Centers Section
         st.subheader("Cost Centers")
-        if st.session_state.cost_centers:
-            # Create a DataFrame for better display
-            cost_centers_df = pd.DataFrame(st.session_state.cost_centers)
-            if not cost_centers_df.empty:
-                # Add search box for cost centers
-                cost_center_search = st.text_input("Search Cost Centers", "")
-                if cost_center_search:
-                    cost_centers_df = cost_centers_df[
-                        cost_centers_df.apply(lambda x: x.astype(str).str.contains(cost_center_search, case=False).any(), axis=1)
-                    ]
-                st.dataframe(cost_centers_df)
-            else:
-                st.info("No cost centers found")
+        if st.session_state.cost_centers is not None:
+            render_catalog('cost_centers', "Cost Centers")
         else:
             st.info("Cost centers not loaded. Click refresh to load data.")
             
         # Document Types Section
         st.subheader("Document Types")
-        if st.session_state.document_types:
-            # Create a DataFrame for better display
-            doc_types_df = pd.DataFrame(st.session_state.document_types)
-            if not doc_types_df.empty:
-                # Add search box for document types
-                doc_type_search = st.text_input("Search Document Types", "")
-                if doc_type_search:
-                    doc_types_df = doc_types_df[
-                        doc_types_df.apply(lambda x: x.astype(str).str.contains(doc_type_search, case=False).any(), axis=1)
-                    ]
-                st.dataframe(doc_types_df)
-            else:
-                st.info("No document types found")
+        if st.session_state.document_types is not None:
+            render_catalog('document_types', "Document Types")
         else:
             st.info("Document types not loaded. Click refresh to load data.")
 
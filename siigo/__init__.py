@@ -0,0 +1,5 @@
+"""Headless entry points for the Siigo journal entry processor.
+
+Run ``python -m siigo --help``. Nothing is imported here, so starting the
+command line only costs what the chosen command needs.
+"""
@@ -0,0 +1,4 @@
+import sys
+from siigo.cli import main
+
+sys.exit(main())
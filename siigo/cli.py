@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+
+# Exit codes: every document posted, some documents failed, the run could not start
+EXIT_OK, EXIT_FAILED_DOCUMENTS, EXIT_ERROR = 0, 1, 2
+
+class DryRunClient:
+    """Stands in for SiigoAPI in dry runs: payloads are built but never sent"""
+
+    company_name = 'dry-run'
+
+    def create_journal_entry(self, payload):
+        return {'id': None, 'dry_run': True}
+
+def build_parser():
+    # Only the standard library is imported until a command runs
+    parser = argparse.ArgumentParser(prog='python -m siigo', description="Process journal entries without the UI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    process = commands.add_parser('process', help="Validate and post the journal entries of an Excel file")
+    process.add_argument('file', help="Excel file in the journal entry template format")
+    process.add_argument('--concurrency', type=int,
+                         help="Documents posted to Siigo at once (defaults to SIIGO_SUBMIT_WORKERS)")
+    process.add_argument('--dry-run', action='store_true',
+                         help="Read, validate and build every document without posting or recording it")
+    process.add_argument('--no-record', action='store_true',
+                         help="Do not record the run and its documents in the task database")
+    process.add_argument('--results', help="Also write every document result to this NDJSON file")
+    process.add_argument('--json', action='store_true', help="Print the run report as JSON")
+    process.set_defaults(handler=process_file)
+    return parser
+
+def process_file(args):
+    """Run a file through the processing pipeline and report its throughput"""
+    if not os.path.isfile(args.file):
+        raise Exception(f"File not found: {args.file}")
+    from utils.processing import DocumentRecorder, NdjsonSink, process_documents
+    from utils.pipeline import SUBMIT_WORKERS
+    from utils.event_loop import run_sync
+    from utils.database import task_db
+
+    args.concurrency = args.concurrency or SUBMIT_WORKERS
+    if args.concurrency < 1:
+        raise Exception("--concurrency must be at least 1")
+    if args.dry_run:
+        api_client = DryRunClient()
+    else:
+        from utils.api_client import SiigoAPI
+        api_client = SiigoAPI.from_env()
+    recorder = None
+    if not (args.dry_run or args.no_record):
+        run_sync(task_db.initialize())
+        recorder = DocumentRecorder(api_client.company_name, source='cli')
+    sinks = [NdjsonSink(args.results)] if args.results else []
+
+    # Ctrl-C or SIGTERM stops the run after the documents in flight; it is left 'cancelled'
+    stop_event = threading.Event()
+    handlers = {signum: signal.signal(signum, lambda *_: stop_event.set())
+                for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        summary, stats = process_documents(args.file, api_client, recorder, stop_event, sinks,
+                                           submit_workers=args.concurrency)
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        for sink in sinks:
+            sink.close()
+        if recorder:
+            task_db.close()
+    return _report(args, summary, stats, cancelled=stop_event.is_set())
+
+def _report(args, summary, stats, cancelled=False):
+    elapsed = stats['elapsed_seconds']
+    report = {
+        **summary.as_dict(),
+        'file': args.file,
+        'dry_run': args.dry_run,
+        'cancelled': cancelled,
+        'concurrency': args.concurrency,
+        'elapsed_seconds': elapsed,
+        'documents_per_second': round(summary.total / elapsed, 2) if elapsed else None,
+        'stages': {name: {key: stage[key] for key in ('processed', 'errors', 'throughput_per_second', 'busy_seconds')}
+                   for name, stage in stats['stages'].items()},
+        'recent_failures': list(summary.recent_failures)
+    }
+    if args.json:
+        print(json.dumps(report, default=str))
+    else:
+        print(f"{'Dry run: validated' if args.dry_run else 'Processed'} {summary.total} documents "
+              f"in {elapsed}s ({report['documents_per_second'] or 0:.1f}/s, concurrency {args.concurrency})"
+              f"{' - cancelled' if cancelled else ''}")
+        print(f"  succeeded {summary.succeeded}, failed {summary.failed}")
+        for name, stage in report['stages'].items():
+            print(f"  {name:<9} {stage['processed']:>7} documents {stage['throughput_per_second']:>9.1f}/s "
+                  f"busy {stage['busy_seconds']}s")
+        for failure in report['recent_failures']:
+            print(f"  document {failure['document_id']} failed: {failure['error']}")
+    return EXIT_FAILED_DOCUMENTS if summary.failed else EXIT_OK
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except Exception as e:
+        print(f"error: {str(e)}", file=sys.stderr)
+        return EXIT_ERROR
@@ -1,6 +1,7 @@
+import os
 import unittest
 from unittest.mock import patch, MagicMock
-from utils.api_client import SiigoAPI
+from utils.api_client import SiigoAPI, company_env
 
 class TestSiigoAPI(unittest.TestCase):
     def setUp(self):
@@ -71,6 +72,26 @@ class TestSiigoAPI(unittest.TestCase):
         with self.assertRaises(Exception) as context:
             self.api.create_journal_entry({})
         self.assertTrue("API error" in str(context.exception))
+        
+    def test_company_credentials_preferred(self):
+        # A company's own credentials win over the process-wide ones
+        def log_in(client):
+            client.company_name = {'acme-user': 'ACME S.A.S.'}.get(client.username, 'Globex')
+            return True
+            
+        env = {'SIIGO_USERNAME': 'globex-user', 'SIIGO_ACCESS_KEY': 'key',
+               company_env('SIIGO_USERNAME', 'ACME S.A.S.'): 'acme-user',
+               company_env('SIIGO_ACCESS_KEY', 'ACME S.A.S.'): 'acme-key'}
+        with patch.dict(os.environ, env), \
+                patch.object(SiigoAPI, 'authenticate', autospec=True, side_effect=log_in):
+            client = SiigoAPI.from_env('ACME S.A.S.')
+            self.assertEqual((client.username, client.access_key), ('acme-user', 'acme-key'))
+            self.assertEqual(company_env('SIIGO_USERNAME', 'ACME S.A.S.'), 'SIIGO_USERNAME_ACME_S_A_S')
+            
+            # Without them the process-wide login must still be for the same company
+            with self.assertRaises(Exception) as context:
+                SiigoAPI.from_env('Initech')
+            self.assertIn("not Initech", str(context.exception))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import gzip
+import os
+import shutil
+import time
+from io import BytesIO
+from utils.blob_store import BlobStore
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.root = "test_blobs"
+        self.store = BlobStore(self.root)
+        
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        
+    def test_round_trip(self):
+        """Test stored content is returned unchanged"""
+        data = b'PK\x03\x04' + b'journal entries' * 100
+        digest = self.store.put(data)
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(self.store.get(digest), data)
+        self.assertEqual(self.store.open(digest).read(), data)
+        
+    def test_identical_content_is_deduplicated(self):
+        """Test storing the same file twice keeps one compressed blob"""
+        data = b'same workbook' * 1000
+        first = self.store.put_file(BytesIO(data))
+        second = self.store.put(data)
+        self.assertEqual(first, second)
+        self.assertEqual(self.store.list_digests(), [first])
+        
+        blob_path = os.path.join(self.root, first[:2], f'{first}.gz')
+        self.assertLess(os.path.getsize(blob_path), len(data))
+        
+    def test_put_file_accepts_uploaded_files(self):
+        """Test objects exposing getvalue() (e.g. Streamlit uploads) are stored"""
+        upload = BytesIO(b'uploaded')
+        upload.read()  # Position at the end like a consumed upload
+        digest = self.store.put_file(upload)
+        self.assertEqual(self.store.get(digest), b'uploaded')
+        
+    def test_corrupted_blob_is_rejected(self):
+        """Test content is verified against its hash on load"""
+        digest = self.store.put(b'original')
+        blob_path = os.path.join(self.root, digest[:2], f'{digest}.gz')
+        with open(blob_path, 'wb') as f:
+            f.write(gzip.compress(b'tampered'))
+        with self.assertRaises(ValueError):
+            self.store.get(digest)
+            
+    def test_collect_garbage(self):
+        """Test unreferenced blobs past the grace period are removed"""
+        kept = self.store.put(b'referenced')
+        dropped = self.store.put(b'orphaned')
+        fresh = self.store.put(b'just written')
+        old = time.time() - 7200
+        for digest in (kept, dropped):
+            path = os.path.join(self.root, digest[:2], f'{digest}.gz')
+            os.utime(path, (old, old))
+            
+        removed = self.store.collect_garbage({kept}, grace_seconds=3600)
+        self.assertEqual(removed, 1)
+        self.assertTrue(self.store.exists(kept))
+        self.assertFalse(self.store.exists(dropped))
+        self.assertTrue(self.store.exists(fresh))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from utils.catalog_search import CatalogIndex
+
+class TestCatalogIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = CatalogIndex([
+            {'id': 1, 'code': '2350', 'name': 'Administracion central', 'active': True},
+            {'id': 2, 'code': '235', 'name': 'Ventas', 'active': True},
+            {'id': 3, 'code': '100', 'name': 'Bodega 235 norte', 'active': False},
+            {'id': 4, 'code': '400', 'name': 'Centro de costos ventas norte', 'active': True},
+        ])
+
+    def test_ranks_exact_then_prefix_then_substring(self):
+        """Test a whole-value match ranks before word-prefix and substring matches"""
+        rows, matched = self.index.page('235')
+        self.assertEqual(matched, 3)
+        self.assertEqual(rows['id'].tolist(), [2, 1, 3])
+        rows, _ = self.index.page('ntas')
+        self.assertEqual(rows['id'].tolist(), [2, 4])
+
+    def test_every_term_must_match(self):
+        """Test multi-word queries are case-insensitive and match all terms"""
+        rows, matched = self.index.page('VENTAS norte')
+        self.assertEqual((matched, rows['id'].tolist()), (1, [4]))
+        self.assertEqual(self.index.page('ventas sur')[1], 0)
+
+    def test_empty_query_and_paging(self):
+        """Test an empty query pages through the catalog in order"""
+        rows, matched = self.index.page('', page=2, page_size=3)
+        self.assertEqual((matched, rows['id'].tolist()), (4, [4]))
+
+    def test_empty_catalog(self):
+        """Test an empty catalog searches to nothing"""
+        rows, matched = CatalogIndex([]).page('x')
+        self.assertEqual((matched, len(rows)), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+import pandas as pd
+from siigo.cli import main, EXIT_OK, EXIT_FAILED_DOCUMENTS, EXIT_ERROR
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp.name, 'entries.xlsx')
+        self.df = pd.DataFrame({
+            'document_id': [1, 1, 2, 2, 3, 3],
+            'date': ['2024-01-01'] * 6,
+            'account_code': ['11050501', '11100501'] * 3,
+            'movement': ['Debit', 'Credit'] * 3,
+            'customer_identification': ['13832081'] * 6,
+            'branch_office': [0] * 6,
+            'description': ['Test'] * 6,
+            'cost_center': [235] * 6,
+            'value': [100.0] * 6,
+            'observations': ['Observaciones'] * 6
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            code = main(list(argv))
+        return code, out.getvalue(), err.getvalue()
+
+    def test_dry_run_reports_throughput(self):
+        """Test a dry run builds every document and reports the run as JSON"""
+        self.df.to_excel(self.file, index=False)
+        results = os.path.join(self.tmp.name, 'results.ndjson')
+        code, out, _ = self._run('process', self.file, '--dry-run', '--concurrency', '2',
+                                 '--results', results, '--json')
+        report = json.loads(out)
+        self.assertEqual(code, EXIT_OK)
+        self.assertEqual((report['total'], report['success'], report['concurrency']), (3, 3, 2))
+        self.assertEqual(report['stages']['submit']['processed'], 3)
+        self.assertIn('documents_per_second', report)
+        with open(results) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_failed_documents_exit_code(self):
+        """Test a run with failed documents exits with a distinct code"""
+        self.df.loc[self.df['document_id'] == 2, 'value'] = [100.0, 50.0]
+        self.df.to_excel(self.file, index=False)
+        code, out, _ = self._run('process', self.file, '--dry-run')
+        self.assertEqual(code, EXIT_FAILED_DOCUMENTS)
+        self.assertIn('succeeded 2, failed 1', out)
+
+    def test_errors_before_the_run(self):
+        """Test a missing file is reported without a traceback"""
+        code, _, err = self._run('process', os.path.join(self.tmp.name, 'missing.xlsx'), '--dry-run')
+        self.assertEqual(code, EXIT_ERROR)
+        self.assertIn('File not found', err)
+
+    def test_help_does_not_import_the_app(self):
+        """Test the command line starts without loading pandas, the database or Streamlit"""
+        script = ("import sys\n"
+                  "from siigo.cli import build_parser\n"
+                  "build_parser()\n"
+                  "print(sorted(m for m in ('pandas', 'streamlit', 'utils.database', 'utils.logger') "
+                  "if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stdout.strip(), '[]')
+
+if __name__ == '__main__':
+    unittest.main()
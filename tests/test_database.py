@@ -1,8 +1,13 @@
 import unittest
 import asyncio
 import os
+import shutil
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from utils.database import TaskDatabase
+from unittest.mock import patch
+from utils.database import TaskDatabase, SCHEMA_VERSION, migrate_to_shards, shard_file_name
 
 class TestTaskDatabase(unittest.TestCase):
     def setUp(self):
@@ -99,5 +104,488 @@ class TestTaskDatabase(unittest.TestCase):
         history = self.loop.run_until_complete(self.db.get_task_history(task_id))
         self.assertEqual(len(history), 0)
 
+class TestSchemaMigrations(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_migrations.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _query_plan(self, query, params):
+        with sqlite3.connect(self.test_db_path) as conn:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        return ' | '.join(row[-1] for row in rows)
+        
+    def test_schema_version_is_current(self):
+        """Test initialize applies every migration"""
+        self.assertEqual(asyncio.run(self.db.get_schema_version()), SCHEMA_VERSION)
+        
+    def test_initialize_is_idempotent(self):
+        """Test re-running initialize keeps the version and existing data"""
+        task_id = asyncio.run(self.db.add_task({
+            'company_name': 'ACME',
+            'file': 'test.xlsx',
+            'frequency': 'daily',
+            'next_run': '2024-01-01 09:00:00'
+        }))
+        asyncio.run(self.db.initialize())
+        self.assertEqual(asyncio.run(self.db.get_schema_version()), SCHEMA_VERSION)
+        self.assertIsNotNone(asyncio.run(self.db.get_task(task_id, 'ACME')))
+        
+    def test_concurrent_initialize(self):
+        """Test processes starting together on a fresh database each apply a migration once"""
+        os.remove(self.test_db_path)
+        errors = []
+        
+        def initialize():
+            try:
+                asyncio.run(TaskDatabase(self.test_db_path).initialize())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=initialize) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(asyncio.run(self.db.get_schema_version()), SCHEMA_VERSION)
+        
+    def test_upgrade_preserves_legacy_rows(self):
+        """Test a pre-migration database is upgraded in place"""
+        os.remove(self.test_db_path)
+        with sqlite3.connect(self.test_db_path) as conn:
+            conn.execute('''
+                CREATE TABLE scheduled_tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    company_name TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    next_run TIMESTAMP NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    day_of_week INTEGER,
+                    day_of_month INTEGER
+                )
+            ''')
+            conn.execute('''
+                INSERT INTO scheduled_tasks (company_name, file_name, frequency, next_run, status)
+                VALUES ('ACME', 'legacy.xlsx', 'daily', '2024-01-01 09:00:00', 'active')
+            ''')
+        asyncio.run(self.db.initialize())
+        tasks = asyncio.run(self.db.get_all_tasks('ACME'))
+        self.assertEqual([t['file_name'] for t in tasks], ['legacy.xlsx'])
+        self.assertEqual(asyncio.run(self.db.get_schema_version()), SCHEMA_VERSION)
+        
+    def test_get_all_tasks_uses_index(self):
+        """Test task listing is served by an index without a sort step"""
+        plan = self._query_plan(
+            'SELECT * FROM scheduled_tasks WHERE company_name = ? ORDER BY next_run',
+            ['ACME']
+        )
+        self.assertIn('idx_scheduled_tasks_company_next_run', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        
+        plan = self._query_plan(
+            'SELECT * FROM scheduled_tasks WHERE company_name = ? AND status = ? ORDER BY next_run',
+            ['ACME', 'active']
+        )
+        self.assertIn('idx_scheduled_tasks_company_status_next_run', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        
+    def test_get_task_history_uses_index(self):
+        """Test history lookups are served by an index without a sort step"""
+        plan = self._query_plan(
+            'SELECT * FROM task_history WHERE task_id = ? AND company_name = ? '
+            'AND run_time >= ? ORDER BY run_time DESC',
+            [1, 'ACME', '2024-01-01']
+        )
+        self.assertIn('idx_task_history_company_task_run_time', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+class TestProcessedDocuments(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_processed_documents.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        
+    def tearDown(self):
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _records(self, run_id, count, company_name='ACME'):
+        return [{
+            'company_name': company_name,
+            'run_id': run_id,
+            'document_id': doc_id,
+            'status': 'Success' if doc_id % 3 else 'Failed',
+            'siigo_id': f'siigo-{doc_id}',
+            'latency_ms': 10.0,
+            'error': None if doc_id % 3 else 'boom'
+        } for doc_id in range(count)]
+        
+    def test_bulk_insert_updates_run_counters(self):
+        """Test a batch insert rolls into the run's counters"""
+        asyncio.run(self.db.add_processed_documents(self._records('run-1', 6)))
+        asyncio.run(self.db.add_processed_documents(self._records('run-1', 3)))
+        runs = asyncio.run(self.db.get_processing_runs('ACME'))
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]['total'], 9)
+        self.assertEqual(runs[0]['failed'], 3)
+        self.assertEqual(runs[0]['succeeded'], 6)
+        self.assertAlmostEqual(runs[0]['total_latency_ms'], 90.0)
+        
+    def test_keyset_pagination(self):
+        """Test pages chain through before_id without overlap"""
+        asyncio.run(self.db.add_processed_documents(self._records('run-1', 25)))
+        asyncio.run(self.db.add_processed_documents(self._records('run-2', 5, 'OTHER')))
+        
+        seen = []
+        before_id = None
+        while True:
+            page = asyncio.run(self.db.get_processed_documents('ACME', before_id=before_id, limit=10))
+            if not page:
+                break
+            seen.extend(row['id'] for row in page)
+            before_id = page[-1]['id']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        
+        failed = asyncio.run(self.db.get_processed_documents('ACME', status='Failed'))
+        self.assertTrue(failed)
+        self.assertTrue(all(row['status'] == 'Failed' for row in failed))
+        
+    def test_keyset_pagination_uses_index(self):
+        """Test document pages are served by an index without a sort step"""
+        with sqlite3.connect(self.test_db_path) as conn:
+            rows = conn.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM processed_documents '
+                'WHERE company_name = ? AND status = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                ['ACME', 'Failed', 100, 50]
+            ).fetchall()
+        plan = ' | '.join(row[-1] for row in rows)
+        self.assertIn('idx_processed_documents_company_status_id', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+class TestWriteBehindBuffer(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_write_behind.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        self.task_id = asyncio.run(self.db.add_task({
+            'company_name': 'ACME',
+            'file': 'test.xlsx',
+            'frequency': 'daily',
+            'next_run': '2024-01-01 09:00:00'
+        }))
+        
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _history(self):
+        return asyncio.run(self.db.get_task_history(self.task_id, 'ACME'))
+        
+    def test_writes_are_deferred_until_flush(self):
+        """Test buffered writes land together on flush"""
+        self.db.write_buffer.max_delay = 60
+        self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'success', {'total': 1})
+        self.db.write_buffer.update_task_status(self.task_id, '2024-01-02 09:00:00', 'active', 'ACME')
+        self.assertEqual(self._history(), [])
+        
+        self.assertTrue(self.db.flush_writes(timeout=5))
+        self.assertEqual(self.db.write_buffer.pending(), 0)
+        self.assertEqual(len(self._history()), 1)
+        task = asyncio.run(self.db.get_task(self.task_id, 'ACME'))
+        self.assertEqual(task['next_run'], '2024-01-02 09:00:00')
+        
+    def test_status_updates_coalesce(self):
+        """Test only the latest pending status per task is written"""
+        self.db.write_buffer.max_delay = 60
+        for day in range(2, 6):
+            self.db.write_buffer.update_task_status(
+                self.task_id, f'2024-01-0{day} 09:00:00', 'active', 'ACME'
+            )
+        self.assertEqual(self.db.write_buffer.pending(), 1)
+        self.db.flush_writes(timeout=5)
+        task = asyncio.run(self.db.get_task(self.task_id, 'ACME'))
+        self.assertEqual(task['next_run'], '2024-01-05 09:00:00')
+        
+    def test_size_threshold_triggers_flush(self):
+        """Test reaching max_size flushes without an explicit call"""
+        self.db.write_buffer.max_size = 3
+        self.db.write_buffer.max_delay = 60
+        for _ in range(3):
+            self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'success')
+        deadline = time.monotonic() + 5
+        while len(self._history()) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self._history()), 3)
+        
+    def test_time_threshold_triggers_flush(self):
+        """Test pending writes flush once max_delay has passed"""
+        self.db.write_buffer.max_delay = 0.05
+        self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'success')
+        deadline = time.monotonic() + 5
+        while not self._history() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self._history()), 1)
+        
+    def test_flushes_run_on_the_shared_event_loop(self):
+        """Test every flush is committed on the process event loop, not a loop of its own"""
+        threads = []
+        write = self.db._write_buffered
+        
+        async def recording_write(history, status):
+            threads.append(threading.current_thread().name)
+            await write(history, status)
+            
+        self.db.write_buffer.max_delay = 60
+        with patch.object(self.db, '_write_buffered', recording_write), \
+                patch('utils.database.asyncio.run') as new_loop:
+            for _ in range(3):
+                self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'success')
+                self.assertTrue(self.db.flush_writes(timeout=5))
+        new_loop.assert_not_called()
+        self.assertEqual(threads, ['siigo-event-loop'] * 3)
+        self.assertEqual(len(self._history()), 3)
+        
+    def test_close_flushes_pending_writes(self):
+        """Test shutdown writes everything still buffered"""
+        self.db.write_buffer.max_delay = 60
+        self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'failed', {'error': 'boom'})
+        self.db.close(timeout=5)
+        self.assertEqual(len(self._history()), 1)
+        with self.assertRaises(RuntimeError):
+            self.db.write_buffer.add_task_history(self.task_id, 'ACME', 'success')
+
+class TestHistoryCompaction(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_history_compaction.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        rows = []
+        # 10 runs a day for 60 days up to 2024-03-31, durations 100..1000 ms
+        for day in range(60):
+            run_date = datetime(2024, 3, 31) - timedelta(days=day)
+            for run in range(10):
+                status = 'success' if run < 7 else 'partial' if run < 9 else 'failed'
+                rows.append((
+                    'ACME', 1, (run_date + timedelta(minutes=run)).strftime('%Y-%m-%d %H:%M:%S'),
+                    status, None, (run + 1) * 100.0, 5 if status != 'failed' else 0
+                ))
+        asyncio.run(self.db._write_buffered(rows, {}))
+        
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _raw_rows(self):
+        with sqlite3.connect(self.test_db_path) as conn:
+            return conn.execute('SELECT MIN(run_time), COUNT(*) FROM task_history').fetchone()
+            
+    def test_daily_rollups(self):
+        """Test closed days are aggregated with counts and percentiles"""
+        summary = asyncio.run(self.db.compact_history(retention_days=30, now=datetime(2024, 4, 15, 12)))
+        self.assertEqual(summary['daily'], 60)
+        
+        day = asyncio.run(self.db.get_history_rollups(
+            'ACME', 'daily', task_id=1, start_period='2024-03-10', end_period='2024-03-10'
+        ))[0]
+        self.assertEqual(day['runs'], 10)
+        self.assertEqual((day['succeeded'], day['partial'], day['failed']), (7, 2, 1))
+        self.assertEqual(day['documents_posted'], 45)
+        self.assertEqual(day['p50_duration_ms'], 500.0)
+        self.assertEqual(day['p95_duration_ms'], 1000.0)
+        
+    def test_monthly_rollups(self):
+        """Test closed months are aggregated from raw rows"""
+        asyncio.run(self.db.compact_history(retention_days=30, now=datetime(2024, 4, 15, 12)))
+        months = asyncio.run(self.db.get_history_rollups('ACME', 'monthly'))
+        self.assertEqual([m['period'] for m in months], ['2024-03', '2024-02'])
+        self.assertEqual(months[0]['runs'], 310)
+        
+    def test_prunes_rows_past_retention(self):
+        """Test raw rows older than the retention window are pruned"""
+        asyncio.run(self.db.compact_history(retention_days=30, now=datetime(2024, 4, 15)))
+        self.assertEqual(self._raw_rows(), ('2024-03-16 00:00:00', 160))
+        
+    def test_keeps_rows_of_open_month(self):
+        """Test rows are not pruned before their month has been rolled up"""
+        asyncio.run(self.db.compact_history(retention_days=1, now=datetime(2024, 3, 31, 23)))
+        self.assertEqual(self._raw_rows(), ('2024-03-01 00:00:00', 310))
+        
+    def test_compaction_is_idempotent(self):
+        """Test rerunning compaction does not double count"""
+        asyncio.run(self.db.compact_history(retention_days=365, now=datetime(2024, 4, 15, 12)))
+        summary = asyncio.run(self.db.compact_history(retention_days=365, now=datetime(2024, 4, 15, 13)))
+        self.assertEqual((summary['daily'], summary['monthly'], summary['pruned']), (0, 0, 0))
+        months = asyncio.run(self.db.get_history_rollups('ACME', 'monthly'))
+        self.assertEqual(sum(m['runs'] for m in months), 600)
+
+class TestShardedLayout(unittest.TestCase):
+    def setUp(self):
+        self.shard_dir = "test_shards"
+        self.source_path = "test_unsharded.db"
+        self.db = TaskDatabase(shard_dir=self.shard_dir)
+        asyncio.run(self.db.initialize())
+        
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.shard_dir, ignore_errors=True)
+        if os.path.exists(self.source_path):
+            os.remove(self.source_path)
+            
+    def _task(self, company_name, next_run):
+        return {
+            'company_name': company_name,
+            'file': f'{company_name}.xlsx',
+            'frequency': 'daily',
+            'next_run': next_run
+        }
+        
+    def test_companies_are_routed_to_their_own_file(self):
+        """Test each company's rows live only in its shard"""
+        acme_id = asyncio.run(self.db.add_task(self._task('ACME S.A.S.', '2024-01-02 09:00:00')))
+        asyncio.run(self.db.add_task(self._task('Globex', '2024-01-01 09:00:00')))
+        
+        self.assertEqual(
+            sorted(os.listdir(self.shard_dir)),
+            sorted([shard_file_name('ACME S.A.S.'), shard_file_name('Globex')])
+        )
+        with sqlite3.connect(os.path.join(self.shard_dir, shard_file_name('Globex'))) as conn:
+            companies = conn.execute('SELECT DISTINCT company_name FROM scheduled_tasks').fetchall()
+        self.assertEqual(companies, [('Globex',)])
+        
+        task = asyncio.run(self.db.get_task(acme_id, 'ACME S.A.S.'))
+        self.assertEqual(task['file_name'], 'ACME S.A.S..xlsx')
+        self.assertEqual(asyncio.run(self.db.get_schema_version('Globex')), SCHEMA_VERSION)
+        
+    def test_cross_shard_listing(self):
+        """Test admin listings merge every shard in next_run order"""
+        asyncio.run(self.db.add_task(self._task('ACME', '2024-01-03 09:00:00')))
+        asyncio.run(self.db.add_task(self._task('Globex', '2024-01-01 09:00:00')))
+        asyncio.run(self.db.add_task(self._task('ACME', '2024-01-02 09:00:00')))
+        
+        tasks = asyncio.run(self.db.list_all_tasks(status='active'))
+        self.assertEqual([t['company_name'] for t in tasks], ['Globex', 'ACME', 'ACME'])
+        self.assertEqual(asyncio.run(self.db.list_companies()), ['ACME', 'Globex'])
+        
+    def test_buffered_writes_are_routed(self):
+        """Test one flush writes each company's history to its own shard"""
+        acme_id = asyncio.run(self.db.add_task(self._task('ACME', '2024-01-01 09:00:00')))
+        globex_id = asyncio.run(self.db.add_task(self._task('Globex', '2024-01-01 09:00:00')))
+        self.db.write_buffer.add_task_history(acme_id, 'ACME', 'success')
+        self.db.write_buffer.add_task_history(globex_id, 'Globex', 'failed')
+        self.db.flush_writes(timeout=5)
+        
+        self.assertEqual(len(asyncio.run(self.db.get_task_history(acme_id, 'ACME'))), 1)
+        self.assertEqual(len(asyncio.run(self.db.get_task_history(globex_id, 'Globex'))), 1)
+        
+    def test_referenced_file_hashes_span_shards(self):
+        """Test blob references are collected from every shard"""
+        asyncio.run(self.db.add_task({**self._task('ACME', '2024-01-01 09:00:00'), 'file_hash': 'aa'}))
+        asyncio.run(self.db.add_task({**self._task('Globex', '2024-01-01 09:00:00'), 'file_hash': 'bb'}))
+        asyncio.run(self.db.add_task(self._task('Globex', '2024-01-01 09:00:00')))
+        self.assertEqual(asyncio.run(self.db.get_referenced_file_hashes()), {'aa', 'bb'})
+        
+    def test_migrate_from_single_file(self):
+        """Test the migration tool splits a single file and keeps ids"""
+        source = TaskDatabase(self.source_path)
+        asyncio.run(source.initialize())
+        acme_id = asyncio.run(source.add_task(self._task('ACME', '2024-01-01 09:00:00')))
+        globex_id = asyncio.run(source.add_task(self._task('Globex', '2024-01-01 09:00:00')))
+        asyncio.run(source.add_task_history(globex_id, 'Globex', 'success', {'total': 2}))
+        
+        copied = asyncio.run(migrate_to_shards(self.source_path, self.shard_dir))
+        self.assertEqual(copied, {'ACME': 1, 'Globex': 1})
+        
+        self.assertEqual(asyncio.run(self.db.get_task(acme_id, 'ACME'))['file_name'], 'ACME.xlsx')
+        self.assertIsNone(asyncio.run(self.db.get_task(globex_id, 'ACME')))
+        history = asyncio.run(self.db.get_task_history(globex_id, 'Globex'))
+        self.assertEqual(len(history), 1)
+        
+        # Re-running the migration is safe
+        asyncio.run(migrate_to_shards(self.source_path, self.shard_dir))
+        self.assertEqual(len(asyncio.run(self.db.list_all_tasks())), 2)
+
+class TestTaskLeases(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_leases.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        self.now = datetime(2024, 1, 1, 9, 0, 30)
+        
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _add_task(self, next_run, file_hash='abc'):
+        return asyncio.run(self.db.add_task({
+            'company_name': 'ACME',
+            'file': 'test.xlsx',
+            'file_hash': file_hash,
+            'frequency': 'daily',
+            'next_run': next_run,
+            'run_at': '09:00'
+        }))
+        
+    def test_due_tasks_are_claimed_once(self):
+        """Test concurrent claims hand each due task to exactly one worker"""
+        due = [self._add_task('2024-01-01 09:00:00') for _ in range(6)]
+        self._add_task('2024-01-01 10:00:00')
+        self._add_task('2024-01-01 08:00:00', file_hash=None)
+        
+        async def claim_all():
+            workers = [TaskDatabase(self.test_db_path) for _ in range(3)]
+            return await asyncio.gather(*(
+                db.claim_due_tasks(f'worker-{i}', 60, limit=4, now=self.now) for i, db in enumerate(workers)
+            ))
+        claims = asyncio.run(claim_all())
+        claimed_ids = [task['id'] for batch in claims for task in batch]
+        self.assertEqual(sorted(claimed_ids), due)
+        self.assertEqual(len(asyncio.run(self.db.get_leases())), 6)
+        
+    def test_expired_lease_is_reclaimed(self):
+        """Test a crashed worker's task is picked up once its lease runs out"""
+        task_id = self._add_task('2024-01-01 09:00:00')
+        self.assertIsNotNone(asyncio.run(self.db.claim_task(task_id, 'ACME', 'crashed', 60, now=self.now)))
+        self.assertIsNone(asyncio.run(
+            self.db.claim_task(task_id, 'ACME', 'other', 60, now=self.now + timedelta(seconds=30))
+        ))
+        reclaimed = asyncio.run(
+            self.db.claim_task(task_id, 'ACME', 'other', 60, now=self.now + timedelta(seconds=61))
+        )
+        self.assertEqual(reclaimed['id'], task_id)
+        # The crashed worker can no longer renew or complete the run
+        self.assertFalse(asyncio.run(self.db.complete_task_run(task_id, 'ACME', 'crashed', '2024-01-02 09:00:00')))
+        
+    def test_complete_advances_and_releases(self):
+        """Test completing a run moves next_run on so it is not claimed again"""
+        task_id = self._add_task('2024-01-01 09:00:00')
+        asyncio.run(self.db.claim_task(task_id, 'ACME', 'worker', 60, now=self.now))
+        self.assertTrue(asyncio.run(self.db.renew_lease(task_id, 'ACME', 'worker', 60)))
+        self.assertTrue(asyncio.run(self.db.complete_task_run(task_id, 'ACME', 'worker', '2024-01-02 09:00:00')))
+        
+        self.assertEqual(asyncio.run(self.db.get_task(task_id, 'ACME'))['next_run'], '2024-01-02 09:00:00')
+        self.assertEqual(asyncio.run(self.db.get_leases()), [])
+        self.assertEqual(asyncio.run(self.db.claim_due_tasks('other', 60, limit=5, now=self.now)), [])
+        
+    def test_complete_abandons_unfinished_runs(self):
+        """Test advancing a task stops the next occurrence resuming this one's run"""
+        task_id = self._add_task('2024-01-01 09:00:00')
+        asyncio.run(self.db.start_processing_run('crashed', 'ACME', 'scheduled', task_id, 'abc', 10))
+        asyncio.run(self.db.start_processing_run('manual', 'ACME', 'manual', None, 'abc', 10))
+        asyncio.run(self.db.claim_task(task_id, 'ACME', 'worker', 60, now=self.now))
+        asyncio.run(self.db.complete_task_run(task_id, 'ACME', 'worker', '2024-01-02 09:00:00'))
+        
+        resumable = asyncio.run(self.db.get_resumable_runs('ACME'))
+        self.assertEqual([run['run_id'] for run in resumable], ['manual'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import asyncio
+import threading
+import time
+from utils.event_loop import EventLoopThread
+
+class TestEventLoopThread(unittest.TestCase):
+    def setUp(self):
+        self.loop_thread = EventLoopThread(name='test-loop', max_workers=2)
+        
+    def tearDown(self):
+        self.loop_thread.stop(timeout=1)
+        
+    def test_run_returns_result(self):
+        """Test coroutines run on the loop thread and return their result"""
+        async def where():
+            return threading.current_thread().name
+        self.assertEqual(self.loop_thread.run(where()), 'test-loop')
+        
+    def test_submitted_coroutines_run_concurrently(self):
+        """Test several submitted coroutines overlap instead of running in turn"""
+        started = time.monotonic()
+        futures = [self.loop_thread.submit(asyncio.sleep(0.2)) for _ in range(5)]
+        for future in futures:
+            future.result(2)
+        self.assertLess(time.monotonic() - started, 0.6)
+        
+    def test_blocking_work_uses_bounded_executor(self):
+        """Test run_blocking never uses more threads than max_workers"""
+        active = []
+        peak = []
+        lock = threading.Lock()
+        
+        def work():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+                
+        async def run_all():
+            await asyncio.gather(*(self.loop_thread.run_blocking(work) for _ in range(6)))
+        self.loop_thread.run(run_all())
+        self.assertEqual(max(peak), 2)
+        
+    def test_run_from_loop_thread_is_rejected(self):
+        """Test blocking on the loop from its own thread fails instead of deadlocking"""
+        async def nested():
+            with self.assertRaises(RuntimeError):
+                self.loop_thread.run(asyncio.sleep(0))
+        self.loop_thread.run(nested())
+        
+    def test_stop_waits_for_running_coroutines(self):
+        """Test stop lets in-flight work finish"""
+        done = []
+        
+        async def job():
+            await asyncio.sleep(0.1)
+            done.append(True)
+        self.loop_thread.submit(job())
+        self.loop_thread.stop(timeout=2)
+        self.assertEqual(done, [True])
+        self.assertFalse(self.loop_thread.running)
+        
+    def test_stop_waits_for_coroutines_submitted_while_draining(self):
+        """Test work handed to the loop just as stop begins is not dropped"""
+        done = []
+        
+        async def write():
+            await asyncio.sleep(0.05)
+            done.append('write')
+            
+        async def job():
+            await asyncio.sleep(0.05)
+            done.append('job')
+            # As a buffered flush submitted from another thread while stop drains
+            asyncio.run_coroutine_threadsafe(write(), asyncio.get_running_loop())
+        self.loop_thread.submit(job())
+        self.loop_thread.stop(timeout=2)
+        self.assertEqual(done, ['job', 'write'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import unittest
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from utils.logger import ErrorLogger, JsonFormatter, RotatingLogHandler, summarize, tail_lines, query_logs, log_archives, log_files
+
+class TestErrorLogger(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.logger = ErrorLogger(self.log_dir.name, name=f'test_logger_{id(self)}')
+
+    def tearDown(self):
+        self.logger.close()
+        self.log_dir.cleanup()
+
+    def _read_log(self):
+        self.logger.flush()
+        with open(self.logger.log_file) as f:
+            return f.read()
+
+    def test_details_are_summarized(self):
+        """Test large request payloads are cut down before they are written"""
+        payload = {'items': [{'value': n} for n in range(100)], 'observations': 'x' * 2000}
+        self.logger.log_error('api_errors', "API error", {'request_payload': payload})
+
+        content = self._read_log()
+        self.assertIn('api_errors: API error', content)
+        self.assertIn('95 more items', content)
+        self.assertIn('(2000 chars)', content)
+        self.assertNotIn('"value": 99', content)
+        self.assertEqual(self.logger.get_error_stats()['api_errors'], 1)
+
+    def test_details_serialized_on_listener_thread(self):
+        """Test the caller only enqueues; details are formatted by the listener"""
+        threads = []
+
+        def record_thread(details):
+            threads.append(threading.current_thread())
+            return summarize(details)
+
+        with patch('utils.logger.summarize', side_effect=record_thread):
+            self.logger.log_error('processing_errors', "boom", {'document_id': 1})
+            self.logger.flush()
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_details_skipped_when_debug_not_kept(self):
+        """Test no detail record is built when no handler keeps DEBUG"""
+        self.logger.logger.setLevel(logging.INFO)
+        with patch('utils.logger.summarize') as mock_summarize:
+            self.logger.log_error('processing_errors', "boom", {'document_id': 1})
+            self.logger.flush()
+        mock_summarize.assert_not_called()
+        self.assertIn('processing_errors: boom', self._read_log())
+
+    def test_summarize_leaves_small_values(self):
+        """Test values within the limits are returned unchanged"""
+        value = {'items': [1, 2], 'description': 'short', 'value': 1.5}
+        self.assertEqual(summarize(value, max_items=5, max_chars=10), value)
+
+class TestRecentErrors(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.loggers = []
+
+    def tearDown(self):
+        for logger in self.loggers:
+            logger.close()
+        self.log_dir.cleanup()
+
+    def _logger(self):
+        logger = ErrorLogger(self.log_dir.name, name=f'test_recent_{id(self)}_{len(self.loggers)}')
+        self.loggers.append(logger)
+        return logger
+
+    def test_filters_by_type_and_company(self):
+        """Test the latest errors are returned oldest first and can be filtered"""
+        logger = self._logger()
+        for n in range(6):
+            logger.log_error('api_errors' if n % 2 else 'processing_errors', f"error {n}",
+                             {'company_name': 'ACME' if n < 3 else 'Globex'})
+
+        self.assertEqual([e['message'] for e in logger.get_recent_errors(3)], ['error 3', 'error 4', 'error 5'])
+        self.assertEqual([e['message'] for e in logger.get_recent_errors(10, error_type='api_errors')],
+                         ['error 1', 'error 3', 'error 5'])
+        self.assertEqual([e['message'] for e in logger.get_recent_errors(10, 'processing_errors', 'ACME')],
+                         ['error 0', 'error 2'])
+
+    def test_older_errors_read_from_file(self):
+        """Test errors logged before a restart come from the end of the log file"""
+        first = self._logger()
+        first.log_error('api_errors', "before restart", {'company_name': 'ACME'})
+        first.log_error('processing_errors', "other")
+        first.close()
+
+        logger = self._logger()
+        logger.log_error('api_errors', "after restart", {'company_name': 'ACME'})
+        errors = logger.get_recent_errors(5, company_name='ACME')
+        self.assertEqual([e['message'] for e in errors], ['before restart', 'after restart'])
+        self.assertEqual(errors[0]['type'], 'api_errors')
+
+    def test_wrapped_buffer_falls_back_to_file(self):
+        """Test filters reach past the in-memory buffer once it has wrapped"""
+        logger = self._logger()
+        logger._recent_errors = deque(maxlen=2)
+        logger.log_error('validation_errors', "rare")
+        for n in range(3):
+            logger.log_error('api_errors', f"common {n}")
+        self.assertEqual([e['message'] for e in logger.get_recent_errors(5, error_type='validation_errors')],
+                         ['rare'])
+        self.assertEqual(len(logger.get_recent_errors(2)), 2)
+
+    def test_tail_lines_reads_backwards(self):
+        """Test lines come back newest first across block boundaries"""
+        path = os.path.join(self.log_dir.name, 'tail.log')
+        with open(path, 'w') as f:
+            f.write(''.join(f"line {n}\n" for n in range(50)))
+        lines = tail_lines(path, block_size=16)
+        self.assertEqual([next(lines) for _ in range(3)], ['line 49', 'line 48', 'line 47'])
+        self.assertEqual(len(list(tail_lines(path, block_size=7))), 50)
+
+class TestStructuredLogs(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.log_dir.name, 'app.jsonl')
+
+    def tearDown(self):
+        self.log_dir.cleanup()
+
+    def _handler(self, **kwargs):
+        handler = RotatingLogHandler(self.log_file, **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def _record(self, message, created=None, **context):
+        record = logging.LogRecord('test', logging.ERROR, __file__, 0, message, None, None)
+        if created is not None:
+            record.created = created.timestamp()
+        record.__dict__.update(context)
+        return record
+
+    def test_errors_written_as_json_lines(self):
+        """Test each error is one JSON object carrying its context fields"""
+        logger = ErrorLogger(self.log_dir.name, name=f'test_json_{id(self)}')
+        logger.log_error('api_errors', "API error",
+                         {'company_name': 'ACME', 'task_id': 7, 'latency_ms': 12.5, 'status_code': 500})
+        logger.log_info("Posted", company_name='ACME', document_id=3)
+        logger.close()
+
+        with open(self.log_file) as f:
+            error, info = [json.loads(line) for line in f]
+        self.assertEqual((error['level'], error['error_type'], error['company_name'], error['task_id'],
+                          error['latency_ms']), ('ERROR', 'api_errors', 'ACME', 7, 12.5))
+        self.assertEqual(error['details']['status_code'], 500)
+        self.assertEqual((info['level'], info['message'], info['document_id']), ('INFO', 'Posted', 3))
+
+    def test_each_process_writes_its_own_file(self):
+        """Test loggers running at the same time never share a file, and free files are reused"""
+        first = ErrorLogger(self.log_dir.name, name=f'test_first_{id(self)}')
+        second = ErrorLogger(self.log_dir.name, name=f'test_second_{id(self)}')
+        first.log_error('api_errors', "from first")
+        second.log_error('api_errors', "from second")
+        first.close()
+        second.close()
+        self.assertEqual(first.log_file, self.log_file)
+        self.assertEqual(log_files(self.log_dir.name), [self.log_file, second.log_file])
+        with open(second.log_file) as f:
+            self.assertEqual([json.loads(line)['message'] for line in f], ["api_errors: from second"])
+
+        third = ErrorLogger(self.log_dir.name, name=f'test_third_{id(self)}')
+        third.close()
+        self.assertEqual(third.log_file, self.log_file)
+
+    def test_rotates_by_size_into_gzip_archives(self):
+        """Test full files are compressed and only the newest archives kept"""
+        handler = self._handler(max_bytes=200, backups=2)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for n in range(40):
+            handler.emit(self._record(f"message {n:02d} " + 'x' * 40))
+
+        archives = log_archives(self.log_file)
+        self.assertEqual(len(archives), 2)
+        with gzip.open(archives[-1], 'rt') as f:
+            archived = f.read()
+        with open(self.log_file) as f:
+            current = f.read()
+        self.assertIn('message 3', archived)
+        self.assertIn('message 39', current)
+        self.assertNotIn('message 39', archived)
+
+    def test_rotates_at_midnight(self):
+        """Test a record from a new day starts a new file"""
+        handler = self._handler(max_bytes=10 ** 6)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.emit(self._record("yesterday", datetime.now() - timedelta(days=1)))
+        handler.emit(self._record("today", datetime.now()))
+
+        self.assertEqual(len(log_archives(self.log_file)), 1)
+        with open(self.log_file) as f:
+            self.assertEqual(f.read(), "today\n")
+
+    def test_query_scans_archives_and_current_file(self):
+        """Test queries filter entries across compressed archives and the live file"""
+        handler = self._handler(max_bytes=300)
+        handler.setFormatter(JsonFormatter())
+        start = datetime.now()
+        for n in range(30):
+            handler.emit(self._record(f"error {n}", error_type='api_errors' if n % 3 else 'validation_errors',
+                                      company_name='ACME' if n % 2 else 'Globex', task_id=n))
+        self.assertTrue(log_archives(self.log_file))
+
+        entries = list(query_logs(self.log_file, error_type='validation_errors', company_name='ACME'))
+        self.assertEqual([e['task_id'] for e in entries], [3, 9, 15, 21, 27])
+        self.assertEqual([e['task_id'] for e in query_logs(self.log_file, task_id=2)], [2])
+        self.assertEqual(len(list(query_logs(self.log_file, since=start, limit=4))), 4)
+        self.assertEqual(list(query_logs(self.log_file, until=start - timedelta(seconds=1))), [])
+
+if __name__ == '__main__':
+    unittest.main()
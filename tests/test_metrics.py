@@ -0,0 +1,100 @@
+import unittest
+import os
+import tempfile
+import threading
+import urllib.request
+from unittest.mock import patch, MagicMock
+from utils.metrics import MetricsRegistry, log_linear_buckets, start_http_server, API_LATENCY
+from utils.api_client import SiigoAPI
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_is_thread_safe(self):
+        """Test concurrent increments are not lost"""
+        counter = self.registry.counter('test_total', "Test counter", ('status',))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(status='ok')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value(status='ok'), 8000)
+
+    def test_histogram_quantiles(self):
+        """Test quantiles fall in the bucket holding the observation"""
+        histogram = self.registry.histogram('test_seconds', "Test latency", ('endpoint',))
+        for _ in range(90):
+            histogram.observe(0.011, endpoint='journals')
+        for _ in range(10):
+            histogram.observe(2.2, endpoint='journals')
+        self.assertEqual(histogram.count(endpoint='journals'), 100)
+        self.assertEqual(histogram.quantile(0.5, endpoint='journals'), 0.0125)
+        self.assertEqual(histogram.quantile(0.99, endpoint='journals'), 2.5)
+        self.assertIsNone(histogram.quantile(0.5, endpoint='auth'))
+
+    def test_buckets_are_log_linear(self):
+        """Test every decade gets the same relative steps"""
+        buckets = log_linear_buckets(0.001, 1.0, steps=(1, 2, 5))
+        self.assertEqual(buckets, [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0])
+
+    def test_prometheus_text(self):
+        """Test the exposition format of each metric type"""
+        self.registry.counter('docs_total', "Documents", ('status',)).inc(3, status='success')
+        self.registry.gauge('depth', "Queue depth", ('queue',)).set(2, queue='work-queue')
+        self.registry.histogram('latency_seconds', "Latency", buckets=[0.1, 1.0]).observe(0.5)
+
+        text = self.registry.render()
+        self.assertIn('# TYPE docs_total counter\ndocs_total{status="success"} 3\n', text)
+        self.assertIn('depth{queue="work-queue"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0\n', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn('latency_seconds_count 1\n', text)
+
+    def test_rejects_conflicting_registration(self):
+        """Test a name cannot be reused with other labels"""
+        self.registry.counter('runs_total', "Runs", ('status',))
+        with self.assertRaises(ValueError):
+            self.registry.counter('runs_total', "Runs", ('company',))
+
+    def test_write_to_file(self):
+        """Test the metrics file is replaced with the current values"""
+        self.registry.counter('runs_total', "Runs").inc()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.prom')
+            self.registry.write(path)
+            with open(path) as f:
+                self.assertIn('runs_total 1', f.read())
+
+class TestMetricsExport(unittest.TestCase):
+    def test_http_endpoint(self):
+        """Test /metrics serves the global registry"""
+        server = start_http_server(0, host='127.0.0.1')
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('# TYPE siigo_api_request_seconds histogram', body)
+
+    @patch('requests.post')
+    def test_api_latency_recorded(self, mock_post):
+        """Test each Siigo call is timed per endpoint"""
+        mock_post.return_value = MagicMock(status_code=200)
+        mock_post.return_value.json.return_value = {'id': 'abc'}
+        client = SiigoAPI('user', 'key')
+        client.token = 'token'
+        before = API_LATENCY.count(endpoint='journals', outcome='200')
+        client.create_journal_entry({'date': '2024-01-01'})
+        self.assertEqual(API_LATENCY.count(endpoint='journals', outcome='200'), before + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import threading
+import time
+from utils.pipeline import Pipeline
+
+class TestPipeline(unittest.TestCase):
+    def test_items_flow_through_all_stages(self):
+        """Test every item passes each stage once, with several workers per stage"""
+        pipeline = (
+            Pipeline(queue_size=4)
+            .add_stage('double', lambda x: x * 2, workers=3)
+            .add_stage('increment', lambda x: x + 1, workers=2)
+        )
+        outputs = list(pipeline.run(range(100)))
+        self.assertEqual(sorted(outputs), [x * 2 + 1 for x in range(100)])
+        
+        stats = pipeline.stats()
+        self.assertEqual(stats['source']['produced'], 100)
+        self.assertEqual(stats['stages']['double']['processed'], 100)
+        self.assertEqual(stats['stages']['increment']['workers'], 2)
+        self.assertLessEqual(stats['stages']['double']['max_queued'], 4)
+        
+    def test_slow_stage_throttles_the_source(self):
+        """Test a slow stage blocks reading instead of letting it run ahead"""
+        queue_size = 2
+        produced = []
+        consumed = []
+        lead = []
+        lock = threading.Lock()
+        
+        def source():
+            for i in range(40):
+                with lock:
+                    produced.append(i)
+                    lead.append(len(produced) - len(consumed))
+                yield i
+                
+        def slow(x):
+            time.sleep(0.005)
+            with lock:
+                consumed.append(x)
+            return x
+            
+        pipeline = Pipeline(queue_size=queue_size).add_stage('parse', lambda x: x).add_stage('submit', slow)
+        self.assertEqual(len(list(pipeline.run(source()))), 40)
+        # At most what fits in the queues plus the items held by workers
+        self.assertLessEqual(max(lead), 2 * (queue_size + 1) + 1)
+        stats = pipeline.stats()
+        self.assertGreater(stats['source']['blocked_seconds'], 0)
+        self.assertGreater(stats['stages']['submit']['busy_seconds'], 0.1)
+        
+    def test_stage_error_stops_the_pipeline(self):
+        """Test the first stage failure is raised from run() after the threads stop"""
+        def fail_on_three(x):
+            if x == 3:
+                raise ValueError("bad item")
+            return x
+            
+        pipeline = Pipeline(queue_size=2).add_stage('check', fail_on_three, workers=2)
+        with self.assertRaises(ValueError):
+            list(pipeline.run(range(1000)))
+        self.assertEqual(pipeline.stats()['stages']['check']['errors'], 1)
+        self.assertLess(pipeline.stats()['source']['produced'], 1000)
+        
+    def test_consumer_can_stop_early(self):
+        """Test closing the output iterator shuts the pipeline down"""
+        pipeline = Pipeline(queue_size=2).add_stage('identity', lambda x: x)
+        outputs = pipeline.run(iter(range(1000)))
+        self.assertEqual([next(outputs), next(outputs)], [0, 1])
+        outputs.close()
+        self.assertFalse(any(t.name.startswith('pipeline-') for t in threading.enumerate()))
+
+if __name__ == '__main__':
+    unittest.main()
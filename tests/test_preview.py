@@ -0,0 +1,58 @@
+import unittest
+import pandas as pd
+from utils.preview import DataPreview
+
+class TestDataPreview(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'document_id': [1, 1, 2, 2, 3, 3],
+            'date': ['2024-01-01'] * 6,
+            'account_code': ['11050501', '11100501'] * 3,
+            'movement': ['Debit', 'Credit'] * 3,
+            'customer_identification': ['13832081'] * 6,
+            'branch_office': [0] * 6,
+            'description': ['Rent', 'Rent', 'Payroll', 'Payroll', 'Office supplies', 'Office supplies'],
+            'cost_center': [235, 235, 236, 236, 235, 235],
+            'value': [100.0, 100.0, 250.5, 250.5, 30.0, 30.0],
+            'observations': ['Observaciones'] * 6
+        })
+        self.preview = DataPreview(self.df)
+
+    def test_summary(self):
+        """Test the summary counts rows, documents, cost centers and totals per movement"""
+        self.assertEqual(self.preview.summary, {
+            'rows': 6,
+            'documents': 3,
+            'cost_centers': 2,
+            'totals_by_movement': {'Credit': 380.5, 'Debit': 380.5}
+        })
+
+    def test_pages(self):
+        """Test pages are windows of the rows in file order"""
+        rows, matched = self.preview.page(2, page_size=4)
+        self.assertEqual(matched, 6)
+        self.assertEqual(rows['document_id'].tolist(), [3, 3])
+
+    def test_search_filter_and_sort(self):
+        """Test search is case-insensitive, filters match exactly, and sorting spans all pages"""
+        rows, matched = self.preview.page(search='OFFICE')
+        self.assertEqual((matched, rows['document_id'].tolist()), (2, [3, 3]))
+
+        rows, matched = self.preview.page(filters={'movement': 'Debit'}, sort_by='value', ascending=False,
+                                          page_size=2)
+        self.assertEqual(matched, 3)
+        self.assertEqual(rows['value'].tolist(), [250.5, 100.0])
+        rows, _ = self.preview.page(2, filters={'movement': 'Debit'}, sort_by='value', ascending=False,
+                                    page_size=2)
+        self.assertEqual(rows['value'].tolist(), [30.0])
+
+    def test_sort_mixed_column(self):
+        """Test a column mixing numbers and text sorts as text instead of failing"""
+        df = self.df.assign(customer_identification=['900123', 13832081, 'CC-77', 42, '900123', 13832081])
+        rows, matched = DataPreview(df).page(sort_by='customer_identification')
+        self.assertEqual(matched, 6)
+        self.assertEqual(rows['customer_identification'].tolist(),
+                         [13832081, 13832081, 42, '900123', '900123', 'CC-77'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from unittest.mock import MagicMock
+import pandas as pd
+from utils.database import TaskDatabase
+from utils.processing import (
+    DocumentRecorder, DocumentPipeline, process_documents, NdjsonSink, CallbackSink, RunSummary
+)
+
+class TestProcessDocuments(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'document_id': [1, 1, 2, 2],
+            'date': ['2024-01-01'] * 4,
+            'account_code': ['11050501', '11100501'] * 2,
+            'movement': ['Debit', 'Credit'] * 2,
+            'customer_identification': ['13832081'] * 4,
+            'branch_office': [0] * 4,
+            'description': ['Test'] * 4,
+            'cost_center': [235] * 4,
+            'value': [100.0] * 4,
+            'observations': ['Observaciones'] * 4
+        })
+        
+    def test_records_each_document_in_one_batch(self):
+        """Test results are recorded per document and flushed together"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.side_effect = [{'id': 'abc'}, Exception("API error")]
+        db = MagicMock()
+        
+        async def add_processed_documents(records, source='manual'):
+            db.batches.append(records)
+        async def noop(*args):
+            return set()
+        db.batches = []
+        db.add_processed_documents = add_processed_documents
+        db.start_processing_run = db.finish_processing_run = db.get_run_checkpoint = noop
+        
+        recorder = DocumentRecorder('ACME', db=db)
+        summary, _ = process_documents(self.df, api_client, recorder, submit_workers=1)
+        
+        self.assertEqual((summary.total, summary.succeeded, summary.failed), (2, 1, 1))
+        self.assertEqual(list(summary.recent_failures), [{'document_id': 2, 'error': 'API error'}])
+        self.assertEqual(len(db.batches), 1)
+        batch = db.batches[0]
+        self.assertEqual(batch[0]['siigo_id'], 'abc')
+        self.assertEqual(batch[1]['error'], 'API error')
+        self.assertTrue(all(r['run_id'] == recorder.run_id for r in batch))
+        
+    def test_results_stream_to_sinks(self):
+        """Test every result reaches the sinks while the summary keeps only counters"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.side_effect = [{'id': 'abc'}, Exception("API error")]
+        received = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results', 'run.ndjson')
+            sink = NdjsonSink(path)
+            summary, _ = process_documents(self.df, api_client, sinks=[sink, CallbackSink(received.append)],
+                                           submit_workers=1)
+            sink.close()
+            with open(path, encoding='utf-8') as f:
+                lines = [json.loads(line) for line in f]
+        
+        self.assertEqual([r['status'] for r in lines], ['Success', 'Failed'])
+        self.assertEqual(lines[0]['response'], {'id': 'abc'})
+        self.assertEqual([r['document_id'] for r in received], [1, 2])
+        self.assertEqual(summary.total, 2)
+        
+    def test_summary_keeps_latest_failures(self):
+        """Test the summary holds a bounded number of recent failures"""
+        summary = RunSummary('run', max_failures=2)
+        for doc_id in range(5):
+            summary.add({'document_id': doc_id, 'status': 'Failed', 'error': 'boom'})
+        summary.add({'document_id': 5, 'status': 'Success'})
+        self.assertEqual([f['document_id'] for f in summary.recent_failures], [3, 4])
+        self.assertEqual(summary.as_dict(), {'total': 6, 'success': 1, 'failed': 5, 'run_id': 'run'})
+
+class ProcessingDatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_processing.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        self.df = pd.DataFrame({
+            'document_id': [doc_id for doc_id in range(1, 11) for _ in range(2)],
+            'date': ['2024-01-01'] * 20,
+            'account_code': ['11050501', '11100501'] * 10,
+            'movement': ['Debit', 'Credit'] * 10,
+            'customer_identification': ['13832081'] * 20,
+            'branch_office': [0] * 20,
+            'description': ['Test'] * 20,
+            'cost_center': [235] * 20,
+            'value': [100.0] * 20,
+            'observations': ['Observaciones'] * 20
+        })
+        
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _posted_documents(self, api_client):
+        return [c.args[0]['document']['id'] for c in api_client.create_journal_entry.call_args_list]
+        
+class TestResumableRuns(ProcessingDatabaseTestCase):
+    def test_crashed_run_resumes_from_checkpoint(self):
+        """Test a run that died resumes after its last committed batch"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.side_effect = (
+            [{'id': n} for n in range(6)] + [KeyboardInterrupt()]
+        )
+        recorder = DocumentRecorder('ACME', db=self.db, batch_size=4, file_hash='abc')
+        with self.assertRaises(KeyboardInterrupt):
+            process_documents(self.df, api_client, recorder, submit_workers=1)
+            
+        runs = asyncio.run(self.db.get_resumable_runs('ACME'))
+        self.assertEqual([(r['run_id'], r['state'], r['total'], r['expected']) for r in runs],
+                         [(recorder.run_id, 'running', 6, 10)])
+        
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        summary, _ = process_documents(self.df, api_client, DocumentRecorder.resume(runs[0], db=self.db),
+                                       submit_workers=1)
+        
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(self._posted_documents(api_client), [7, 8, 9, 10])
+        self.assertEqual(asyncio.run(self.db.get_resumable_runs('ACME')), [])
+        run = asyncio.run(self.db.get_processing_runs('ACME'))[0]
+        self.assertEqual((run['state'], run['total'], run['succeeded']), ('completed', 10, 10))
+        
+    def test_resume_matches_ids_read_with_another_type(self):
+        """Test a run journaled with int ids resumes from a file read with float or text ids"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.side_effect = [{'id': n} for n in range(4)] + [KeyboardInterrupt()]
+        recorder = DocumentRecorder('ACME', db=self.db, batch_size=2, file_hash='abc')
+        with self.assertRaises(KeyboardInterrupt):
+            process_documents(self.df, api_client, recorder, submit_workers=1)
+        run = asyncio.run(self.db.get_resumable_runs('ACME'))[0]
+        
+        for raw_ids in (self.df['document_id'].astype(float), self.df['document_id'].astype(str)):
+            resumed = DocumentRecorder.resume(run, db=self.db)
+            resumed.start()
+            self.assertEqual([doc_id for doc_id in raw_ids.unique() if not resumed.is_done(doc_id)],
+                             list(raw_ids.unique()[4:]))
+        
+    def test_cancelled_run_is_resumable(self):
+        """Test stopping a run leaves it cancelled with its progress journaled"""
+        stop_event = threading.Event()
+        api_client = MagicMock()
+        
+        def create_journal_entry(payload):
+            if api_client.create_journal_entry.call_count == 3:
+                stop_event.set()
+            return {'id': 'x'}
+        api_client.create_journal_entry.side_effect = create_journal_entry
+        
+        df = pd.concat([self.df.assign(document_id=self.df['document_id'] + 10 * n) for n in range(4)])
+        recorder = DocumentRecorder('ACME', db=self.db, file_hash='abc')
+        # Small queues, so only a few documents are read ahead of the one being posted
+        pipeline = DocumentPipeline(api_client, recorder, submit_workers=1, queue_size=1)
+        summary = pipeline.run(df, stop_event)
+        # Documents read before the stop are still posted
+        self.assertGreaterEqual(summary.total, 3)
+        self.assertLess(summary.total, 40)
+        
+        run = asyncio.run(self.db.get_resumable_runs('ACME', source='manual'))[0]
+        self.assertEqual((run['state'], run['total']), ('cancelled', summary.total))
+        self.assertEqual(asyncio.run(self.db.get_referenced_file_hashes()), {'abc'})
+
+class TestDocumentPipeline(ProcessingDatabaseTestCase):
+    def test_pipeline_posts_valid_documents(self):
+        """Test documents are validated, built and submitted, and results journaled"""
+        self.df.loc[self.df['document_id'] == 4, 'value'] = [100.0, 50.0]
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        recorder = DocumentRecorder('ACME', db=self.db, batch_size=3)
+        
+        pipeline = DocumentPipeline(api_client, recorder, submit_workers=3, queue_size=2)
+        summary = pipeline.run(self.df)
+        
+        self.assertEqual((summary.succeeded, summary.failed), (9, 1))
+        failure = summary.recent_failures[0]
+        self.assertEqual(failure['document_id'], 4)
+        self.assertIn('not balanced', failure['error'])
+        # The unbalanced document never reaches Siigo
+        self.assertNotIn(4, self._posted_documents(api_client))
+        self.assertEqual(len(self._posted_documents(api_client)), 9)
+        run = asyncio.run(self.db.get_processing_runs('ACME'))[0]
+        self.assertEqual((run['state'], run['succeeded'], run['failed']), ('completed', 9, 1))
+        self.assertEqual(pipeline.stats()['stages']['submit']['processed'], 10)
+        
+    def test_pipeline_resumes_from_checkpoint(self):
+        """Test the pipeline skips documents an earlier attempt journaled"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        recorder = DocumentRecorder('ACME', db=self.db, batch_size=1)
+        process_documents(self.df[self.df['document_id'] <= 6], api_client, recorder)
+        
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'y'}
+        summary = DocumentPipeline(api_client, DocumentRecorder('ACME', run_id=recorder.run_id, db=self.db)).run(self.df)
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(sorted(self._posted_documents(api_client)), [7, 8, 9, 10])
+
+if __name__ == '__main__':
+    unittest.main()
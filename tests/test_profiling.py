@@ -0,0 +1,121 @@
+import unittest
+import os
+import pstats
+import tempfile
+import threading
+from unittest.mock import MagicMock, patch
+import pandas as pd
+from utils.pipeline import thread_name_prefix
+from utils.processing import DocumentPipeline
+from utils.profiling import (RunProfiler, profiling_enabled, profiled, list_profiles,
+                             PROFILER_SEES_ALL_THREADS)
+
+class TestRunProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame({
+            'document_id': [doc_id for doc_id in range(1, 6) for _ in range(2)],
+            'date': ['2024-01-01'] * 10,
+            'account_code': ['11050501', '11100501'] * 5,
+            'movement': ['Debit', 'Credit'] * 5,
+            'customer_identification': ['13832081'] * 10,
+            'branch_office': [0] * 10,
+            'description': ['Test'] * 10,
+            'cost_center': [235] * 10,
+            'value': [100.0] * 10,
+            'observations': ['Observaciones'] * 10
+        })
+
+    def tearDown(self):
+        self.profile_dir.cleanup()
+
+    def test_setting(self):
+        """Test SIIGO_PROFILE turns profiling on for all or some companies"""
+        self.assertFalse(profiling_enabled('ACME', ''))
+        self.assertFalse(profiling_enabled('ACME', '0'))
+        self.assertTrue(profiling_enabled('ACME', '1'))
+        self.assertTrue(profiling_enabled('ACME', 'Globex, ACME'))
+        self.assertFalse(profiling_enabled('Initech', 'Globex,ACME'))
+
+    def test_profiles_run_and_its_pipeline_threads(self):
+        """Test a report covers the run's stage threads and is saved per company and task"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        with RunProfiler('ACME Corp', task_id=7, profile_dir=self.profile_dir.name) as profiler:
+            DocumentPipeline(api_client).run(self.df)
+
+        report = profiler.report
+        self.assertEqual((report['company_name'], report['task_id']), ('ACME Corp', 7))
+        self.assertTrue(os.path.exists(report['profile_file']))
+        self.assertTrue(os.path.basename(report['profile_file']).startswith('ACME-Corp_7_'))
+        self.assertGreater(report['peak_memory_bytes'], 0)
+        self.assertTrue(report['allocations'])
+        self.assertTrue(report['hotspots'])
+        functions = {function for (_, _, function) in pstats.Stats(report['profile_file']).stats}
+        # Stage functions run on the pipeline threads
+        self.assertIn('_validate', functions)
+        self.assertIn('_submit', functions)
+
+    def test_one_profile_at_a_time(self):
+        """Test a run starting during another profile runs unprofiled"""
+        with RunProfiler('ACME', profile_dir=self.profile_dir.name) as outer:
+            with RunProfiler('Globex', profile_dir=self.profile_dir.name) as inner:
+                sum(range(1000))
+        self.assertTrue(outer.active)
+        self.assertFalse(inner.active)
+        self.assertIsNone(inner.report)
+        self.assertEqual([p['company_name'] for p in list_profiles(profile_dir=self.profile_dir.name)], ['ACME'])
+
+    def test_profiled_wrapper(self):
+        """Test the wrapper only profiles when forced or enabled"""
+        def work(value):
+            return value * 2
+        self.assertIs(profiled(work, 'ACME'), work)
+        wrapped = profiled(work, 'ACME', force=True, profile_dir=self.profile_dir.name)
+        self.assertIsNot(wrapped, work)
+        self.assertEqual(wrapped(21), 42)
+        self.assertEqual(len(list_profiles(profile_dir=self.profile_dir.name)), 1)
+
+    @unittest.skipIf(PROFILER_SEES_ALL_THREADS, "one profiler sees every thread on Python 3.12+")
+    def test_only_this_runs_threads_are_profiled(self):
+        """Test stage threads of another run going on at the same time stay out of the report"""
+        def this_run_work():
+            return sum(range(1000))
+
+        def other_run_work():
+            return sum(range(1000))
+
+        with RunProfiler('ACME', profile_dir=self.profile_dir.name) as profiler:
+            threads = [
+                threading.Thread(target=this_run_work, name=f'{thread_name_prefix()}submit-0'),
+                threading.Thread(target=other_run_work, name=f'{thread_name_prefix(1)}submit-0')
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        functions = {function for (_, _, function) in pstats.Stats(profiler.report['profile_file']).stats}
+        self.assertIn('this_run_work', functions)
+        self.assertNotIn('other_run_work', functions)
+
+    def test_thread_profiler_errors_do_not_stop_the_run(self):
+        """Test a stage thread that cannot be profiled still runs, so the pipeline finishes"""
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        with RunProfiler('ACME', profile_dir=self.profile_dir.name):
+            with patch('utils.profiling.cProfile.Profile', side_effect=ValueError("profiler active")):
+                summary = DocumentPipeline(api_client).run(self.df)
+        self.assertEqual(summary.succeeded, 5)
+
+    def test_list_profiles_by_company(self):
+        """Test saved summaries are listed newest first for one company"""
+        for company in ('ACME', 'Globex', 'ACME'):
+            with RunProfiler(company, profile_dir=self.profile_dir.name):
+                pass
+        profiles = list_profiles('ACME', profile_dir=self.profile_dir.name)
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(all(p['company_name'] == 'ACME' for p in profiles))
+
+if __name__ == '__main__':
+    unittest.main()
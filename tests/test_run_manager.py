@@ -0,0 +1,107 @@
+import unittest
+import threading
+import time as time_module
+from unittest.mock import MagicMock
+from utils.processing import RunSummary
+from utils.scheduler import TaskRunner
+from utils.run_manager import RunManager
+
+class TestRunManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = RunManager(TaskRunner(max_concurrent_jobs=1))
+
+    def _recorder(self, run_id):
+        recorder = MagicMock()
+        recorder.run_id = run_id
+        return recorder
+
+    def _wait(self, run_id, states=('completed', 'cancelled', 'failed'), timeout=5):
+        deadline = time_module.time() + timeout
+        while time_module.time() < deadline:
+            snapshot = self.manager.get(run_id).snapshot()
+            if snapshot['state'] in states:
+                return snapshot
+            time_module.sleep(0.01)
+        self.fail(f"Run {run_id} did not reach {states}")
+
+    @staticmethod
+    def _process(documents, gate=None, delay=0.0):
+        """Fake process_documents: one result per document, stopping when asked"""
+        def process(source, api_client, recorder, stop_event, sinks):
+            summary = RunSummary(recorder.run_id)
+            for document_id in range(documents):
+                if gate is not None:
+                    gate.wait(5)
+                if stop_event.is_set():
+                    break
+                result = {'document_id': document_id, 'status': 'Failed' if document_id % 4 == 0 else 'Success'}
+                summary.add(result)
+                for sink in sinks:
+                    sink.write(result)
+                time_module.sleep(delay)
+            return summary, {'elapsed_seconds': 0}
+        return process
+
+    def test_run_reports_progress_and_outcome(self):
+        """Test a background run counts results as they arrive and keeps its summary"""
+        gate = threading.Event()
+        run_id = self.manager.start('ACME', self._process(8, gate), None, None, self._recorder('run-1'), expected=8)
+
+        snapshot = self._wait(run_id, states=('running',))
+        self.assertEqual((snapshot['done'], snapshot['expected']), (0, 8))
+        gate.set()
+        snapshot = self._wait(run_id)
+        self.assertEqual(snapshot['state'], 'completed')
+        self.assertEqual((snapshot['done'], snapshot['succeeded'], snapshot['failed']), (8, 6, 2))
+        self.assertEqual(snapshot['eta_seconds'], 0)
+        self.assertEqual(self.manager.get(run_id).summary.total, 8)
+
+    def test_cancel_running_run(self):
+        """Test cancelling stops a run at a document boundary"""
+        run_id = self.manager.start('ACME', self._process(1000, delay=0.005), None, None,
+                                    self._recorder('run-1'), expected=1000)
+        self._wait(run_id, states=('running',))
+        self.assertTrue(self.manager.cancel(run_id))
+        snapshot = self._wait(run_id)
+        self.assertEqual(snapshot['state'], 'cancelled')
+        self.assertLess(snapshot['done'], 1000)
+        self.assertFalse(self.manager.cancel(run_id))
+
+    def test_cancel_queued_run(self):
+        """Test a run still waiting for a slot is dropped without starting"""
+        gate = threading.Event()
+        first = self.manager.start('ACME', self._process(1, gate), None, None, self._recorder('run-1'))
+        self._wait(first, states=('running',))
+        process = MagicMock()
+        second = self.manager.start('ACME', process, None, None, self._recorder('run-2'))
+        self.assertEqual(self.manager.get(second).snapshot()['state'], 'queued')
+
+        self.manager.cancel(second)
+        self.assertEqual(self._wait(second)['state'], 'cancelled')
+        gate.set()
+        self.assertEqual(self._wait(first)['state'], 'completed')
+        process.assert_not_called()
+
+    def test_failed_run(self):
+        """Test an exception escaping the run marks it failed"""
+        def process(*args):
+            raise RuntimeError("boom")
+        run_id = self.manager.start('ACME', process, None, None, self._recorder('run-1'))
+        snapshot = self._wait(run_id)
+        self.assertEqual((snapshot['state'], snapshot['error']), ('failed', 'boom'))
+
+    def test_lists_runs_and_prunes_finished(self):
+        """Test runs are listed per company, newest first, keeping a bounded history"""
+        run_ids = [self.manager.start(company, self._process(1), None, None, self._recorder(f'run-{i}'))
+                   for i, company in enumerate(['ACME', 'Globex', 'ACME', 'ACME'])]
+        for run_id in run_ids:
+            self._wait(run_id)
+        self.assertEqual(len(self.manager.list_runs()), 4)
+        self.manager.finished_kept = 2
+        self.manager._prune()
+        self.assertEqual([s['run_id'] for s in self.manager.list_runs()], ['run-3', 'run-2'])
+        self.assertEqual([s['run_id'] for s in self.manager.list_runs('Globex')], [])
+        self.assertEqual(self.manager.list_runs(active_only=True), [])
+
+if __name__ == '__main__':
+    unittest.main()
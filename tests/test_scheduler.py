@@ -1,7 +1,13 @@
 import unittest
-from unittest.mock import patch, MagicMock
-from datetime import datetime, time
-from utils.scheduler import TaskScheduler
+import asyncio
+import os
+from unittest.mock import patch, MagicMock, AsyncMock
+from datetime import datetime, time, timedelta
+from utils.database import TaskDatabase
+from utils.processing import RunSummary
+from utils.scheduler import (
+    TaskScheduler, task_job_id, get_scheduler, shutdown_scheduler, task_start_time, projected_load
+)
 
 class TestTaskScheduler(unittest.TestCase):
     def setUp(self):
@@ -84,5 +90,272 @@ class TestTaskScheduler(unittest.TestCase):
         frequencies = set(task['frequency'] for task in tasks)
         self.assertEqual(frequencies, {'daily', 'weekly', 'monthly'})
 
+class TestScheduledExecution(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = TaskScheduler(max_concurrent_jobs=2)
+        
+    def tearDown(self):
+        self.scheduler.scheduler.shutdown()
+        
+    def test_jobs_run_concurrently_up_to_limit(self):
+        """Test dispatched jobs really run, overlapping up to max_concurrent_jobs"""
+        import threading
+        import time as time_module
+        active = []
+        peak = []
+        lock = threading.Lock()
+        
+        def fake_run(file_hash, task_id, company_name):
+            with lock:
+                active.append(task_id)
+                peak.append(len(active))
+            time_module.sleep(0.1)
+            with lock:
+                active.remove(task_id)
+            summary = RunSummary(f'run-{task_id}')
+            summary.add({'document_id': task_id, 'status': 'Success'})
+            return summary
+            
+        with patch.object(self.scheduler, '_run_scheduled_entries', side_effect=fake_run), \
+                patch('utils.scheduler.task_db') as mock_db:
+            mock_db.claim_task = AsyncMock(side_effect=lambda task_id, company_name, *args: {
+                'id': task_id, 'company_name': company_name, 'file_hash': 'hash',
+                'frequency': 'daily', 'run_at': '09:00', 'next_run': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            mock_db.complete_task_run = AsyncMock(return_value=True)
+            futures = [
+                self.scheduler.submit(
+                    self.scheduler._process_scheduled_file('hash', task_id, f'company-{task_id}')
+                )
+                for task_id in range(4)
+            ]
+            for future in futures:
+                future.result(5)
+                
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(mock_db.write_buffer.add_task_history.call_count, 4)
+        statuses = {c.args[2] for c in mock_db.write_buffer.add_task_history.call_args_list}
+        self.assertEqual(statuses, {'success'})
+        # Every run advances its task and releases the lease it claimed
+        self.assertEqual(mock_db.complete_task_run.await_count, 4)
+        
+    def test_skips_tasks_claimed_elsewhere(self):
+        """Test a job whose task is leased by another worker does not run here"""
+        with patch.object(self.scheduler, '_run_scheduled_entries') as mock_run, \
+                patch('utils.scheduler.task_db') as mock_db:
+            mock_db.claim_task = AsyncMock(return_value=None)
+            self.scheduler.run(self.scheduler._process_scheduled_file('hash', 1, 'ACME'), timeout=5)
+        mock_run.assert_not_called()
+        mock_db.write_buffer.add_task_history.assert_not_called()
+        
+    def test_run_fails_when_credentials_log_in_to_another_company(self):
+        """Test a task never posts through a client logged in to a different company"""
+        from utils.api_client import SiigoAPI
+        
+        def log_in_as_globex(client):
+            client.company_name = 'Globex'
+            return True
+            
+        with patch.dict(os.environ, {'SIIGO_USERNAME': 'globex-user', 'SIIGO_ACCESS_KEY': 'key'}), \
+                patch.object(SiigoAPI, 'authenticate', autospec=True, side_effect=log_in_as_globex), \
+                patch('utils.processing.process_documents') as mock_process, \
+                patch('utils.scheduler.blob_store'), \
+                patch('utils.scheduler.task_db') as mock_db:
+            mock_db.get_resumable_runs = AsyncMock(return_value=[])
+            self.scheduler.run(self.scheduler._run_scheduled_file('hash', 1, 'ACME'), timeout=5)
+        mock_process.assert_not_called()
+        history = mock_db.write_buffer.add_task_history.call_args
+        self.assertEqual(history.args[:3], (1, 'ACME', 'failed'))
+        self.assertIn('Globex', history.args[3]['error'])
+
+class TestRehydration(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_rehydration.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        self.db_patch = patch('utils.scheduler.task_db', self.db)
+        self.db_patch.start()
+        self.scheduler = TaskScheduler(rehydrate=False, misfire_grace_time=3600, catchup_spacing=30)
+        # Keep restored jobs from firing during the test
+        self.scheduler.scheduler.pause()
+        
+    def tearDown(self):
+        self.scheduler.scheduler.shutdown()
+        self.db_patch.stop()
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _add_task(self, next_run, file_hash='abc', run_at='09:00'):
+        return asyncio.run(self.db.add_task({
+            'company_name': 'ACME',
+            'file': 'test.xlsx',
+            'file_hash': file_hash,
+            'frequency': 'daily',
+            'next_run': next_run.strftime('%Y-%m-%d %H:%M:%S'),
+            'run_at': run_at
+        }))
+        
+    def _job_time(self, task_id):
+        job = self.scheduler.scheduler.get_job(task_job_id(task_id, 'ACME'))
+        return job.next_run_time.replace(tzinfo=None)
+        
+    def test_rehydrate_restores_and_catches_up(self):
+        """Test jobs are rebuilt from the database with staggered catch-up"""
+        now = datetime.now()
+        upcoming = self._add_task(now + timedelta(hours=2))
+        missed_recently = [self._add_task(now - timedelta(minutes=m)) for m in (5, 10, 15)]
+        missed_long_ago = self._add_task(now - timedelta(days=3), run_at='09:30')
+        legacy = self._add_task(now + timedelta(hours=1), file_hash=None)
+        
+        summary = self.scheduler.rehydrate()
+        self.assertEqual(summary, {'restored': 5, 'caught_up': 3, 'skipped': 1})
+        
+        # Upcoming runs keep their stored time, so nothing is reprocessed
+        self.assertAlmostEqual(
+            (self._job_time(upcoming) - (now + timedelta(hours=2))).total_seconds(), 0, delta=1
+        )
+        # Recent misses run once each, spread out instead of all at once
+        catchup_times = sorted(self._job_time(task_id) for task_id in missed_recently)
+        gaps = [(b - a).total_seconds() for a, b in zip(catchup_times, catchup_times[1:])]
+        self.assertEqual([round(g) for g in gaps], [30, 30])
+        # Misses beyond the grace time skip to the next occurrence
+        skipped = self._job_time(missed_long_ago)
+        self.assertGreater(skipped, now)
+        self.assertEqual((skipped.hour, skipped.minute), (9, 30))
+        # and the new next_run is stored at once, not left to a buffered flush
+        self.assertEqual(asyncio.run(self.db.get_task(missed_long_ago, 'ACME'))['next_run'],
+                         skipped.strftime('%Y-%m-%d %H:%M:%S'))
+        # Tasks without a stored input file cannot be restored
+        self.assertIsNone(self.scheduler.scheduler.get_job(task_job_id(legacy, 'ACME')))
+        self.db.flush_writes(timeout=5)
+        self.assertEqual(asyncio.run(self.db.get_task(legacy, 'ACME'))['status'], 'missing_file')
+        
+    def test_catch_up_runs_however_late_it_fires(self):
+        """Test a task restored for catch-up near the grace time is run, not skipped"""
+        import time as time_module
+        self.scheduler.misfire_grace_time = 2
+        task_id = self._add_task(datetime.now() - timedelta(seconds=1))
+        self.assertEqual(self.scheduler.rehydrate()['caught_up'], 1)
+        job = self.scheduler.scheduler.get_job(task_job_id(task_id, 'ACME'))
+        # By the time the job fires the missed run is later than the grace time
+        time_module.sleep(2)
+        with patch.object(self.scheduler, '_run_scheduled_file', new=AsyncMock()) as mock_run:
+            self.scheduler.run(self.scheduler._process_scheduled_file(*job.args, **job.kwargs), timeout=5)
+        mock_run.assert_awaited_once_with('abc', task_id, 'ACME')
+        
+        # Once advanced, the same job's next firings are checked against the grace time again
+        asyncio.run(self.db.update_task_status(
+            task_id, (datetime.now() - timedelta(seconds=10)).strftime('%Y-%m-%d %H:%M:%S'), 'active', 'ACME'
+        ))
+        with patch.object(self.scheduler, '_run_scheduled_file', new=AsyncMock()) as mock_run:
+            self.scheduler.run(self.scheduler._process_scheduled_file(*job.args, **job.kwargs), timeout=5)
+        mock_run.assert_not_awaited()
+        
+    def test_projected_load_of_one_company(self):
+        """Test a company's projected load leaves out other companies' tasks"""
+        next_run = (datetime.now() + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+        for company_name, count in (('ACME', 2), ('Globex', 3)):
+            for _ in range(count):
+                asyncio.run(self.db.add_task({
+                    'company_name': company_name, 'file': 'test.xlsx', 'file_hash': 'abc',
+                    'frequency': 'daily', 'next_run': next_run, 'run_at': '09:00', 'spread_minutes': 0
+                }))
+        with patch.object(self.db, 'list_all_tasks', wraps=self.db.list_all_tasks) as list_all_tasks:
+            acme = self.scheduler.run(self.scheduler.get_projected_load(hours=24, company_name='ACME'))
+            list_all_tasks.assert_not_called()
+        self.assertEqual(sum(acme.values()), 2)
+        everyone = self.scheduler.run(self.scheduler.get_projected_load(hours=24))
+        self.assertEqual(sum(everyone.values()), 5)
+
+
+class TestStartSpreading(unittest.TestCase):
+    def _task(self, task_id, run_at='09:00', spread_minutes=30, frequency='daily', **extra):
+        return {'id': task_id, 'company_name': 'ACME', 'run_at': run_at, 'frequency': frequency,
+                'spread_minutes': spread_minutes, **extra}
+        
+    def test_offset_is_deterministic_and_in_window(self):
+        """Test each task gets a stable start inside its spreading window"""
+        starts = [task_start_time(self._task(task_id)) for task_id in range(200)]
+        self.assertEqual(starts, [task_start_time(self._task(task_id)) for task_id in range(200)])
+        self.assertTrue(all((9, 0, 0) <= start < (9, 30, 0) for start in starts))
+        self.assertGreater(len(set(starts)), 150)
+        self.assertEqual(task_start_time(self._task(1, spread_minutes=0)), (9, 0, 0))
+        
+    def test_window_stays_on_the_same_day(self):
+        """Test a window crossing midnight is shortened instead of moving the day"""
+        starts = [task_start_time(self._task(task_id, run_at='23:50', spread_minutes=60)) for task_id in range(50)]
+        self.assertTrue(all((23, 50, 0) <= start <= (23, 59, 59) for start in starts))
+        
+    def test_projected_load_flattens_bursts(self):
+        """Test the per-minute histogram reflects the spreading"""
+        start = datetime(2024, 1, 1, 8, 0)
+        burst = projected_load([self._task(task_id, spread_minutes=0) for task_id in range(60)], start, hours=24)
+        self.assertEqual(burst, {'2024-01-01 09:00': 60})
+        spread = projected_load([self._task(task_id) for task_id in range(60)], start, hours=24)
+        self.assertEqual(sum(spread.values()), 60)
+        self.assertLessEqual(max(spread.values()), 8)
+        weekly = projected_load(
+            [self._task(1, spread_minutes=0, frequency='weekly', day_of_week=2)], start, hours=24 * 14
+        )
+        self.assertEqual(list(weekly), ['2024-01-03 09:00', '2024-01-10 09:00'])
+        
+    def test_schedule_task_stores_spread_first_run(self):
+        """Test scheduling stores the shifted first run under the new task's id"""
+        test_db_path = "test_spreading.db"
+        db = TaskDatabase(test_db_path)
+        asyncio.run(db.initialize())
+        try:
+            with patch('utils.scheduler.task_db', db), patch('utils.scheduler.blob_store') as mock_blobs:
+                mock_blobs.put_file.return_value = 'abc'
+                scheduler = TaskScheduler(rehydrate=False)
+                try:
+                    test_file = MagicMock()
+                    test_file.name = "test.xlsx"
+                    info = scheduler.schedule_task(time(9, 0), test_file, 'ACME', spread_minutes=30)
+                    task = asyncio.run(db.list_all_tasks())[0]
+                    job = scheduler.scheduler.get_job(task_job_id(task['id'], 'ACME'))
+                finally:
+                    scheduler.scheduler.shutdown()
+            self.assertEqual(task['spread_minutes'], 30)
+            self.assertEqual(task['next_run'], info['next_run'])
+            hour, minute, second = task_start_time(task)
+            self.assertEqual(task['next_run'][11:], f'{hour:02d}:{minute:02d}:{second:02d}')
+            self.assertEqual(job.next_run_time.strftime('%Y-%m-%d %H:%M:%S'), task['next_run'])
+        finally:
+            db.close()
+            os.remove(test_db_path)
+
+class TestSchedulerSingleton(unittest.TestCase):
+    def tearDown(self):
+        shutdown_scheduler()
+        
+    @patch('utils.scheduler.atexit')
+    @patch('utils.scheduler.task_db')
+    @patch('utils.scheduler.TaskScheduler')
+    def test_one_scheduler_per_process(self, mock_scheduler_cls, mock_db, mock_atexit):
+        """Test concurrent sessions share one lazily created scheduler"""
+        import threading
+        async def initialize():
+            return None
+        mock_db.initialize.side_effect = initialize
+        mock_scheduler_cls.side_effect = lambda: MagicMock()
+        
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(get_scheduler())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+            
+        self.assertEqual(mock_scheduler_cls.call_count, 1)
+        self.assertEqual(mock_db.initialize.call_count, 1)
+        self.assertTrue(all(instance is instances[0] for instance in instances))
+        mock_atexit.register.assert_called_once_with(shutdown_scheduler)
+        
+        shutdown_scheduler()
+        instances[0].shutdown.assert_called_once()
+        self.assertIsNot(get_scheduler(), instances[0])
+
 if __name__ == '__main__':
     unittest.main()
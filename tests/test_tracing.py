@@ -0,0 +1,99 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+import pandas as pd
+from utils.tracing import Tracer, traced, current_trace_id
+from utils.processing import DocumentPipeline, CallbackSink
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.trace_dir = tempfile.TemporaryDirectory()
+        self.tracer = Tracer(sample_rate=1.0, trace_dir=self.trace_dir.name)
+
+    def tearDown(self):
+        self.trace_dir.cleanup()
+
+    def _exported(self, trace_id):
+        with open(os.path.join(self.trace_dir.name, f"{trace_id}.json")) as f:
+            return json.load(f)
+
+    def test_unsampled_runs_record_nothing(self):
+        """Test spans are no-ops outside a sampled trace"""
+        tracer = Tracer(sample_rate=0.0, trace_dir=self.trace_dir.name)
+        with tracer.trace('run') as root:
+            with tracer.span('child') as child:
+                self.assertIsNone(current_trace_id())
+        self.assertIsNone(root)
+        self.assertIsNone(child)
+        self.assertEqual(os.listdir(self.trace_dir.name), [])
+
+    def test_nested_spans_exported_as_chrome_trace(self):
+        """Test spans nest under the current span and export as complete events"""
+        @traced()
+        def format_entries_for_api():
+            return current_trace_id()
+
+        with self.tracer.trace('run', run_id='abc') as root:
+            with self.tracer.span('document', document_id='1') as document:
+                seen = format_entries_for_api()
+        self.assertEqual(seen, root.trace_id)
+
+        trace = self._exported(root.trace_id)
+        events = {e['name']: e for e in trace['traceEvents'] if e['ph'] == 'X'}
+        self.assertEqual(set(events), {'run', 'document', 'format_entries_for_api'})
+        self.assertEqual(events['document']['args']['parent_id'], events['run']['args']['span_id'])
+        self.assertEqual(events['format_entries_for_api']['args']['parent_id'], document.span_id)
+        self.assertEqual(events['run']['args']['run_id'], 'abc')
+        self.assertGreaterEqual(events['run']['dur'], events['document']['dur'])
+
+    def test_span_handed_to_another_thread(self):
+        """Test a span made current in another thread parents that thread's spans"""
+        with self.tracer.trace('run') as root:
+            document = self.tracer.start_span('document')
+
+            def work():
+                with self.tracer.use(document):
+                    with self.tracer.span('submit'):
+                        pass
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+            document.finish()
+
+        events = {e['name']: e for e in self._exported(root.trace_id)['traceEvents'] if e['ph'] == 'X'}
+        self.assertEqual(events['submit']['args']['parent_id'], document.span_id)
+        self.assertNotEqual(events['submit']['tid'], events['run']['tid'])
+
+    def test_pipeline_run_is_traced(self):
+        """Test a sampled pipeline run traces each document through its stages"""
+        df = pd.DataFrame({
+            'document_id': [1, 1, 2, 2],
+            'date': ['2024-01-01'] * 4,
+            'account_code': ['11050501', '11100501'] * 2,
+            'movement': ['Debit', 'Credit'] * 2,
+            'customer_identification': ['13832081'] * 4,
+            'branch_office': [0] * 4,
+            'description': ['Test'] * 4,
+            'cost_center': [235] * 4,
+            'value': [100.0] * 4,
+            'observations': ['Observaciones'] * 4
+        })
+        api_client = MagicMock()
+        api_client.create_journal_entry.return_value = {'id': 'x'}
+        results = []
+        with patch('utils.processing.tracer', self.tracer):
+            summary = DocumentPipeline(api_client, sinks=[CallbackSink(results.append)]).run(df)
+
+        self.assertIsNotNone(summary.trace_id)
+        self.assertTrue(all(r['trace_id'] == summary.trace_id for r in results))
+        events = [e for e in self._exported(summary.trace_id)['traceEvents'] if e['ph'] == 'X']
+        documents = {e['args']['span_id'] for e in events if e['name'] == 'document'}
+        self.assertEqual(len(documents), 2)
+        for name in ('validate_document', 'format_entries_for_api'):
+            self.assertEqual({e['args']['parent_id'] for e in events if e['name'] == name}, documents)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+from utils.work_queue import FairWorkQueue, INTERACTIVE, SCHEDULED, parse_weights
+
+class TestFairWorkQueue(unittest.TestCase):
+    def _admission_order(self, queue, submissions):
+        """Run (company, priority) submissions and return the order they start in"""
+        order = []
+        
+        async def main():
+            gate = asyncio.Event()
+            
+            async def blocker():
+                await gate.wait()
+                
+            # Hold every slot so all submissions queue up before any is admitted
+            holders = [asyncio.create_task(queue.run(f'holder-{i}', blocker))
+                       for i in range(queue.max_concurrency)]
+            await asyncio.sleep(0)
+            
+            async def work(label):
+                order.append(label)
+                await asyncio.sleep(0)
+                
+            tasks = [
+                asyncio.create_task(queue.run(company, lambda label=(company, i): work(label), priority))
+                for i, (company, priority) in enumerate(submissions)
+            ]
+            await asyncio.sleep(0)
+            gate.set()
+            await asyncio.gather(*holders, *tasks)
+            
+        asyncio.run(main())
+        return [company for company, _ in order]
+        
+    def test_companies_share_slots_fairly(self):
+        """Test a tenant with a large backlog does not starve a later one"""
+        queue = FairWorkQueue(max_concurrency=1, per_company_limit=1, weights={})
+        submissions = [('big', SCHEDULED)] * 6 + [('small', SCHEDULED)] * 2
+        order = self._admission_order(queue, submissions)
+        self.assertEqual(order[:5], ['big', 'small', 'big', 'small', 'big'])
+        
+    def test_weights_skew_the_share(self):
+        """Test a company with weight 2 gets twice the admissions"""
+        queue = FairWorkQueue(max_concurrency=1, per_company_limit=1, weights={'gold': 2.0})
+        submissions = [('gold', SCHEDULED)] * 6 + [('basic', SCHEDULED)] * 6
+        order = self._admission_order(queue, submissions)
+        self.assertEqual(order[:6].count('gold'), 4)
+        
+    def test_interactive_runs_before_scheduled(self):
+        """Test interactive work jumps ahead of queued scheduled work"""
+        queue = FairWorkQueue(max_concurrency=1, per_company_limit=1, weights={})
+        submissions = [('a', SCHEDULED), ('b', SCHEDULED), ('ui', INTERACTIVE)]
+        self.assertEqual(self._admission_order(queue, submissions)[0], 'ui')
+        
+    def test_concurrency_caps(self):
+        """Test the global and per-company limits are never exceeded"""
+        queue = FairWorkQueue(max_concurrency=3, per_company_limit=2, weights={})
+        running = {}
+        peaks = {'total': 0, 'a': 0, 'b': 0}
+        
+        async def work(company):
+            running[company] = running.get(company, 0) + 1
+            peaks[company] = max(peaks[company], running[company])
+            peaks['total'] = max(peaks['total'], sum(running.values()))
+            await asyncio.sleep(0.01)
+            running[company] -= 1
+            
+        async def main():
+            await asyncio.gather(*(
+                queue.run(company, lambda company=company: work(company))
+                for company in ['a'] * 5 + ['b'] * 5
+            ))
+        asyncio.run(main())
+        self.assertEqual(peaks['total'], 3)
+        self.assertEqual(peaks['a'], 2)
+        self.assertEqual(peaks['b'], 2)
+        
+    def test_stats_and_cancellation(self):
+        """Test depth and wait are reported and cancelled waiters leave the queue"""
+        queue = FairWorkQueue(max_concurrency=1, per_company_limit=1, weights={})
+        
+        async def main():
+            gate = asyncio.Event()
+            running = asyncio.create_task(queue.run('acme', gate.wait))
+            waiting = [asyncio.create_task(queue.run('acme', gate.wait, priority))
+                       for priority in (SCHEDULED, SCHEDULED, INTERACTIVE)]
+            await asyncio.sleep(0.02)
+            stats = queue.stats('acme')['acme']
+            waiting[0].cancel()
+            await asyncio.sleep(0)
+            depth_after_cancel = sum(queue.stats('acme')['acme']['queued'].values())
+            gate.set()
+            await asyncio.gather(running, *waiting[1:])
+            return stats, depth_after_cancel
+            
+        stats, depth_after_cancel = asyncio.run(main())
+        self.assertEqual(stats['queued'], {'interactive': 1, 'scheduled': 2})
+        self.assertEqual(stats['running'], 1)
+        self.assertGreater(stats['oldest_queued_seconds'], 0.01)
+        self.assertEqual(depth_after_cancel, 2)
+        self.assertEqual(queue.stats('acme')['acme']['running'], 0)
+        self.assertEqual(queue.stats('acme')['acme']['admitted'], 3)
+        
+    def test_parse_weights(self):
+        self.assertEqual(parse_weights('ACME=2, Globex S.A.=0.5'), {'ACME': 2.0, 'Globex S.A.': 0.5})
+        self.assertEqual(parse_weights(None), {})
+
+if __name__ == '__main__':
+    unittest.main()
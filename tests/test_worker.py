@@ -0,0 +1,117 @@
+import unittest
+import asyncio
+import os
+import threading
+import time as time_module
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from utils.database import TaskDatabase
+from utils.processing import RunSummary
+from utils.worker import TaskWorker
+
+class TestTaskWorker(unittest.TestCase):
+    def setUp(self):
+        self.test_db_path = "test_worker.db"
+        self.db = TaskDatabase(self.test_db_path)
+        asyncio.run(self.db.initialize())
+        
+    def tearDown(self):
+        self.db.close()
+        if os.path.exists(self.test_db_path):
+            os.remove(self.test_db_path)
+            
+    def _add_task(self, company_name, next_run):
+        return asyncio.run(self.db.add_task({
+            'company_name': company_name,
+            'file': 'test.xlsx',
+            'file_hash': 'abc',
+            'frequency': 'daily',
+            'next_run': next_run.strftime('%Y-%m-%d %H:%M:%S'),
+            'run_at': '09:00'
+        }))
+        
+    def test_workers_share_the_schedule(self):
+        """Test several workers on one database run each due task exactly once"""
+        now = datetime.now()
+        for minutes in range(8):
+            self._add_task(f'company-{minutes % 3}', now - timedelta(minutes=minutes))
+        runs = []
+        lock = threading.Lock()
+        
+        def fake_run(file_hash, task_id, company_name):
+            with lock:
+                runs.append((company_name, task_id))
+            time_module.sleep(0.05)
+            summary = RunSummary(f'run-{task_id}')
+            summary.add({'document_id': 1, 'status': 'Success'})
+            return summary
+            
+        workers = [TaskWorker(max_concurrent_jobs=2, worker_id=f'worker-{i}') for i in range(3)]
+        
+        async def drain():
+            # Keep polling until nothing is due or running any more
+            while True:
+                claimed = sum(await asyncio.gather(*(worker.poll_once() for worker in workers)))
+                in_flight = [run for worker in workers for run in worker._in_flight]
+                if not claimed and not in_flight:
+                    return
+                if in_flight:
+                    await asyncio.wait(in_flight)
+                    
+        with patch('utils.scheduler.task_db', self.db), patch('utils.worker.task_db', self.db), \
+                patch.object(TaskWorker, '_run_scheduled_entries', side_effect=fake_run):
+            workers[0].run(drain(), timeout=30)
+            
+        self.assertEqual(len(runs), 8)
+        self.assertEqual(len(set(runs)), 8)
+        tasks = asyncio.run(self.db.list_all_tasks())
+        self.assertTrue(all(task['next_run'] > now.strftime('%Y-%m-%d %H:%M:%S') for task in tasks))
+        self.assertEqual(asyncio.run(self.db.get_leases()), [])
+        
+    def test_tasks_waiting_longer_than_the_lease_run_once(self):
+        """Test a task queued behind its company's running task is not leased, so it never runs twice"""
+        now = datetime.now()
+        task_ids = [self._add_task('ACME', now - timedelta(minutes=minutes)) for minutes in (2, 1)]
+        runs = []
+        lock = threading.Lock()
+        
+        def fake_run(file_hash, task_id, company_name):
+            with lock:
+                runs.append(task_id)
+            # Longer than the lease, so an unrenewed lease would expire meanwhile
+            time_module.sleep(2.5)
+            return RunSummary(f'run-{task_id}')
+            
+        workers = [TaskWorker(max_concurrent_jobs=2, lease_seconds=2, worker_id=f'worker-{i}') for i in range(2)]
+        
+        async def drain():
+            await workers[0].poll_once()
+            await asyncio.sleep(0.2)
+            await workers[1].poll_once()
+            # Poll again while runs are going on, as a serving worker would
+            for _ in range(12):
+                await asyncio.sleep(0.3)
+                await asyncio.gather(*(worker.poll_once() for worker in workers))
+            in_flight = [run for worker in workers for run in worker._in_flight]
+            if in_flight:
+                await asyncio.wait(in_flight)
+                
+        with patch('utils.scheduler.task_db', self.db), patch('utils.worker.task_db', self.db), \
+                patch.object(TaskWorker, '_run_scheduled_entries', side_effect=fake_run):
+            workers[0].run(drain(), timeout=30)
+            
+        self.assertEqual(sorted(runs), sorted(task_ids))
+        self.assertEqual(asyncio.run(self.db.get_leases()), [])
+        
+    def test_serve_once_runs_due_tasks(self):
+        """Test a one-shot serve claims, runs and waits for due tasks"""
+        self._add_task('ACME', datetime.now() - timedelta(minutes=1))
+        worker = TaskWorker(max_concurrent_jobs=1, worker_id='once')
+        with patch('utils.scheduler.task_db', self.db), patch('utils.worker.task_db', self.db), \
+                patch.object(TaskWorker, '_run_scheduled_entries',
+                             return_value=RunSummary('run')) as mock_run:
+            worker.run(worker.serve(once=True), timeout=30)
+        mock_run.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
 import requests
 import os
+import re
+import time
 from datetime import datetime
 from utils.logger import error_logger
+from utils.metrics import API_LATENCY
+from utils.tracing import traced
 import jwt
 
+def company_env(name, company_name):
+    """Per-company variant of a credentials variable, e.g. SIIGO_USERNAME_ACME_SAS"""
+    return f"{name}_{re.sub(r'[^A-Za-z0-9]+', '_', company_name).strip('_').upper()}"
+
 class SiigoAPI:
     def __init__(self, username, access_key):
         self.username = username
@@ -12,6 +20,40 @@ class SiigoAPI:
         self.token = None
         self.company_name = None
         
+    @classmethod
+    def from_env(cls, company_name=None):
+        """Create an authenticated client from SIIGO_USERNAME and SIIGO_ACCESS_KEY.
+        
+        With ``company_name`` the company's own SIIGO_USERNAME_<COMPANY> and
+        SIIGO_ACCESS_KEY_<COMPANY> are used when set, and the client must log
+        in to that company, so a run never posts to another company's books.
+        """
+        username = os.getenv('SIIGO_USERNAME')
+        access_key = os.getenv('SIIGO_ACCESS_KEY')
+        if company_name:
+            username = os.getenv(company_env('SIIGO_USERNAME', company_name), username)
+            access_key = os.getenv(company_env('SIIGO_ACCESS_KEY', company_name), access_key)
+        if not username or not access_key:
+            raise Exception("Missing credentials. Please check environment variables.")
+        client = cls(username, access_key)
+        if not client.authenticate():
+            raise Exception("Authentication failed")
+        if company_name and client.company_name != company_name:
+            raise Exception(f"Credentials log in to {client.company_name}, not {company_name}")
+        return client
+        
+    @staticmethod
+    def _timed(endpoint, send, *args, **kwargs):
+        """Send a request, recording its latency per endpoint and outcome"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = send(*args, **kwargs)
+            outcome = str(getattr(response, 'status_code', 'ok'))
+            return response
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, outcome=outcome)
+        
     def _extract_company_name(self, token):
         """Extract company name from JWT token"""
         try:
@@ -31,7 +73,7 @@ class SiigoAPI:
                 "Content-Type": "application/json",
                 "Partner-Id": "EmpreSAAS"
             }
-            response = requests.post(
+            response = self._timed('auth', requests.post,
                 f"{self.base_url}/auth",
                 headers=headers,
                 json={
@@ -70,6 +112,7 @@ class SiigoAPI:
             )
             return False
     
+    @traced()
     def create_journal_entry(self, entry_data):
         """Create a journal entry in Siigo"""
         if not self.token:
@@ -84,7 +127,7 @@ class SiigoAPI:
         }
         
         try:
-            response = requests.post(
+            response = self._timed('journals', requests.post,
                 f"{self.base_url}/v1/journals",
                 headers=headers,
                 json=entry_data
@@ -128,7 +171,7 @@ class SiigoAPI:
         }
 
         try:
-            response = requests.get(
+            response = self._timed('cost-centers', requests.get,
                 f"{self.base_url}/v1/cost-centers",
                 headers=headers
             )
@@ -157,7 +200,7 @@ class SiigoAPI:
         }
 
         try:
-            response = requests.get(
+            response = self._timed('document-types', requests.get,
                 f"{self.base_url}/v1/document-types",
                 headers=headers,
                 params={"type": "CC"}  # Filter for journal vouchers
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, List
+from utils.logger import error_logger
+
+class BlobStore:
+    """Content-addressed store for scheduled task input files.
+
+    Blobs are keyed by the SHA-256 of their uncompressed content, so the same
+    workbook scheduled twice is stored once. Each blob is gzip-compressed
+    under ``root/<first two hex chars>/<hash>.gz``.
+    """
+
+    def __init__(self, root: str = "blobs"):
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.gz"
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` and return its content hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if path.exists():
+            # Refresh the mtime so garbage collection's grace period restarts
+            path.touch()
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def put_file(self, file) -> str:
+        """Store an uploaded file, file-like object or path and return its content hash"""
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'rb') as f:
+                return self.put(f.read())
+        if hasattr(file, 'getvalue'):
+            return self.put(file.getvalue())
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        return self.put(data)
+
+    def get(self, digest: str) -> bytes:
+        """Load a blob's content, verifying it against its hash"""
+        path = self._path(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Blob {digest} not found")
+        data = gzip.decompress(path.read_bytes())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Blob {digest} is corrupted")
+        return data
+
+    def open(self, digest: str) -> BytesIO:
+        """Load a blob as an in-memory file object"""
+        file = BytesIO(self.get(digest))
+        file.name = digest
+        return file
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def list_digests(self) -> List[str]:
+        """Hashes of every stored blob"""
+        return sorted(path.name[:-len('.gz')] for path in self.root.glob('*/*.gz'))
+
+    def collect_garbage(self, referenced: Iterable[str], grace_seconds: float = 3600) -> int:
+        """Delete blobs not in ``referenced``.
+
+        Blobs written in the last ``grace_seconds`` are kept, so a file stored
+        just before its task row is committed is not collected in between.
+        """
+        referenced = set(referenced)
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for digest in self.list_digests():
+            path = self._path(digest)
+            if digest in referenced:
+                continue
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            error_logger.log_info(f"Removed {removed} unreferenced blobs")
+        return removed
+
+# Create global blob store instance
+blob_store = BlobStore(os.getenv('SIIGO_BLOB_DIR', 'blobs'))
@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Separates field values in the search text, so a match can be anchored to a whole field
+FIELD_SEPARATOR = '\x1f'
+
+class CatalogIndex:
+    """Search index over one catalog (cost centers, document types), built once per load.
+
+    Every record's values are lowercased into a single text column, with each
+    value wrapped in field separators. A query is split into terms; a record
+    matches when it contains every term, and ranks by how each term matched:
+    a whole value (e.g. a code typed in full) first, then the start of a word,
+    then anywhere. Each term costs a few vectorized string scans.
+    """
+
+    # Term score by match kind; lower ranks first
+    EXACT, PREFIX, SUBSTRING = 0, 1, 2
+
+    def __init__(self, records: Optional[List[Dict]]):
+        self.df = pd.DataFrame(records)
+        self._last = (None, None)
+        if self.df.empty:
+            self._text = pd.Series([], dtype=object)
+            return
+        text = pd.Series(FIELD_SEPARATOR, index=self.df.index)
+        for column in self.df.columns:
+            text += self.df[column].astype(str).str.lower() + FIELD_SEPARATOR
+        self._text = text
+
+    def search(self, query: str = '') -> np.ndarray:
+        """Positions of the records matching every term of ``query``, best first"""
+        terms = query.lower().split()
+        if not terms:
+            return np.arange(len(self.df))
+        # Paging through one query does not scan again
+        if self._last[0] == terms:
+            return self._last[1]
+        score = np.zeros(len(self.df), dtype=np.int64)
+        matched = np.ones(len(self.df), dtype=bool)
+        for term in terms:
+            substring = self._text.str.contains(term, regex=False).to_numpy()
+            prefix = (self._text.str.contains(FIELD_SEPARATOR + term, regex=False).to_numpy()
+                      | self._text.str.contains(' ' + term, regex=False).to_numpy())
+            exact = self._text.str.contains(FIELD_SEPARATOR + term + FIELD_SEPARATOR, regex=False).to_numpy()
+            matched &= substring
+            score += np.where(exact, self.EXACT, np.where(prefix, self.PREFIX, self.SUBSTRING))
+        positions = np.flatnonzero(matched)
+        # Stable, so records that score the same keep their catalog order
+        positions = positions[np.argsort(score[positions], kind='stable')]
+        self._last = (terms, positions)
+        return positions
+
+    def page(self, query: str = '', page: int = 1, page_size: int = 50) -> Tuple[pd.DataFrame, int]:
+        """One page of the ranked matches and how many records match"""
+        positions = self.search(query)
+        start = (max(page, 1) - 1) * page_size
+        return self.df.iloc[positions[start:start + page_size]], len(positions)
@@ -1,52 +1,503 @@
 import aiosqlite
 import asyncio
-from datetime import datetime
+import concurrent.futures
+import hashlib
+import heapq
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Dict, List, Optional
 import json
+from utils.event_loop import get_event_loop_thread
+from utils.logger import error_logger
+from utils.metrics import DB_WRITE_LATENCY
+
+# Versioned schema migrations. Entry N (1-based) upgrades a database from
+# schema version N-1 to N; the applied version is tracked in PRAGMA user_version.
+# Migrations are append-only: never edit one that has shipped, add a new one.
+MIGRATIONS = [
+    # 1: base tables (IF NOT EXISTS so pre-migration databases adopt version 1)
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS scheduled_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            frequency TEXT NOT NULL,
+            next_run TIMESTAMP NOT NULL,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            day_of_week INTEGER,
+            day_of_month INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            run_time TIMESTAMP NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            FOREIGN KEY (task_id) REFERENCES scheduled_tasks (id)
+        )
+        ''',
+    ),
+    # 2: indexes for the company/status/next_run and task/run_time access paths
+    (
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_tasks_company_next_run
+        ON scheduled_tasks (company_name, next_run)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_tasks_company_status_next_run
+        ON scheduled_tasks (company_name, status, next_run)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_task_history_company_task_run_time
+        ON task_history (company_name, task_id, run_time)
+        ''',
+    ),
+    # 3: per-document processing results and per-run counters
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS processing_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL UNIQUE,
+            company_name TEXT NOT NULL,
+            task_id INTEGER,
+            source TEXT NOT NULL,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total INTEGER NOT NULL DEFAULT 0,
+            succeeded INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            total_latency_ms REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS processed_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            task_id INTEGER,
+            document_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            siigo_id TEXT,
+            latency_ms REAL,
+            error TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processing_runs_company_id
+        ON processing_runs (company_name, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processed_documents_company_id
+        ON processed_documents (company_name, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processed_documents_company_status_id
+        ON processed_documents (company_name, status, id)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processed_documents_run_id
+        ON processed_documents (run_id, id)
+        ''',
+    ),
+    # 4: run metrics on task_history plus daily/monthly rollups for retention
+    (
+        'ALTER TABLE task_history ADD COLUMN duration_ms REAL',
+        'ALTER TABLE task_history ADD COLUMN documents_posted INTEGER',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_task_history_run_time
+        ON task_history (run_time)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_history_daily (
+            company_name TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            runs INTEGER NOT NULL,
+            succeeded INTEGER NOT NULL,
+            partial INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            documents_posted INTEGER NOT NULL,
+            p50_duration_ms REAL,
+            p95_duration_ms REAL,
+            PRIMARY KEY (company_name, task_id, period)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS task_history_monthly (
+            company_name TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            runs INTEGER NOT NULL,
+            succeeded INTEGER NOT NULL,
+            partial INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            documents_posted INTEGER NOT NULL,
+            p50_duration_ms REAL,
+            p95_duration_ms REAL,
+            PRIMARY KEY (company_name, task_id, period)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            rolled_up_to TEXT NOT NULL
+        )
+        ''',
+    ),
+    # 5: content hash of the task's input file in the blob store
+    (
+        'ALTER TABLE scheduled_tasks ADD COLUMN file_hash TEXT',
+    ),
+    # 6: time of day ('HH:MM') so triggers can be rebuilt after a restart
+    (
+        'ALTER TABLE scheduled_tasks ADD COLUMN run_at TEXT',
+        "UPDATE scheduled_tasks SET run_at = strftime('%H:%M', next_run) WHERE run_at IS NULL",
+    ),
+    # 7: leases so several worker processes can share the schedule
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS task_leases (
+            company_name TEXT NOT NULL,
+            task_id INTEGER NOT NULL,
+            worker_id TEXT NOT NULL,
+            claimed_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (company_name, task_id)
+        )
+        ''',
+    ),
+    # 8: per-task window (minutes) that the start time is spread across
+    (
+        'ALTER TABLE scheduled_tasks ADD COLUMN spread_minutes INTEGER',
+    ),
+    # 9: run state so interrupted runs can resume from their journaled documents
+    (
+        "ALTER TABLE processing_runs ADD COLUMN state TEXT NOT NULL DEFAULT 'completed'",
+        'ALTER TABLE processing_runs ADD COLUMN file_hash TEXT',
+        'ALTER TABLE processing_runs ADD COLUMN expected INTEGER',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_processing_runs_company_state
+        ON processing_runs (company_name, state)
+        ''',
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Rollup granularities: table name and the strftime format of the period key
+ROLLUP_TABLES = {
+    'daily': ('task_history_daily', '%Y-%m-%d'),
+    'monthly': ('task_history_monthly', '%Y-%m'),
+}
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(-(-pct * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
+
+def _rollup(rows, period_format: str) -> List[tuple]:
+    """Aggregate raw history rows into (company, task, period) rollup rows"""
+    groups = {}
+    for row in rows:
+        run_time = datetime.strptime(row['run_time'][:19], '%Y-%m-%d %H:%M:%S')
+        key = (row['company_name'], row['task_id'], run_time.strftime(period_format))
+        group = groups.setdefault(key, {
+            'runs': 0, 'success': 0, 'partial': 0, 'failed': 0, 'documents': 0, 'durations': []
+        })
+        group['runs'] += 1
+        if row['status'] in ('success', 'partial', 'failed'):
+            group[row['status']] += 1
+        group['documents'] += row['documents_posted'] or 0
+        if row['duration_ms'] is not None:
+            group['durations'].append(row['duration_ms'])
+    return [
+        key + (
+            group['runs'], group['success'], group['partial'], group['failed'], group['documents'],
+            _percentile(group['durations'], 50), _percentile(group['durations'], 95)
+        )
+        for key, group in groups.items()
+    ]
+
+class WriteBehindBuffer:
+    """Collect task history and status writes and flush them in one transaction.
+    
+    Writes are handed to a background flusher thread, which commits them once
+    ``max_size`` writes are pending or the oldest has waited ``max_delay``
+    seconds. Status updates for the same task coalesce to the latest value.
+    Each batch is written on the process event loop; one not written within
+    ``flush_timeout`` seconds (e.g. the loop stopped under it) is requeued.
+    """
+    
+    def __init__(self, database: 'TaskDatabase', max_size: int = 100, max_delay: float = 2.0,
+                 flush_timeout: float = 60.0):
+        self.database = database
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.flush_timeout = flush_timeout
+        self._history: List[tuple] = []
+        self._status: Dict[tuple, tuple] = {}
+        self._oldest: Optional[float] = None
+        self._flush_requested = False
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        
+    def add_task_history(self, task_id: int, company_name: str, status: str, result: Optional[Dict] = None,
+                         duration_ms: Optional[float] = None, documents_posted: Optional[int] = None):
+        """Queue a task history row"""
+        # Stamp now, in the same UTC format as CURRENT_TIMESTAMP, not at flush time
+        run_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._cond:
+            self._history.append(
+                (company_name, task_id, run_time, status, json.dumps(result) if result else None,
+                 duration_ms, documents_posted)
+            )
+            self._pending_added()
+            
+    def update_task_status(self, task_id: int, next_run: str, status: str, company_name: str):
+        """Queue a task status update, replacing any pending one for the same task"""
+        with self._cond:
+            self._status[(task_id, company_name)] = (next_run, status)
+            self._pending_added()
+            
+    def pending(self) -> int:
+        """Number of writes waiting to be flushed"""
+        with self._cond:
+            return len(self._history) + len(self._status)
+            
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been written"""
+        with self._cond:
+            if not self._history and not self._status and not self._writing:
+                return True
+            self._ensure_thread()
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: not self._history and not self._status and not self._writing,
+                timeout
+            )
+            
+    def close(self, timeout: Optional[float] = None):
+        """Flush pending writes and stop the flusher thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join(timeout)
+            
+    def _pending_added(self):
+        if self._closed:
+            raise RuntimeError("Write buffer is closed")
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._ensure_thread()
+        if len(self._history) + len(self._status) >= self.max_size:
+            self._cond.notify_all()
+            
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='task-db-write-behind', daemon=True
+            )
+            self._thread.start()
+            
+    def _due(self) -> bool:
+        pending = len(self._history) + len(self._status)
+        if not pending:
+            return False
+        return (
+            self._closed
+            or self._flush_requested
+            or pending >= self.max_size
+            or time.monotonic() - self._oldest >= self.max_delay
+        )
+        
+    def _take(self):
+        history, status = self._history, self._status
+        self._history, self._status = [], {}
+        self._oldest = None
+        self._flush_requested = False
+        return history, status
+        
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed:
+                        self._cond.notify_all()
+                        return
+                    timeout = None
+                    if self._oldest is not None:
+                        timeout = max(self._oldest + self.max_delay - time.monotonic(), 0)
+                    self._cond.wait(timeout)
+                history, status = self._take()
+                self._writing = True
+            try:
+                self._write(history, status)
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+                    
+    def _write(self, history: List[tuple], status: Dict[tuple, tuple]):
+        future = get_event_loop_thread().submit(self.database._write_buffered(history, status))
+        try:
+            future.result(self.flush_timeout)
+        except Exception as e:
+            if isinstance(e, concurrent.futures.TimeoutError):
+                future.cancel()
+            error_logger.log_error(
+                'processing_errors',
+                f"Error flushing buffered task writes: {str(e)}",
+                {'history_rows': len(history), 'status_updates': len(status)}
+            )
+            with self._cond:
+                if not self._closed:
+                    # Requeue in front of anything written meanwhile; newer statuses win
+                    self._history[:0] = history
+                    self._status = {**status, **self._status}
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+
+# Tables whose rows belong to one company and move with it between layouts
+COMPANY_TABLES = [
+    'scheduled_tasks', 'task_history', 'processing_runs', 'processed_documents',
+    'task_history_daily', 'task_history_monthly',
+]
+
+# Due, runnable tasks without a live lease; parameters: now, now
+CLAIMABLE_TASKS = '''
+    SELECT t.* FROM scheduled_tasks t
+    LEFT JOIN task_leases l ON l.company_name = t.company_name AND l.task_id = t.id
+    WHERE t.status = 'active' AND t.next_run <= ?
+    AND t.file_hash IS NOT NULL AND t.run_at IS NOT NULL
+    AND (l.task_id IS NULL OR l.expires_at <= ?)
+'''
+
+def shard_file_name(company_name: str) -> str:
+    """File name of a company's shard: a readable slug plus a hash to keep it unique"""
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', company_name).strip('_')[:40] or 'company'
+    digest = hashlib.sha1(company_name.encode('utf-8')).hexdigest()[:10]
+    return f"{slug}-{digest}.db"
 
 class TaskDatabase:
-    def __init__(self, db_path: str = "scheduled_tasks.db"):
+    """Task storage in a single SQLite file, or sharded one file per company.
+    
+    With ``shard_dir`` set, every company-scoped call is routed to
+    ``shard_dir/<shard_file_name(company_name)>`` so tenants never contend
+    for the same database lock. Cross-company reads (admin listings,
+    compaction) fan out over every shard.
+    """
+    
+    def __init__(self, db_path: str = "scheduled_tasks.db", shard_dir: Optional[str] = None):
         self.db_path = db_path
+        self.shard_dir = shard_dir
+        self.write_buffer = WriteBehindBuffer(self)
+        self._migrated = set()
+        
+    @property
+    def sharded(self) -> bool:
+        return self.shard_dir is not None
+        
+    def _path_for(self, company_name: str) -> str:
+        """Database file holding ``company_name``'s data"""
+        if not self.sharded:
+            return self.db_path
+        return os.path.join(self.shard_dir, shard_file_name(company_name))
+    
+    def _all_paths(self) -> List[str]:
+        """Every database file in the current layout"""
+        if not self.sharded:
+            return [self.db_path]
+        return sorted(str(path) for path in Path(self.shard_dir).glob('*.db'))
+    
+    @asynccontextmanager
+    async def _connect(self, company_name: Optional[str] = None, path: Optional[str] = None):
+        """Open the database for a company (or an explicit shard path), migrating it on first use"""
+        path = path or self._path_for(company_name)
+        if self.sharded:
+            os.makedirs(self.shard_dir, exist_ok=True)
+        async with aiosqlite.connect(path) as db:
+            if path not in self._migrated:
+                await self._apply_migrations(db)
+                self._migrated.add(path)
+            yield db
         
     async def initialize(self):
-        """Initialize database tables"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Create scheduled_tasks table with company_name field
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS scheduled_tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    company_name TEXT NOT NULL,
-                    file_name TEXT NOT NULL,
-                    frequency TEXT NOT NULL,
-                    next_run TIMESTAMP NOT NULL,
-                    status TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    day_of_week INTEGER,
-                    day_of_month INTEGER
-                )
-            ''')
-            
-            # Create task_history table with company_name field
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS task_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    company_name TEXT NOT NULL,
-                    task_id INTEGER NOT NULL,
-                    run_time TIMESTAMP NOT NULL,
-                    status TEXT NOT NULL,
-                    result TEXT,
-                    FOREIGN KEY (task_id) REFERENCES scheduled_tasks (id)
+        """Initialize database tables by applying pending migrations"""
+        if self.sharded:
+            os.makedirs(self.shard_dir, exist_ok=True)
+        for path in self._all_paths():
+            async with aiosqlite.connect(path) as db:
+                await self._apply_migrations(db)
+            self._migrated.add(path)
+    
+    async def _apply_migrations(self, db):
+        """Bring the schema up to SCHEMA_VERSION, one transaction per migration.
+        
+        Several processes may start on the same database at once (the app and
+        standalone workers), so each step takes the write lock first and
+        re-reads the version under it, skipping steps another process applied.
+        """
+        version = await self._get_user_version(db)
+        while True:
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(
+                    f"Database schema version {version} is newer than supported version {SCHEMA_VERSION}"
                 )
-            ''')
-            await db.commit()
+            if version == SCHEMA_VERSION:
+                return
+            await db.execute('BEGIN IMMEDIATE')
+            try:
+                version = await self._get_user_version(db)
+                if version >= SCHEMA_VERSION:
+                    await db.rollback()
+                    continue
+                for statement in MIGRATIONS[version]:
+                    await db.execute(statement)
+                version += 1
+                await db.execute(f'PRAGMA user_version = {version}')
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+    
+    @staticmethod
+    async def _get_user_version(db) -> int:
+        cursor = await db.execute('PRAGMA user_version')
+        row = await cursor.fetchone()
+        return row[0]
+    
+    async def get_schema_version(self, company_name: Optional[str] = None) -> int:
+        """Get the schema version currently applied to the (company's) database"""
+        async with aiosqlite.connect(self._path_for(company_name)) as db:
+            return await self._get_user_version(db)
     
     async def add_task(self, task_data: Dict) -> int:
         """Add a new scheduled task"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(task_data['company_name']) as db:
             cursor = await db.execute('''
                 INSERT INTO scheduled_tasks 
-                (company_name, file_name, frequency, next_run, status, day_of_week, day_of_month)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (company_name, file_name, frequency, next_run, status, day_of_week, day_of_month,
+                 file_hash, run_at, spread_minutes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 task_data['company_name'],
                 task_data['file'],
@@ -54,14 +505,17 @@ class TaskDatabase:
                 task_data['next_run'],
                 'active',
                 task_data.get('day_of_week'),
-                task_data.get('day_of_month')
+                task_data.get('day_of_month'),
+                task_data.get('file_hash'),
+                task_data.get('run_at'),
+                task_data.get('spread_minutes')
             ))
             await db.commit()
             return cursor.lastrowid
     
     async def update_task_status(self, task_id: int, next_run: str, status: str, company_name: str):
         """Update task status and next run time"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(company_name) as db:
             await db.execute('''
                 UPDATE scheduled_tasks 
                 SET next_run = ?, status = ?
@@ -69,18 +523,57 @@ class TaskDatabase:
             ''', (next_run, status, task_id, company_name))
             await db.commit()
     
-    async def add_task_history(self, task_id: int, company_name: str, status: str, result: Optional[Dict] = None):
+    async def add_task_history(self, task_id: int, company_name: str, status: str, result: Optional[Dict] = None,
+                               duration_ms: Optional[float] = None, documents_posted: Optional[int] = None):
         """Add task execution history"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(company_name) as db:
             await db.execute('''
-                INSERT INTO task_history (company_name, task_id, run_time, status, result)
-                VALUES (?, ?, CURRENT_TIMESTAMP, ?, ?)
-            ''', (company_name, task_id, status, json.dumps(result) if result else None))
+                INSERT INTO task_history
+                (company_name, task_id, run_time, status, result, duration_ms, documents_posted)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?, ?, ?, ?)
+            ''', (company_name, task_id, status, json.dumps(result) if result else None,
+                  duration_ms, documents_posted))
             await db.commit()
     
+    async def _write_buffered(self, history: List[tuple], status: Dict[tuple, tuple]):
+        """Write a batch of buffered history rows and status updates, one transaction per database"""
+        batches = {}
+        for (task_id, company_name), (next_run, task_status) in status.items():
+            batches.setdefault(self._path_for(company_name), ([], []))[0].append(
+                (next_run, task_status, task_id, company_name)
+            )
+        for row in history:
+            batches.setdefault(self._path_for(row[0]), ([], []))[1].append(row)
+            
+        for path, (status_rows, history_rows) in batches.items():
+            started = time.perf_counter()
+            async with self._connect(path=path) as db:
+                if status_rows:
+                    await db.executemany('''
+                        UPDATE scheduled_tasks 
+                        SET next_run = ?, status = ?
+                        WHERE id = ? AND company_name = ?
+                    ''', status_rows)
+                if history_rows:
+                    await db.executemany('''
+                        INSERT INTO task_history
+                        (company_name, task_id, run_time, status, result, duration_ms, documents_posted)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', history_rows)
+                await db.commit()
+            DB_WRITE_LATENCY.observe(time.perf_counter() - started, operation='task_updates')
+    
+    def flush_writes(self, timeout: Optional[float] = None) -> bool:
+        """Write any buffered history and status updates now"""
+        return self.write_buffer.flush(timeout)
+    
+    def close(self, timeout: Optional[float] = None):
+        """Flush buffered writes and stop the write-behind thread"""
+        self.write_buffer.close(timeout)
+    
     async def get_task(self, task_id: int, company_name: str) -> Dict:
         """Get task details by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(company_name) as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute('''
                 SELECT * FROM scheduled_tasks 
@@ -91,7 +584,7 @@ class TaskDatabase:
     
     async def get_all_tasks(self, company_name: str, status: Optional[str] = None) -> List[Dict]:
         """Get all scheduled tasks for a company"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(company_name) as db:
             db.row_factory = aiosqlite.Row
             query = 'SELECT * FROM scheduled_tasks WHERE company_name = ?'
             params = [company_name]
@@ -106,7 +599,7 @@ class TaskDatabase:
                              start_date: Optional[str] = None,
                              end_date: Optional[str] = None) -> List[Dict]:
         """Get task execution history"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect(company_name) as db:
             db.row_factory = aiosqlite.Row
             query = 'SELECT * FROM task_history WHERE task_id = ? AND company_name = ?'
             params = [task_id, company_name]
@@ -124,18 +617,477 @@ class TaskDatabase:
     
     async def delete_task(self, task_id: int, company_name: str):
         """Delete a scheduled task"""
-        async with aiosqlite.connect(self.db_path) as db:
+        # Land buffered writes first so none of them resurrect the task's history
+        await asyncio.to_thread(self.write_buffer.flush)
+        async with self._connect(company_name) as db:
             await db.execute('DELETE FROM task_history WHERE task_id = ? AND company_name = ?', 
                            (task_id, company_name))
             await db.execute('DELETE FROM scheduled_tasks WHERE id = ? AND company_name = ?', 
                            (task_id, company_name))
+            await db.execute('DELETE FROM task_leases WHERE task_id = ? AND company_name = ?',
+                           (task_id, company_name))
+            await db.commit()
+    
+    async def _claim(self, db, condition: str, params: tuple, worker_id: str, lease_seconds: float,
+                     now: datetime, limit: int) -> List[Dict]:
+        """Lease due, runnable tasks matching ``condition`` to ``worker_id`` in one write transaction"""
+        now_text = now.strftime('%Y-%m-%d %H:%M:%S')
+        expires_at = (now + timedelta(seconds=lease_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+        db.row_factory = aiosqlite.Row
+        # IMMEDIATE takes the write lock up front, so two workers never pick the same row
+        started = time.perf_counter()
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = await db.execute(f'''
+                {CLAIMABLE_TASKS}
+                AND {condition}
+                ORDER BY t.next_run
+                LIMIT ?
+            ''', (now_text, now_text, *params, limit))
+            tasks = [dict(row) for row in await cursor.fetchall()]
+            await db.executemany('''
+                INSERT OR REPLACE INTO task_leases
+                (company_name, task_id, worker_id, claimed_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(task['company_name'], task['id'], worker_id, now_text, expires_at) for task in tasks])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            DB_WRITE_LATENCY.observe(time.perf_counter() - started, operation='claim')
+        return tasks
+    
+    async def claim_due_tasks(self, worker_id: str, lease_seconds: float = 300, limit: int = 1,
+                              now: Optional[datetime] = None) -> List[Dict]:
+        """Lease up to ``limit`` due tasks across all shards, oldest due first.
+        
+        A task is claimable while its lease is missing or expired, so tasks of
+        a worker that died are picked up again once its lease runs out.
+        """
+        now = now or datetime.now()
+        claimed = []
+        for path in self._all_paths():
+            if len(claimed) >= limit:
+                break
+            async with self._connect(path=path) as db:
+                claimed += await self._claim(db, '1 = 1', (), worker_id, lease_seconds, now,
+                                             limit - len(claimed))
+        return claimed
+    
+    async def get_due_tasks(self, limit: int = 1, now: Optional[datetime] = None) -> List[Dict]:
+        """Due, runnable tasks nobody holds a live lease on, oldest due first, across all shards.
+        
+        Nothing is leased: a worker queues these and claims each one with
+        claim_task once it can start it, so tasks waiting for a slot stay
+        claimable by other workers.
+        """
+        now_text = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        per_shard = []
+        for path in self._all_paths():
+            async with self._connect(path=path) as db:
+                db.row_factory = aiosqlite.Row
+                cursor = await db.execute(f'''
+                    {CLAIMABLE_TASKS}
+                    ORDER BY t.next_run
+                    LIMIT ?
+                ''', (now_text, now_text, limit))
+                per_shard.append([dict(row) for row in await cursor.fetchall()])
+        return list(heapq.merge(*per_shard, key=lambda task: task['next_run']))[:limit]
+    
+    async def claim_task(self, task_id: int, company_name: str, worker_id: str, lease_seconds: float = 300,
+                         now: Optional[datetime] = None) -> Optional[Dict]:
+        """Lease one task if it is due and nobody else holds it; None otherwise"""
+        async with self._connect(company_name) as db:
+            tasks = await self._claim(db, 't.id = ? AND t.company_name = ?', (task_id, company_name),
+                                      worker_id, lease_seconds, now or datetime.now(), 1)
+        return tasks[0] if tasks else None
+    
+    async def renew_lease(self, task_id: int, company_name: str, worker_id: str,
+                          lease_seconds: float = 300) -> bool:
+        """Extend a held lease; False if it expired and was taken by another worker"""
+        expires_at = (datetime.now() + timedelta(seconds=lease_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+        async with self._connect(company_name) as db:
+            cursor = await db.execute('''
+                UPDATE task_leases SET expires_at = ?
+                WHERE task_id = ? AND company_name = ? AND worker_id = ?
+            ''', (expires_at, task_id, company_name, worker_id))
+            await db.commit()
+            return cursor.rowcount > 0
+    
+    async def complete_task_run(self, task_id: int, company_name: str, worker_id: str, next_run: str) -> bool:
+        """Advance a leased task to its next run and release the lease atomically.
+        
+        Unfinished runs of the finished occurrence are marked 'abandoned'.
+        Returns False, changing nothing, if ``worker_id`` no longer holds the lease.
+        """
+        async with self._connect(company_name) as db:
+            await db.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = await db.execute(
+                    'DELETE FROM task_leases WHERE task_id = ? AND company_name = ? AND worker_id = ?',
+                    (task_id, company_name, worker_id)
+                )
+                if cursor.rowcount == 0:
+                    await db.rollback()
+                    return False
+                await db.execute(
+                    'UPDATE scheduled_tasks SET next_run = ? WHERE id = ? AND company_name = ?',
+                    (next_run, task_id, company_name)
+                )
+                # Runs of the occurrence left unfinished (e.g. skipped after a crash) must not
+                # be resumed by the next occurrence
+                await db.execute('''
+                    UPDATE processing_runs SET state = 'abandoned', updated_at = CURRENT_TIMESTAMP
+                    WHERE company_name = ? AND task_id = ? AND source = 'scheduled'
+                    AND state IN ('running', 'cancelled')
+                ''', (company_name, task_id))
+                await db.commit()
+                return True
+            except Exception:
+                await db.rollback()
+                raise
+    
+    async def get_leases(self) -> List[Dict]:
+        """Get every held lease across all shards, for worker monitoring"""
+        leases = []
+        for path in self._all_paths():
+            async with self._connect(path=path) as db:
+                db.row_factory = aiosqlite.Row
+                cursor = await db.execute('SELECT * FROM task_leases ORDER BY claimed_at')
+                leases += [dict(row) for row in await cursor.fetchall()]
+        return leases
+
+    async def add_processed_documents(self, records: List[Dict], source: str = 'manual'):
+        """Bulk insert per-document results and roll them into their run counters"""
+        batches = {}
+        for record in records:
+            batches.setdefault(self._path_for(record['company_name']), []).append(record)
+        for path, batch in batches.items():
+            await self._add_processed_documents(path, batch, source)
+    
+    async def _add_processed_documents(self, path: str, records: List[Dict], source: str):
+        runs = {}
+        for record in records:
+            run = runs.setdefault(record['run_id'], {
+                'company_name': record['company_name'],
+                'task_id': record.get('task_id'),
+                'total': 0, 'succeeded': 0, 'failed': 0, 'latency': 0.0
+            })
+            run['total'] += 1
+            run['succeeded' if record['status'] == 'Success' else 'failed'] += 1
+            run['latency'] += record.get('latency_ms') or 0.0
+            
+        started = time.perf_counter()
+        async with self._connect(path=path) as db:
+            await db.executemany('''
+                INSERT INTO processed_documents
+                (company_name, run_id, task_id, document_id, status, siigo_id, latency_ms, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                record['company_name'],
+                record['run_id'],
+                record.get('task_id'),
+                str(record['document_id']),
+                record['status'],
+                record.get('siigo_id'),
+                record.get('latency_ms'),
+                record.get('error')
+            ) for record in records])
+            await db.executemany('''
+                INSERT INTO processing_runs
+                (run_id, company_name, task_id, source, total, succeeded, failed, total_latency_ms)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id) DO UPDATE SET
+                    total = total + excluded.total,
+                    succeeded = succeeded + excluded.succeeded,
+                    failed = failed + excluded.failed,
+                    total_latency_ms = total_latency_ms + excluded.total_latency_ms,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [(
+                run_id, run['company_name'], run['task_id'], source,
+                run['total'], run['succeeded'], run['failed'], run['latency']
+            ) for run_id, run in runs.items()])
             await db.commit()
+        DB_WRITE_LATENCY.observe(time.perf_counter() - started, operation='processed_documents')
+    
+    async def start_processing_run(self, run_id: str, company_name: str, source: str = 'manual',
+                                   task_id: Optional[int] = None, file_hash: Optional[str] = None,
+                                   expected: Optional[int] = None):
+        """Mark a run as running, creating it if new (a resumed run keeps its counters)"""
+        async with self._connect(company_name) as db:
+            await db.execute('''
+                INSERT INTO processing_runs
+                (run_id, company_name, task_id, source, state, file_hash, expected)
+                VALUES (?, ?, ?, ?, 'running', ?, ?)
+                ON CONFLICT (run_id) DO UPDATE SET
+                    state = 'running',
+                    file_hash = COALESCE(excluded.file_hash, file_hash),
+                    expected = COALESCE(excluded.expected, expected),
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (run_id, company_name, task_id, source, file_hash, expected))
+            await db.commit()
+    
+    async def finish_processing_run(self, run_id: str, company_name: str, state: str = 'completed'):
+        """Record how a run ended: 'completed', 'abandoned', or 'cancelled' to leave it resumable"""
+        async with self._connect(company_name) as db:
+            await db.execute(
+                'UPDATE processing_runs SET state = ?, updated_at = CURRENT_TIMESTAMP WHERE run_id = ?',
+                (state, run_id)
+            )
+            await db.commit()
+    
+    async def get_run_checkpoint(self, run_id: str, company_name: str) -> set:
+        """Get the document ids a run has already journaled, whatever their outcome"""
+        async with self._connect(company_name) as db:
+            cursor = await db.execute(
+                'SELECT document_id FROM processed_documents WHERE run_id = ?', (run_id,)
+            )
+            return {row[0] for row in await cursor.fetchall()}
+    
+    async def get_resumable_runs(self, company_name: str, source: Optional[str] = None,
+                                 task_id: Optional[int] = None) -> List[Dict]:
+        """Get unfinished runs (crashed or cancelled) whose input file is stored, newest first"""
+        async with self._connect(company_name) as db:
+            db.row_factory = aiosqlite.Row
+            query = '''
+                SELECT * FROM processing_runs
+                WHERE company_name = ? AND state IN ('running', 'cancelled') AND file_hash IS NOT NULL
+            '''
+            params = [company_name]
+            if source:
+                query += ' AND source = ?'
+                params.append(source)
+            if task_id is not None:
+                query += ' AND task_id = ?'
+                params.append(task_id)
+            cursor = await db.execute(query + ' ORDER BY id DESC', params)
+            return [dict(row) for row in await cursor.fetchall()]
+    
+    async def get_processed_documents(self, company_name: str, status: Optional[str] = None,
+                                      run_id: Optional[str] = None,
+                                      before_id: Optional[int] = None,
+                                      limit: int = 50) -> List[Dict]:
+        """Get a page of processed documents, newest first.
+        
+        Pages are keyset-based: pass the smallest ``id`` of the previous page
+        as ``before_id`` to fetch the next one.
+        """
+        async with self._connect(company_name) as db:
+            db.row_factory = aiosqlite.Row
+            query = 'SELECT * FROM processed_documents WHERE company_name = ?'
+            params = [company_name]
+            if status:
+                query += ' AND status = ?'
+                params.append(status)
+            if run_id:
+                query += ' AND run_id = ?'
+                params.append(run_id)
+            if before_id is not None:
+                query += ' AND id < ?'
+                params.append(before_id)
+            cursor = await db.execute(query + ' ORDER BY id DESC LIMIT ?', params + [limit])
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def get_processing_runs(self, company_name: str, before_id: Optional[int] = None,
+                                  limit: int = 20) -> List[Dict]:
+        """Get a page of processing runs with their counters, newest first"""
+        async with self._connect(company_name) as db:
+            db.row_factory = aiosqlite.Row
+            query = 'SELECT * FROM processing_runs WHERE company_name = ?'
+            params = [company_name]
+            if before_id is not None:
+                query += ' AND id < ?'
+                params.append(before_id)
+            cursor = await db.execute(query + ' ORDER BY id DESC LIMIT ?', params + [limit])
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+    async def compact_history(self, retention_days: int = 90, now: Optional[datetime] = None) -> Dict:
+        """Roll closed days and months of task history into aggregate tables and
+        prune raw rows older than ``retention_days``.
+        
+        Each period is rolled up once, after it has closed, so reruns are cheap
+        and idempotent. Raw rows are never pruned before their month is rolled up.
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        boundaries = {
+            'daily': now.strftime('%Y-%m-%d 00:00:00'),
+            'monthly': now.strftime('%Y-%m-01 00:00:00'),
+        }
+        summary = {'daily': 0, 'monthly': 0, 'pruned': 0}
+        for path in self._all_paths():
+            shard_summary = await self._compact_history(path, retention_days, now, boundaries)
+            for key, value in shard_summary.items():
+                summary[key] += value
+        return summary
+    
+    async def _compact_history(self, path: str, retention_days: int, now: datetime,
+                               boundaries: Dict[str, str]) -> Dict:
+        summary = {'daily': 0, 'monthly': 0, 'pruned': 0}
+        async with self._connect(path=path) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute('BEGIN')
+            try:
+                cursor = await db.execute('SELECT name, rolled_up_to FROM rollup_watermarks')
+                watermarks = {row['name']: row['rolled_up_to'] for row in await cursor.fetchall()}
+                
+                for granularity, boundary in boundaries.items():
+                    table, period_format = ROLLUP_TABLES[granularity]
+                    start = watermarks.get(granularity, '')
+                    if start >= boundary:
+                        continue
+                    cursor = await db.execute('''
+                        SELECT company_name, task_id, run_time, status, duration_ms, documents_posted
+                        FROM task_history WHERE run_time >= ? AND run_time < ?
+                    ''', (start, boundary))
+                    rollups = _rollup(await cursor.fetchall(), period_format)
+                    await db.executemany(f'''
+                        INSERT OR REPLACE INTO {table}
+                        (company_name, task_id, period, runs, succeeded, partial, failed,
+                         documents_posted, p50_duration_ms, p95_duration_ms)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', rollups)
+                    await db.execute('''
+                        INSERT OR REPLACE INTO rollup_watermarks (name, rolled_up_to) VALUES (?, ?)
+                    ''', (granularity, boundary))
+                    summary[granularity] = len(rollups)
+                
+                retention_cutoff = (now - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+                cursor = await db.execute(
+                    'DELETE FROM task_history WHERE run_time < ?',
+                    (min(retention_cutoff, *boundaries.values()),)
+                )
+                summary['pruned'] = cursor.rowcount
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return summary
+    
+    async def get_history_rollups(self, company_name: str, granularity: str = 'daily',
+                                  task_id: Optional[int] = None,
+                                  start_period: Optional[str] = None,
+                                  end_period: Optional[str] = None) -> List[Dict]:
+        """Get aggregated run statistics per task and period, newest period first"""
+        table, _ = ROLLUP_TABLES[granularity]
+        async with self._connect(company_name) as db:
+            db.row_factory = aiosqlite.Row
+            query = f'SELECT * FROM {table} WHERE company_name = ?'
+            params = [company_name]
+            if task_id is not None:
+                query += ' AND task_id = ?'
+                params.append(task_id)
+            if start_period:
+                query += ' AND period >= ?'
+                params.append(start_period)
+            if end_period:
+                query += ' AND period <= ?'
+                params.append(end_period)
+            cursor = await db.execute(query + ' ORDER BY period DESC, task_id', params)
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    async def list_companies(self) -> List[str]:
+        """Get every company with scheduled tasks, across all shards"""
+        companies = set()
+        for path in self._all_paths():
+            async with self._connect(path=path) as db:
+                cursor = await db.execute('SELECT DISTINCT company_name FROM scheduled_tasks')
+                companies.update(row[0] for row in await cursor.fetchall())
+        return sorted(companies)
+    
+    async def get_referenced_file_hashes(self) -> set:
+        """Get the input file hashes still referenced by any task or resumable run, across all shards"""
+        hashes = set()
+        for path in self._all_paths():
+            async with self._connect(path=path) as db:
+                cursor = await db.execute('''
+                    SELECT file_hash FROM scheduled_tasks WHERE file_hash IS NOT NULL
+                    UNION
+                    SELECT file_hash FROM processing_runs
+                    WHERE file_hash IS NOT NULL AND state IN ('running', 'cancelled')
+                ''')
+                hashes.update(row[0] for row in await cursor.fetchall())
+        return hashes
+    
+    async def list_all_tasks(self, status: Optional[str] = None) -> List[Dict]:
+        """Get scheduled tasks of every company ordered by next run, for admin views"""
+        per_shard = []
+        for path in self._all_paths():
+            async with self._connect(path=path) as db:
+                db.row_factory = aiosqlite.Row
+                query = 'SELECT * FROM scheduled_tasks'
+                params = []
+                if status:
+                    query += ' WHERE status = ?'
+                    params.append(status)
+                cursor = await db.execute(query + ' ORDER BY next_run', params)
+                per_shard.append([dict(row) for row in await cursor.fetchall()])
+        return list(heapq.merge(*per_shard, key=lambda task: task['next_run']))
 
-# Create global database instance
-task_db = TaskDatabase()
+async def migrate_to_shards(source_path: str, shard_dir: str) -> Dict[str, int]:
+    """Copy a single-file database into one shard per company.
+    
+    Row ids are preserved so task ids stay stable. The source file is left
+    untouched; returns the number of scheduled tasks copied per company.
+    """
+    source = TaskDatabase(source_path)
+    await source.initialize()
+    target = TaskDatabase(shard_dir=shard_dir)
+    await target.initialize()
+    
+    async with aiosqlite.connect(source_path) as db:
+        cursor = await db.execute(
+            ' UNION '.join(f'SELECT company_name FROM {table}' for table in COMPANY_TABLES)
+        )
+        companies = [row[0] for row in await cursor.fetchall()]
+        cursor = await db.execute('SELECT name, rolled_up_to FROM rollup_watermarks')
+        watermarks = await cursor.fetchall()
+    
+    copied = {}
+    for company_name in companies:
+        async with target._connect(company_name) as db:
+            await db.execute('ATTACH DATABASE ? AS source', (source_path,))
+            await db.execute('BEGIN')
+            try:
+                for table in COMPANY_TABLES:
+                    await db.execute(
+                        f'INSERT OR REPLACE INTO main.{table} '
+                        f'SELECT * FROM source.{table} WHERE company_name = ?',
+                        (company_name,)
+                    )
+                await db.executemany(
+                    'INSERT OR REPLACE INTO rollup_watermarks (name, rolled_up_to) VALUES (?, ?)',
+                    watermarks
+                )
+                cursor = await db.execute(
+                    'SELECT COUNT(*) FROM scheduled_tasks WHERE company_name = ?', (company_name,)
+                )
+                copied[company_name] = (await cursor.fetchone())[0]
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            finally:
+                await db.execute('DETACH DATABASE source')
+    return copied
 
-def init_database():
-    """Initialize database tables"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(task_db.initialize())
+# Create global database instance; files are migrated lazily on first connection
+task_db = TaskDatabase(shard_dir=os.getenv('SIIGO_DB_SHARD_DIR'))
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Task database maintenance")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    shard_parser = subcommands.add_parser(
+        'migrate-shards', help="Split a single-file database into per-company shards"
+    )
+    shard_parser.add_argument('source', help="Single-file database, e.g. scheduled_tasks.db")
+    shard_parser.add_argument('shard_dir', help="Directory to write company shards into")
+    args = parser.parse_args()
+    
+    for company, tasks in asyncio.run(migrate_to_shards(args.source, args.shard_dir)).items():
+        print(f"{company}: {tasks} tasks -> {shard_file_name(company)}")
@@ -0,0 +1,118 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Optional
+from utils.logger import error_logger
+
+class EventLoopThread:
+    """A dedicated asyncio event loop running on its own daemon thread.
+
+    Other threads (Streamlit script runs, APScheduler triggers) submit
+    coroutines to it instead of creating a throwaway loop per call. Blocking
+    work is pushed to a bounded thread pool set as the loop's default executor.
+    """
+
+    def __init__(self, name: str = 'siigo-event-loop', max_workers: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers or int(os.getenv('SIIGO_EXECUTOR_WORKERS', '8'))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the loop thread if it is not running yet"""
+        with self._lock:
+            if self.running:
+                return
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f'{self.name}-worker'
+            )
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            started = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(started,), name=self.name, daemon=True
+            )
+            self._thread.start()
+            started.wait()
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(started.set)
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop and return a thread-safe future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("EventLoopThread.run() called from the loop thread; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    async def run_blocking(self, func, *args):
+        """Await a blocking callable on the bounded executor"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Let in-flight coroutines finish (up to ``timeout``), then stop the loop"""
+        with self._lock:
+            if not self.running:
+                return
+
+            async def drain():
+                # Coroutines submitted while draining (e.g. buffered writes of the
+                # jobs that just finished) are waited for too
+                deadline = None if timeout is None else self._loop.time() + timeout
+                while True:
+                    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+                    if not tasks:
+                        return
+                    remaining = None if deadline is None else max(deadline - self._loop.time(), 0)
+                    _, pending = await asyncio.wait(tasks, timeout=remaining)
+                    if pending:
+                        for task in pending:
+                            task.cancel()
+                        await asyncio.wait(pending)
+                        error_logger.log_info(f"Cancelled {len(pending)} unfinished jobs on shutdown")
+                        return
+
+            asyncio.run_coroutine_threadsafe(drain(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._executor.shutdown(wait=True)
+            self._thread = None
+
+_default_loop: Optional[EventLoopThread] = None
+_default_loop_lock = threading.Lock()
+
+def get_event_loop_thread() -> EventLoopThread:
+    """Get the process-wide event loop thread, starting it on first use"""
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None:
+            _default_loop = EventLoopThread()
+        _default_loop.start()
+        return _default_loop
+
+def run_sync(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the process-wide loop from synchronous code"""
+    return get_event_loop_thread().run(coro, timeout)
@@ -1,7 +1,10 @@
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from utils.logger import error_logger
+from utils.metrics import ROWS_PARSED, PARSE_SECONDS
+from utils.tracing import traced
 from utils.template_validator import TemplateValidator
 import jsonschema
 from typing import Dict, Any
@@ -57,10 +60,19 @@ class ExcelProcessor:
             }
         }
         
+    @traced('read_excel')
+    def _read(self):
+        """Read the sheet, counting rows and time for the parse throughput metrics"""
+        started = time.perf_counter()
+        df = pd.read_excel(self.file)
+        PARSE_SECONDS.inc(time.perf_counter() - started)
+        ROWS_PARSED.inc(len(df))
+        return df
+        
     def read_excel(self):
         """Read and validate Excel file"""
         try:
-            df = pd.read_excel(self.file)
+            df = self._read()
             error_logger.log_info(f"Successfully read Excel file with {len(df)} rows")
             
             # Validate template structure and data
@@ -75,6 +87,21 @@ class ExcelProcessor:
             )
             raise Exception(f"Error reading Excel file: {str(e)}")
     
+    def read_rows(self):
+        """Read the Excel file checking only its columns; rows are validated per document"""
+        try:
+            df = self._read()
+            error_logger.log_info(f"Successfully read Excel file with {len(df)} rows")
+            self.template_validator.validate_columns(df)
+            return df
+        except Exception as e:
+            error_logger.log_error(
+                'validation_errors',
+                f"Error reading Excel file: {str(e)}",
+                {'filename': getattr(self.file, 'name', 'unknown')}
+            )
+            raise Exception(f"Error reading Excel file: {str(e)}")
+    
     def _format_date(self, date_value: Any) -> str:
         """Format date to YYYY-MM-DD string"""
         try:
@@ -101,6 +128,7 @@ class ExcelProcessor:
             )
             raise ValueError(f"Invalid payload format: {str(e)}")
     
+    @traced()
     def format_entries_for_api(self, df_group):
         """Format entries according to Siigo API specifications"""
         try:
@@ -1,34 +1,302 @@
+import atexit
+import glob
+import gzip
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import shutil
+import threading
+from collections import deque
 from datetime import datetime
 import json
 from pathlib import Path
+from utils.metrics import ERRORS
+from utils.tracing import current_trace_id
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+except ImportError:
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+# Lowest level written to the log file; DEBUG keeps error details
+LOG_LEVEL = os.getenv('SIIGO_LOG_LEVEL', 'DEBUG').upper()
+# List items and characters per string kept when error details are logged
+LOG_MAX_ITEMS = int(os.getenv('SIIGO_LOG_MAX_ITEMS', '5'))
+LOG_MAX_CHARS = int(os.getenv('SIIGO_LOG_MAX_CHARS', '500'))
+# Structured error events kept in memory for get_recent_errors
+RECENT_ERRORS = int(os.getenv('SIIGO_RECENT_ERRORS', '500'))
+# The log file is compressed and a new one started at this size or at midnight
+LOG_MAX_BYTES = int(os.getenv('SIIGO_LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+# Compressed log archives kept before the oldest are deleted
+LOG_BACKUPS = int(os.getenv('SIIGO_LOG_BACKUPS', '30'))
+
+# Record attributes written as top-level JSON fields when set
+CONTEXT_FIELDS = ('company_name', 'task_id', 'document_id', 'error_type', 'latency_ms', 'trace_id')
+
+def summarize(value, max_items=LOG_MAX_ITEMS, max_chars=LOG_MAX_CHARS):
+    """Copy of ``value`` with long lists and strings cut down for logging"""
+    if isinstance(value, dict):
+        return {key: summarize(item, max_items, max_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        kept = [summarize(item, max_items, max_chars) for item in value[:max_items]]
+        if len(value) > max_items:
+            kept.append(f"... {len(value) - max_items} more items")
+        return kept
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"{value[:max_chars]}... ({len(value)} chars)"
+    return value
+
+def tail_lines(path, end=None, block_size=65536):
+    """Yield the lines of a file newest first, reading backwards from ``end``.
+
+    Only the blocks needed to produce the lines actually consumed are read,
+    so taking the last few lines costs the same however large the file is.
+    """
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END) if end is None else end
+        partial = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + partial).split(b'\n')
+            # The first piece may continue in the previous block
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+        if partial:
+            yield partial.decode('utf-8', errors='replace')
+
+def _parse_error_line(line):
+    """Error event from a log file line, or None for any other line"""
+    if '"error_type"' not in line:
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    error_type = entry.get('error_type')
+    message = entry.get('message', '')
+    prefix = f"{error_type}: "
+    return {
+        'timestamp': entry.get('timestamp'),
+        'type': error_type,
+        'message': message[len(prefix):] if message.startswith(prefix) else message,
+        'company_name': entry.get('company_name')
+    }
+
+def _matches(event, error_type, company_name):
+    return ((error_type is None or event['type'] == error_type)
+            and (company_name is None or event['company_name'] == company_name))
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, message and any context fields"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        details = getattr(record, 'details', None)
+        if details:
+            entry['details'] = summarize(details)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RotatingLogHandler(logging.handlers.BaseRotatingHandler):
+    """Log file handler that rotates at midnight or at ``max_bytes``.
+
+    Rotated files are gzipped to ``<file>.<YYYYmmdd-HHMMSS-ffffff>.gz``,
+    named by the time they were closed, and only the newest ``backups``
+    archives are kept.
+    """
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        super().__init__(filename, 'a', encoding='utf-8')
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._day = self._file_day()
+
+    def _file_day(self):
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            return datetime.fromtimestamp(os.path.getmtime(self.baseFilename)).date()
+        return datetime.now().date()
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if not self.stream.tell():
+            self._day = datetime.fromtimestamp(record.created).date()
+            return False
+        return (self.stream.tell() >= self.max_bytes
+                or datetime.fromtimestamp(record.created).date() != self._day)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        archive = f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.gz"
+        with open(self.baseFilename, 'rb') as source, gzip.open(archive, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.baseFilename)
+        for old in log_archives(self.baseFilename)[:-self.backups or None]:
+            os.remove(old)
+        self.stream = self._open()
+
+def open_log_file(log_dir, name='app'):
+    """Path of the first log file in ``log_dir`` no other process writes to, and the lock held on it.
+
+    A file is only ever written and rotated by the process holding its lock,
+    kept until the lock file is closed: the first process gets
+    ``<name>.jsonl``, others running at the same time (e.g. the Streamlit app
+    and a worker) ``<name>-1.jsonl``, ``<name>-2.jsonl``... Files are reused
+    once their process exits, so their number stays bounded.
+    """
+    slot = 0
+    while True:
+        log_file = os.path.join(log_dir, f"{name}-{slot}.jsonl" if slot else f"{name}.jsonl")
+        lock = open(f"{log_file}.lock", 'a+b')
+        try:
+            _lock_file(lock)
+            return log_file, lock
+        except OSError:
+            lock.close()
+            slot += 1
+
+def log_files(log_dir, name='app'):
+    """Current log files in ``log_dir``, one per process that has written there, first slot first"""
+    pattern = re.compile(rf"{re.escape(name)}(?:-(\d+))?\.jsonl")
+    slots = {}
+    for path in glob.glob(os.path.join(glob.escape(log_dir), f"{glob.escape(name)}*.jsonl")):
+        match = pattern.fullmatch(os.path.basename(path))
+        if match:
+            slots[int(match.group(1) or 0)] = path
+    return [slots[slot] for slot in sorted(slots)]
+
+def log_archives(log_file):
+    """Compressed archives of ``log_file``, oldest first"""
+    return sorted(glob.glob(f"{glob.escape(log_file)}.*.gz"))
+
+def _archive_closed_at(path):
+    stamp = path[:-len('.gz')].rsplit('.', 1)[-1]
+    return datetime.strptime(stamp, '%Y%m%d-%H%M%S-%f').isoformat()
+
+def query_logs(log_file, since=None, until=None, level=None, error_type=None,
+               company_name=None, task_id=None, limit=None):
+    """Yield log entries, oldest first, from the archives of ``log_file`` and the file itself.
+
+    ``since`` and ``until`` are datetimes or ISO strings. Archives closed
+    before ``since`` or opened after ``until`` are not decompressed at all,
+    and lines that cannot match are skipped before being parsed.
+    """
+    since = since.isoformat() if isinstance(since, datetime) else since
+    until = until.isoformat() if isinstance(until, datetime) else until
+    wanted = {name: value for name, value in
+              (('level', level), ('error_type', error_type), ('company_name', company_name),
+               ('task_id', task_id)) if value is not None}
+    # Cheap substring test before a line is parsed
+    needles = [f'"{name}": {json.dumps(value)}' for name, value in wanted.items()]
+    sources, opened_at = [], None
+    for archive in log_archives(log_file):
+        closed_at = _archive_closed_at(archive)
+        if until is not None and opened_at is not None and opened_at > until:
+            break
+        if since is None or closed_at >= since:
+            sources.append(archive)
+        opened_at = closed_at
+    if os.path.exists(log_file) and (until is None or opened_at is None or opened_at <= until):
+        sources.append(log_file)
+
+    found = 0
+    for source in sources:
+        opener = gzip.open if source.endswith('.gz') else open
+        with opener(source, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not all(needle in line for needle in needles):
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if any(entry.get(name) != value for name, value in wanted.items()):
+                    continue
+                timestamp = entry.get('timestamp', '')
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp > until:
+                    return
+                yield entry
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves formatting to the listener thread.
+
+    The stock handler formats each record before queueing it. The queue here
+    never leaves the process, so the record can be handed over as is and its
+    message built by whichever handler finally writes it.
+    """
+
+    def prepare(self, record):
+        return record
 
 class ErrorLogger:
-    def __init__(self):
+    def __init__(self, log_dir="logs", name='siigo_journal_processor'):
         # Create logs directory if it doesn't exist
-        Path("logs").mkdir(exist_ok=True)
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+        
+        # Set up file handler for detailed logging; this process is its only writer
+        self.log_file, self._log_lock = open_log_file(log_dir)
+        self.logger = logging.getLogger(name)
         
-        # Set up file handler for detailed logging
-        self.log_file = f"logs/app_{datetime.now().strftime('%Y%m%d')}.log"
-        self.logger = logging.getLogger('siigo_journal_processor')
-        self.logger.setLevel(logging.DEBUG)
+        # Errors logged from here on are kept in memory until the buffer wraps;
+        # anything older is read back from the end of the file
+        self._recent_errors = deque(maxlen=RECENT_ERRORS)
+        self._recent_lock = threading.Lock()
+        self._buffer_wrapped = False
+        self._file_start = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
         
         # File handler for detailed logging
-        file_handler = logging.FileHandler(self.log_file)
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        file_handler.setFormatter(file_formatter)
-        self.logger.addHandler(file_handler)
+        file_handler = RotatingLogHandler(self.log_file)
+        file_handler.setLevel(LOG_LEVEL)
+        file_handler.setFormatter(JsonFormatter())
         
         # Stream handler for console output
         stream_handler = logging.StreamHandler()
         stream_handler.setLevel(logging.INFO)
         stream_formatter = logging.Formatter('%(levelname)s: %(message)s')
         stream_handler.setFormatter(stream_formatter)
-        self.logger.addHandler(stream_handler)
+        
+        # Callers only enqueue records; a listener thread does the formatting and I/O
+        self.handlers = [file_handler, stream_handler]
+        self._queue = queue.SimpleQueue()
+        self.logger.addHandler(_DeferredQueueHandler(self._queue))
+        self.logger.setLevel(min(handler.level for handler in self.handlers))
+        self.logger.propagate = False
+        self._listener = logging.handlers.QueueListener(
+            self._queue, *self.handlers, respect_handler_level=True
+        )
+        self._listener_lock = threading.Lock()
+        self._listener.start()
+        atexit.register(self.close)
         
         # Initialize error statistics
         self.error_stats = {
@@ -40,40 +308,88 @@ class ErrorLogger:
         
     def log_error(self, error_type, message, details=None):
         """Log an error with details"""
-        error_data = {
+        context = details if isinstance(details, dict) else {}
+        company_name = context.get('company_name')
+        event = {
             'timestamp': datetime.now().isoformat(),
             'type': error_type,
             'message': str(message),
-            'details': details
+            'company_name': company_name
         }
-        
-        self.logger.error(f"{error_type}: {message}")
-        if details:
-            self.logger.debug(f"Error details: {json.dumps(details, indent=2)}")
+        with self._recent_lock:
+            if len(self._recent_errors) == self._recent_errors.maxlen:
+                self._buffer_wrapped = True
+            self._recent_errors.append(event)
+            
+        extra = {field: context.get(field) for field in CONTEXT_FIELDS}
+        extra['error_type'] = error_type
+        extra['trace_id'] = extra['trace_id'] or current_trace_id()
+        # Details are only serialized, by the listener, when DEBUG output is kept
+        extra['details'] = details if self.logger.isEnabledFor(logging.DEBUG) else None
+        self.logger.error(f"{error_type}: {message}", extra=extra)
             
         # Update error statistics
-        if error_type in self.error_stats:
-            self.error_stats[error_type] += 1
+        ERRORS.inc(type=error_type)
+        with self._recent_lock:
+            if error_type in self.error_stats:
+                self.error_stats[error_type] += 1
+            
+    def log_info(self, message, **context):
+        """Log information message, with optional context fields such as company_name or latency_ms"""
+        self.logger.info(message, extra=context)
+        
+    def flush(self):
+        """Wait until every queued record has been written"""
+        with self._listener_lock:
+            if self._listener._thread is None:
+                return
+            self._listener.stop()
+            self._listener.start()
             
-    def log_info(self, message):
-        """Log information message"""
-        self.logger.info(message)
+    def close(self):
+        """Write out queued records and stop the listener thread"""
+        with self._listener_lock:
+            if self._listener._thread is None:
+                return
+            self._listener.stop()
+            for handler in self.handlers:
+                handler.close()
+            self._log_lock.close()
         
     def get_error_stats(self):
         """Get current error statistics"""
-        return self.error_stats
+        with self._recent_lock:
+            return dict(self.error_stats)
         
-    def get_recent_errors(self, limit=10):
-        """Get recent errors from log file"""
+    def get_recent_errors(self, limit=10, error_type=None, company_name=None):
+        """Get the latest ``limit`` errors, oldest first, optionally of one type or company"""
         recent_errors = []
-        try:
-            with open(self.log_file, 'r') as f:
-                lines = f.readlines()
-                error_lines = [line for line in lines if 'ERROR' in line]
-                return error_lines[-limit:]
-        except Exception as e:
-            self.logger.error(f"Error reading log file: {str(e)}")
-            return []
+        with self._recent_lock:
+            for event in reversed(self._recent_errors):
+                if len(recent_errors) == limit:
+                    break
+                if _matches(event, error_type, company_name):
+                    recent_errors.append(dict(event))
+            wrapped = self._buffer_wrapped
+            
+        if len(recent_errors) < limit and (wrapped or self._file_start):
+            # Not enough in memory: the file also holds errors from before this
+            # process started or that the buffer has dropped, so read it back
+            # from the end instead
+            self.flush()
+            recent_errors = []
+            try:
+                for line in tail_lines(self.log_file):
+                    event = _parse_error_line(line)
+                    if event is not None and _matches(event, error_type, company_name):
+                        recent_errors.append(event)
+                        if len(recent_errors) == limit:
+                            break
+            except Exception as e:
+                self.logger.error(f"Error reading log file: {str(e)}")
+                
+        recent_errors.reverse()
+        return recent_errors
 
 # Initialize global logger instance
 error_logger = ErrorLogger()
@@ -0,0 +1,273 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Serve the metrics in Prometheus text format on this port (e.g. 9464) when set
+METRICS_PORT = os.getenv('SIIGO_METRICS_PORT')
+# Also write them to this file every SIIGO_METRICS_INTERVAL seconds when set
+METRICS_FILE = os.getenv('SIIGO_METRICS_FILE')
+METRICS_INTERVAL = float(os.getenv('SIIGO_METRICS_INTERVAL', '15'))
+
+def log_linear_buckets(low: float = 1e-4, high: float = 100.0,
+                       steps: Tuple[float, ...] = (1, 1.25, 1.5, 2, 2.5, 3, 4, 5, 6, 8)) -> List[float]:
+    """HDR-style bucket bounds: the same few steps in every power of ten from ``low`` to ``high``.
+
+    Relative error stays bounded (about 25%) across the whole range, from
+    sub-millisecond SQLite writes to minute-long HTTP calls.
+    """
+    bounds = []
+    exponent = 0
+    while round(low * 10 ** exponent, 12) <= high:
+        decade = low * 10 ** exponent
+        bounds += [bound for bound in (round(decade * step, 12) for step in steps) if bound <= high]
+        exponent += 1
+    return bounds
+
+LATENCY_BUCKETS = log_linear_buckets()
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.values().items())]
+
+class Counter(_Metric):
+    """Monotonic total, e.g. documents submitted or rows parsed"""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Current level, e.g. queue depth"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds) over fixed log-linear buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Optional[List[float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = list(buckets or LATENCY_BUCKETS)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), then count and sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the ``with`` block takes"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            return series[1] if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile, or None with no observations"""
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            if not series or not series[1]:
+                return None
+            counts, total = list(series[0]), series[1]
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return float('inf')
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), count, total) for key, (counts, count, total) in self._series.items()}
+        lines = []
+        for key, (counts, count, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + [float('inf')], counts):
+                cumulative += bucket_count
+                le = 'le="{}"'.format(_format_value(bound) if bound == float('inf') else repr(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics, created once and shared by every thread"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Optional[List[float]] = None) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += metric.samples()
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Write the current metrics to ``path``, replacing it atomically"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_exporters_lock = threading.Lock()
+_exporters_started = False
+
+def start_http_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+def _write_periodically(path: str, interval: float):
+    while True:
+        try:
+            registry.write(path)
+        except Exception as e:
+            logging.getLogger('siigo_journal_processor').error(f"processing_errors: Error writing metrics: {str(e)}")
+        time.sleep(interval)
+
+def start_exporters():
+    """Start the HTTP endpoint and file writer configured through the environment, once per process"""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+    if METRICS_FILE:
+        threading.Thread(target=_write_periodically, args=(METRICS_FILE, METRICS_INTERVAL),
+                         name='metrics-file', daemon=True).start()
+
+# Initialize global registry and the application's metrics
+registry = MetricsRegistry()
+
+API_LATENCY = registry.histogram(
+    'siigo_api_request_seconds', "Siigo API call latency", ('endpoint', 'outcome'))
+ROWS_PARSED = registry.counter('siigo_rows_parsed_total', "Spreadsheet rows read")
+PARSE_SECONDS = registry.counter('siigo_parse_seconds_total', "Time spent reading spreadsheets")
+ROWS_VALIDATED = registry.counter('siigo_rows_validated_total', "Rows checked by the template validator")
+VALIDATE_SECONDS = registry.counter('siigo_validate_seconds_total', "Time spent validating rows")
+DOCUMENTS_SUBMITTED = registry.counter(
+    'siigo_documents_submitted_total', "Documents posted to Siigo", ('status',))
+SUBMIT_SECONDS = registry.counter('siigo_submit_seconds_total', "Time spent posting documents to Siigo")
+QUEUE_DEPTH = registry.gauge('siigo_queue_depth', "Items waiting in a queue", ('queue',))
+RUNNING = registry.gauge('siigo_runs_in_progress', "Runs holding a work queue slot")
+DB_WRITE_LATENCY = registry.histogram(
+    'siigo_db_write_seconds', "SQLite write transaction latency", ('operation',))
+ERRORS = registry.counter('siigo_errors_total', "Errors logged", ('type',))
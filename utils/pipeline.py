@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from utils.logger import error_logger
+from utils.metrics import QUEUE_DEPTH
+
+# Items each stage may have waiting before upstream stages block
+PIPELINE_QUEUE_SIZE = int(os.getenv('SIIGO_PIPELINE_QUEUE_SIZE', '32'))
+# Documents posted to Siigo at the same time within one run
+SUBMIT_WORKERS = int(os.getenv('SIIGO_SUBMIT_WORKERS', '4'))
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+def thread_name_prefix(owner: Optional[int] = None) -> str:
+    """Name prefix of the stage threads of pipelines run by thread ``owner`` (default: this thread).
+
+    Thread idents are unique among live threads, so the prefix tells apart
+    the threads of runs going on at the same time.
+    """
+    return f"pipeline-{owner or threading.get_ident()}-"
+
+class Stage:
+    """One pipeline step: ``workers`` threads applying ``func`` to items from a bounded inbox"""
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queued = 0
+        self._queued_total = 0
+        self._gets = 0
+        self._active = workers
+        self._lock = threading.Lock()
+
+    def _got(self):
+        depth = self.inbox.qsize()
+        QUEUE_DEPTH.set(depth, queue=f'pipeline-{self.name}')
+        with self._lock:
+            self._gets += 1
+            self._queued_total += depth
+            self.max_queued = max(self.max_queued, depth + 1)
+
+    def _worker_done(self) -> bool:
+        """Count a worker out; True for the last one, which forwards end-of-stream"""
+        with self._lock:
+            self._active -= 1
+            return self._active == 0
+
+    def stats(self, elapsed: float) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'errors': self.errors,
+                'throughput_per_second': self.processed / elapsed if elapsed > 0 else 0.0,
+                'busy_seconds': round(self.busy_seconds, 3),
+                # Time spent waiting on a full downstream queue: backpressure
+                'blocked_seconds': round(self.blocked_seconds, 3),
+                'queued': self.inbox.qsize(),
+                'queue_capacity': self.inbox.maxsize,
+                'max_queued': self.max_queued,
+                'avg_queued': self._queued_total / self._gets if self._gets else 0.0,
+            }
+
+class Pipeline:
+    """Concurrent stages joined by bounded queues.
+
+    A feeder thread pulls items from the source into the first stage; each
+    stage's workers pass results to the next stage's queue. Queues are
+    bounded, so a slow stage fills its inbox and blocks everything upstream,
+    down to the source, instead of buffering the whole input. The first
+    exception raised by a stage (or the source) stops the pipeline and is
+    re-raised from run().
+    """
+
+    def __init__(self, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stages: List[Stage] = []
+        self.source_produced = 0
+        self.source_blocked_seconds = 0.0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def add_stage(self, name: str, func: Callable[[Any], Any], workers: int = 1) -> 'Pipeline':
+        self.stages.append(Stage(name, func, workers, self.queue_size))
+        return self
+
+    def _fail(self, error: BaseException, where: str):
+        if self._error is None:
+            self._error = error
+            error_logger.log_error(
+                'processing_errors',
+                f"Pipeline stage '{where}' failed: {str(error)}"
+            )
+        self._abort.set()
+
+    def _put(self, target: queue.Queue, item) -> float:
+        """Put ``item`` downstream and return how long that blocked"""
+        started = time.perf_counter()
+        target.put(item)
+        return time.perf_counter() - started
+
+    def _feed(self, source: Iterable):
+        first = self.stages[0].inbox
+        try:
+            for item in source:
+                if self._abort.is_set():
+                    break
+                self.source_blocked_seconds += self._put(first, item)
+                self.source_produced += 1
+        except BaseException as e:
+            self._fail(e, 'source')
+        finally:
+            first.put(_DONE)
+
+    def _work(self, stage: Stage, outbox: queue.Queue):
+        while True:
+            item = stage.inbox.get()
+            if item is _DONE:
+                if stage._worker_done():
+                    outbox.put(_DONE)
+                else:
+                    # Let sibling workers see end-of-stream too
+                    stage.inbox.put(_DONE)
+                return
+            stage._got()
+            if self._abort.is_set():
+                # Keep draining so upstream never blocks on a dead stage
+                continue
+            started = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except BaseException as e:
+                with stage._lock:
+                    stage.errors += 1
+                self._fail(e, stage.name)
+                continue
+            finally:
+                with stage._lock:
+                    stage.busy_seconds += time.perf_counter() - started
+            with stage._lock:
+                stage.processed += 1
+            blocked = self._put(outbox, result)
+            with stage._lock:
+                stage.blocked_seconds += blocked
+
+    def run(self, source: Iterable) -> Iterator:
+        """Stream ``source`` through the stages, yielding outputs of the last stage as they finish"""
+        if not self.stages:
+            raise ValueError("Pipeline has no stages")
+        self._started_at = time.perf_counter()
+        outbox = queue.Queue(maxsize=self.queue_size)
+        outboxes = [stage.inbox for stage in self.stages[1:]] + [outbox]
+        prefix = thread_name_prefix()
+        threads = [threading.Thread(target=self._feed, args=(source,), name=f'{prefix}source', daemon=True)]
+        for stage, target in zip(self.stages, outboxes):
+            threads += [
+                threading.Thread(target=self._work, args=(stage, target),
+                                 name=f'{prefix}{stage.name}-{i}', daemon=True)
+                for i in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = outbox.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            if item is not _DONE:
+                # The consumer stopped early: abort and drain so no thread stays blocked
+                self._abort.set()
+                while outbox.get() is not _DONE:
+                    pass
+            for thread in threads:
+                thread.join()
+            self._finished_at = time.perf_counter()
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> Dict:
+        """Per-stage throughput, busy and blocked time, and queue occupancy"""
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'source': {
+                'produced': self.source_produced,
+                'blocked_seconds': round(self.source_blocked_seconds, 3),
+            },
+            'stages': {stage.name: stage.stats(elapsed) for stage in self.stages},
+        }
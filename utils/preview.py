@@ -0,0 +1,63 @@
+from typing import Dict, Optional, Tuple
+import pandas as pd
+
+# Columns matched by the preview's free-text search
+SEARCH_COLUMNS = ['document_id', 'account_code', 'customer_identification', 'description', 'observations']
+
+class DataPreview:
+    """Summary and paged, filtered, sorted views of an uploaded frame.
+
+    The summary and the search text are computed once per upload; only the
+    rows of the requested page are handed to the UI. The row order of the
+    last filter and sort is kept, so paging through it does not sort again.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Positional index, so matching rows are addressed by position
+        self.df = df.reset_index(drop=True)
+        self.summary = self._summarize(self.df)
+        self._search_text = pd.Series('', index=self.df.index)
+        for column in SEARCH_COLUMNS:
+            if column in self.df.columns:
+                self._search_text += ' ' + self.df[column].astype(str).str.lower()
+        self._order_key = None
+        self._order = None
+
+    @staticmethod
+    def _summarize(df: pd.DataFrame) -> Dict:
+        totals = df.groupby('movement')['value'].sum() if {'movement', 'value'} <= set(df.columns) else {}
+        return {
+            'rows': len(df),
+            'documents': int(df['document_id'].nunique()) if 'document_id' in df.columns else 0,
+            'cost_centers': int(df['cost_center'].nunique()) if 'cost_center' in df.columns else 0,
+            'totals_by_movement': {movement: float(total) for movement, total in dict(totals).items()}
+        }
+
+    def _rows(self, search: Optional[str], filters: Dict, sort_by: Optional[str], ascending: bool):
+        """Positions of the matching rows in display order"""
+        key = (search, tuple(sorted(filters.items())), sort_by, ascending)
+        if key == self._order_key:
+            return self._order
+        mask = pd.Series(True, index=self.df.index)
+        if search:
+            mask &= self._search_text.str.contains(search.lower(), regex=False)
+        for column, value in filters.items():
+            mask &= self.df[column] == value
+        matched = self.df[mask]
+        if sort_by:
+            try:
+                matched = matched.sort_values(sort_by, ascending=ascending, kind='stable')
+            except TypeError:
+                # Excel columns often mix numbers and text, which do not compare; sort as text
+                matched = matched.sort_values(sort_by, ascending=ascending, kind='stable',
+                                              key=lambda column: column.astype(str))
+        self._order_key, self._order = key, matched.index.to_numpy()
+        return self._order
+
+    def page(self, page: int = 1, page_size: int = 100, search: Optional[str] = None,
+             filters: Optional[Dict] = None, sort_by: Optional[str] = None,
+             ascending: bool = True) -> Tuple[pd.DataFrame, int]:
+        """One page of the matching rows and how many rows match"""
+        rows = self._rows(search or None, filters or {}, sort_by, ascending)
+        start = (max(page, 1) - 1) * page_size
+        return self.df.iloc[rows[start:start + page_size]], len(rows)
@@ -0,0 +1,370 @@
+import json
+import numbers
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+from utils.excel_processor import ExcelProcessor
+from utils.template_validator import TemplateValidator
+from utils.database import task_db
+from utils.event_loop import run_sync
+from utils.logger import error_logger
+from utils.metrics import DOCUMENTS_SUBMITTED, SUBMIT_SECONDS
+from utils.tracing import tracer
+from utils.pipeline import Pipeline, PIPELINE_QUEUE_SIZE, SUBMIT_WORKERS
+
+# Documents journaled per commit. A crash can lose at most this many journal
+# entries, which a resumed run would then submit again.
+CHECKPOINT_INTERVAL = int(os.getenv('SIIGO_CHECKPOINT_INTERVAL', '100'))
+
+# Failures kept in memory per run for display; every result goes to the sinks
+RECENT_FAILURES = int(os.getenv('SIIGO_RECENT_FAILURES', '20'))
+
+# When set, scheduled runs also write every result to <dir>/<run_id>.ndjson
+RESULTS_DIR = os.getenv('SIIGO_RESULTS_DIR')
+
+def document_key(document_id) -> str:
+    """Text a document id is journaled and matched under, however its column was typed.
+    
+    A manual run reads ids the validator turned into ints, while a resumed run
+    reads the stored file as is, where they may be floats (5.0) or text ('5').
+    """
+    if isinstance(document_id, str):
+        try:
+            number = float(document_id)
+        except ValueError:
+            return document_id.strip()
+        if not number.is_integer():
+            return document_id.strip()
+        return str(int(number))
+    if isinstance(document_id, numbers.Real) and float(document_id).is_integer():
+        return str(int(document_id))
+    return str(document_id)
+
+class DocumentRecorder:
+    """Buffer per-document results and write them to the database in batches.
+    
+    The processed_documents rows of a run double as its checkpoint journal:
+    a run that crashed or was cancelled can be resumed under the same run id,
+    skipping every document it already journaled.
+    """
+
+    def __init__(self, company_name: str, run_id: Optional[str] = None, task_id: Optional[int] = None,
+                 source: str = 'manual', batch_size: int = CHECKPOINT_INTERVAL, db=None,
+                 file_hash: Optional[str] = None):
+        self.company_name = company_name
+        self.run_id = run_id or uuid.uuid4().hex
+        self.task_id = task_id
+        self.source = source
+        self.batch_size = batch_size
+        self.db = db or task_db
+        self.file_hash = file_hash
+        self.completed = set()
+        self._pending: List[Dict] = []
+    
+    @classmethod
+    def resume(cls, run: Dict, db=None, batch_size: int = CHECKPOINT_INTERVAL) -> 'DocumentRecorder':
+        """Recorder continuing an unfinished processing_runs row"""
+        return cls(run['company_name'], run_id=run['run_id'], task_id=run.get('task_id'),
+                   source=run['source'], batch_size=batch_size, db=db, file_hash=run.get('file_hash'))
+    
+    def start(self, expected: Optional[int] = None):
+        """Mark the run as running and load its checkpoint, if it has one"""
+        with tracer.span('TaskDatabase.start_processing_run'):
+            run_sync(self.db.start_processing_run(
+                self.run_id, self.company_name, self.source, self.task_id, self.file_hash, expected
+            ))
+            journaled = run_sync(self.db.get_run_checkpoint(self.run_id, self.company_name))
+            self.completed = {document_key(document_id) for document_id in journaled}
+        if self.completed:
+            error_logger.log_info(
+                f"Resuming run {self.run_id} after {len(self.completed)} journaled documents"
+            )
+    
+    def is_done(self, document_id) -> bool:
+        """Whether the document was journaled by an earlier attempt of this run"""
+        return document_key(document_id) in self.completed
+    
+    def finish(self, state: str = 'completed'):
+        """Flush pending results and record how the run ended"""
+        self.flush()
+        try:
+            run_sync(self.db.finish_processing_run(self.run_id, self.company_name, state))
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error finishing processing run: {str(e)}",
+                {'run_id': self.run_id, 'state': state}
+            )
+
+    def record(self, document_id, status: str, siigo_id=None, latency_ms: Optional[float] = None,
+               error: Optional[str] = None):
+        """Queue one document result, flushing once a full batch is pending"""
+        self._pending.append({
+            'company_name': self.company_name,
+            'run_id': self.run_id,
+            'task_id': self.task_id,
+            'document_id': document_key(document_id),
+            'status': status,
+            'siigo_id': str(siigo_id) if siigo_id is not None else None,
+            'latency_ms': latency_ms,
+            'error': error
+        })
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def write(self, result: Dict):
+        """Result sink interface: journal a DocumentPipeline result"""
+        response = result.get('response')
+        self.record(
+            result['document_id'], result['status'],
+            siigo_id=response.get('id') if isinstance(response, dict) else None,
+            latency_ms=result.get('latency_ms'),
+            error=result.get('error')
+        )
+    
+    def close(self):
+        self.flush()
+    
+    def flush(self):
+        """Write all pending results in a single transaction"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            with tracer.span('TaskDatabase.add_processed_documents', documents=len(batch)):
+                run_sync(self.db.add_processed_documents(batch, source=self.source))
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error saving processed documents: {str(e)}",
+                {'run_id': self.run_id, 'documents': len(batch)}
+            )
+
+class NdjsonSink:
+    """Result sink appending one JSON object per line to a file"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        
+    def write(self, result: Dict):
+        line = json.dumps(result, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+class CallbackSink:
+    """Result sink handing each result to a function"""
+    
+    def __init__(self, callback: Callable[[Dict], None]):
+        self.callback = callback
+        
+    def write(self, result: Dict):
+        self.callback(result)
+        
+    def close(self):
+        pass
+
+def result_sinks(run_id: str) -> List:
+    """Extra sinks configured for a run (SIIGO_RESULTS_DIR)"""
+    if not RESULTS_DIR:
+        return []
+    return [NdjsonSink(os.path.join(RESULTS_DIR, f"{run_id}.ndjson"))]
+
+class RunSummary:
+    """Counters and the most recent failures of a run.
+    
+    Full per-document results (including Siigo responses) are only passed to
+    the sinks, so memory stays flat however many documents a run has.
+    """
+    
+    def __init__(self, run_id: Optional[str] = None, max_failures: int = RECENT_FAILURES):
+        self.run_id = run_id
+        self.trace_id = None
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.recent_failures = deque(maxlen=max_failures)
+        
+    def add(self, result: Dict):
+        self.total += 1
+        if result['status'] == 'Success':
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            self.recent_failures.append({'document_id': result['document_id'], 'error': result.get('error')})
+            
+    def as_dict(self) -> Dict:
+        summary = {'total': self.total, 'success': self.succeeded, 'failed': self.failed, 'run_id': self.run_id}
+        if self.trace_id:
+            summary['trace_id'] = self.trace_id
+        return summary
+
+class _ResultStream:
+    """Fan results out to the sinks and the summary; sink errors never stop a run"""
+    
+    def __init__(self, recorder: Optional[DocumentRecorder], sinks: Iterable):
+        self.recorder = recorder
+        self.sinks = ([recorder] if recorder else []) + list(sinks)
+        self.summary = RunSummary(recorder.run_id if recorder else None)
+        
+    def traced(self, name: str):
+        """Root span of the run, if it is sampled; its trace id tags every result"""
+        return tracer.trace(name, run_id=self.summary.run_id,
+                            company_name=self.recorder.company_name if self.recorder else None)
+        
+    def emit(self, result: Dict):
+        if self.summary.trace_id:
+            result['trace_id'] = self.summary.trace_id
+        self.summary.add(result)
+        DOCUMENTS_SUBMITTED.inc(status=result['status'].lower())
+        if result.get('latency_ms') is not None:
+            SUBMIT_SECONDS.inc(result['latency_ms'] / 1000)
+        for sink in self.sinks:
+            try:
+                sink.write(result)
+            except Exception as e:
+                error_logger.log_error(
+                    'processing_errors',
+                    f"Error writing result to {type(sink).__name__}: {str(e)}",
+                    {'document_id': str(result['document_id'])}
+                )
+
+class DocumentPipeline:
+    """Read, validate, build and submit documents as concurrent pipeline stages.
+    
+    The source stage reads the workbook and splits it into documents; each
+    document is then validated, turned into a payload and posted by
+    ``submit_workers`` threads. Queues between stages are bounded, so slow
+    submission throttles reading and validation instead of letting them run
+    ahead. A document failing any stage is reported as Failed and skipped by
+    the later stages. Results stream to the recorder and sinks as they come
+    out of the last stage.
+    """
+    
+    def __init__(self, api_client, recorder: Optional[DocumentRecorder] = None,
+                 submit_workers: int = SUBMIT_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 sinks: Iterable = ()):
+        self.api_client = api_client
+        self.recorder = recorder
+        self.sinks = list(sinks)
+        self.validator = TemplateValidator()
+        self.builder = ExcelProcessor(None)
+        self.pipeline = (
+            Pipeline(queue_size)
+            .add_stage('validate', self._validate)
+            .add_stage('build', self._build)
+            .add_stage('submit', self._submit, workers=submit_workers)
+        )
+        self.state = 'completed'
+        self._run_span = None
+        
+    def _documents(self, source, stop_event):
+        """Source stage: read the file (or take a DataFrame) and yield documents not yet journaled"""
+        # Runs on the pipeline's feeder thread, so the run's span is passed explicitly
+        with tracer.span('read_documents', parent=self._run_span):
+            if isinstance(source, pd.DataFrame):
+                df = source
+                self.validator.validate_columns(df)
+            else:
+                df = ExcelProcessor(source).read_rows()
+            if self.recorder:
+                self.recorder.start(expected=df['document_id'].nunique())
+        for doc_id, group in df.groupby('document_id'):
+            if stop_event is not None and stop_event.is_set():
+                self.state = 'cancelled'
+                return
+            if self.recorder and self.recorder.is_done(doc_id):
+                continue
+            # The document's span travels with it through the stage threads
+            span = tracer.start_span('document', parent=self._run_span, document_id=str(doc_id))
+            yield {'document_id': doc_id, 'group': group.copy(), 'span': span}
+            
+    def _validate(self, item):
+        try:
+            with tracer.use(item['span']):
+                self.validator.validate_document(item['group'])
+        except Exception as e:
+            item['error'] = str(e)
+        return item
+        
+    def _build(self, item):
+        if 'error' not in item:
+            try:
+                with tracer.use(item['span']):
+                    item['payload'] = self.builder.format_entries_for_api(item['group'])
+            except Exception as e:
+                item['error'] = str(e)
+        del item['group']
+        return item
+        
+    def _submit(self, item):
+        if 'error' not in item:
+            started = time.perf_counter()
+            try:
+                with tracer.use(item['span']):
+                    item['response'] = self.api_client.create_journal_entry(item['payload'])
+            except Exception as e:
+                item['error'] = str(e)
+            item['latency_ms'] = (time.perf_counter() - started) * 1000
+        return item
+        
+    @staticmethod
+    def _result(item) -> Dict:
+        if item['span'] is not None:
+            item['span'].finish()
+        result = {'document_id': item['document_id'], 'latency_ms': item.get('latency_ms')}
+        if 'error' in item:
+            result.update(status='Failed', error=item['error'])
+        else:
+            result.update(status='Success', response=item['response'])
+        return result
+        
+    def run(self, source, stop_event=None) -> RunSummary:
+        """Process an Excel file, file path or DataFrame, returning the run's summary"""
+        stream = _ResultStream(self.recorder, self.sinks)
+        with stream.traced('document_pipeline') as run_span:
+            self._run_span = run_span
+            stream.summary.trace_id = run_span.trace_id if run_span else None
+            try:
+                for item in self.pipeline.run(self._documents(source, stop_event)):
+                    stream.emit(self._result(item))
+            except BaseException:
+                # Keep what was journaled; the run stays 'running' and resumable
+                if self.recorder:
+                    self.recorder.flush()
+                raise
+            if self.recorder:
+                self.recorder.finish(self.state)
+        return stream.summary
+        
+    def stats(self) -> Dict:
+        """Per-stage throughput and queue occupancy of the run"""
+        return self.pipeline.stats()
+
+def process_documents(source, api_client, recorder: Optional[DocumentRecorder] = None,
+                      stop_event=None, sinks: Iterable = (),
+                      submit_workers: int = SUBMIT_WORKERS) -> Tuple[RunSummary, Dict]:
+    """Run ``source`` through a DocumentPipeline, returning its summary and pipeline stats"""
+    pipeline = DocumentPipeline(api_client, recorder, submit_workers=submit_workers, sinks=sinks)
+    summary = pipeline.run(source, stop_event)
+    stats = pipeline.stats()
+    submit = stats['stages']['submit']
+    error_logger.log_info(
+        f"Pipeline processed {summary.total} documents in {stats['elapsed_seconds']}s "
+        f"({submit['throughput_per_second']:.1f} submitted/s, reader blocked "
+        f"{stats['source']['blocked_seconds']}s by backpressure)"
+    )
+    return summary, stats
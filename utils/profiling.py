@@ -0,0 +1,205 @@
+import cProfile
+import functools
+import glob
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from utils.logger import error_logger
+from utils.pipeline import thread_name_prefix
+
+# Profile every run ('1' or 'all'), or only runs of these companies (comma-separated names)
+PROFILE = os.getenv('SIIGO_PROFILE', '')
+# Where profile reports are written: <company>_<task>_<time>.prof (pstats) and .json (summary)
+PROFILE_DIR = os.getenv('SIIGO_PROFILE_DIR', 'profiles')
+# Hotspots and allocation sites kept in each summary
+PROFILE_TOP = int(os.getenv('SIIGO_PROFILE_TOP', '25'))
+
+# From 3.12 cProfile is built on sys.monitoring: a single profiler sees every thread,
+# and a second one cannot be enabled while it runs
+PROFILER_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+
+def profiling_enabled(company_name: str, setting: str = PROFILE) -> bool:
+    """Whether SIIGO_PROFILE asks for runs of ``company_name`` to be profiled"""
+    setting = setting.strip()
+    if setting.lower() in ('', '0', 'false', 'no'):
+        return False
+    if setting.lower() in ('1', 'true', 'yes', 'all'):
+        return True
+    return company_name in {name.strip() for name in setting.split(',')}
+
+def _safe_name(value) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', str(value)).strip('-') or 'unknown'
+
+class RunProfiler:
+    """CPU and memory profile of one processing run.
+
+    cProfile covers the thread that enters the profiler and the pipeline
+    threads the run starts, picked out by the run's thread name prefix;
+    tracemalloc records peak memory and the top allocation sites. On Python
+    3.12+ the one profiler sees every thread, so work of other threads
+    running at the same time ends up in the report too. Only one run is
+    profiled at a time per process (the profiler hooks are process-wide); a
+    run starting while another is being profiled simply runs unprofiled.
+    """
+
+    _session = threading.Lock()
+
+    def __init__(self, company_name: str, task_id: Optional[int] = None, profile_dir: str = PROFILE_DIR,
+                 top: int = PROFILE_TOP):
+        self.company_name = company_name
+        self.task_id = task_id
+        self.profile_dir = profile_dir
+        self.top = top
+        self.active = False
+        self.report: Optional[Dict] = None
+        self._profiler = cProfile.Profile()
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, frame, event, arg):
+        # Runs once as the first profile event of each new thread; it must never
+        # raise, or the thread dies before running and its pipeline never ends
+        sys.setprofile(None)
+        try:
+            if threading.current_thread().name.startswith(self._thread_prefix):
+                profiler = cProfile.Profile()
+                profiler.enable()
+                with self._lock:
+                    self._thread_profilers.append(profiler)
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error profiling thread {threading.current_thread().name}: {str(e)}",
+                {'company_name': self.company_name, 'task_id': self.task_id}
+            )
+
+    def __enter__(self) -> 'RunProfiler':
+        if not RunProfiler._session.acquire(blocking=False):
+            error_logger.log_info(
+                f"Another run is being profiled; not profiling this run of {self.company_name}",
+                company_name=self.company_name
+            )
+            return self
+        try:
+            # Fails on 3.12+ if another profiling tool (e.g. a debugger's) is active
+            self._profiler.enable()
+        except ValueError as e:
+            RunProfiler._session.release()
+            error_logger.log_info(
+                f"Cannot profile this run of {self.company_name}: {str(e)}",
+                company_name=self.company_name
+            )
+            return self
+        self.active = True
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._started_at = datetime.now()
+        self._wall_started = time.perf_counter()
+        self._thread_prefix = thread_name_prefix()
+        if not PROFILER_SEES_ALL_THREADS:
+            threading.setprofile(self._profile_thread)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.active:
+            return False
+        try:
+            self._profiler.disable()
+            if not PROFILER_SEES_ALL_THREADS:
+                threading.setprofile(None)
+            wall_seconds = time.perf_counter() - self._wall_started
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            stats = pstats.Stats(self._profiler)
+            with self._lock:
+                for profiler in self._thread_profilers:
+                    stats.add(profiler)
+            self.report = self._save(stats, wall_seconds, peak_memory, allocations,
+                                     error=f"{exc_type.__name__}: {exc}" if exc_type else None)
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error saving profile: {str(e)}",
+                {'company_name': self.company_name, 'task_id': self.task_id}
+            )
+        finally:
+            RunProfiler._session.release()
+        return False
+
+    def _save(self, stats: pstats.Stats, wall_seconds: float, peak_memory: int, allocations,
+              error: Optional[str] = None) -> Dict:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = (f"{_safe_name(self.company_name)}_{self.task_id or 'manual'}_"
+                f"{self._started_at.strftime('%Y%m%d-%H%M%S-%f')}")
+        base = os.path.join(self.profile_dir, name)
+        stats.dump_stats(f"{base}.prof")
+        hotspots = sorted(stats.stats.items(), key=lambda entry: entry[1][2], reverse=True)[:self.top]
+        report = {
+            'company_name': self.company_name,
+            'task_id': self.task_id,
+            'started_at': self._started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(wall_seconds, 3),
+            'peak_memory_bytes': peak_memory,
+            'error': error,
+            'profile_file': f"{base}.prof",
+            'hotspots': [{
+                'function': f"{os.path.basename(file)}:{line}({function})",
+                'calls': calls,
+                'own_seconds': round(own, 6),
+                'cumulative_seconds': round(cumulative, 6)
+            } for (file, line, function), (_, calls, own, cumulative, _) in hotspots],
+            'allocations': [{
+                'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                'size_bytes': stat.size,
+                'count': stat.count
+            } for stat in allocations]
+        }
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        error_logger.log_info(
+            f"Saved profile of {self.company_name} run to {base}.prof "
+            f"({report['wall_seconds']}s, peak memory {peak_memory / 1e6:.1f} MB)",
+            company_name=self.company_name, task_id=self.task_id
+        )
+        return report
+
+def profiled(func: Callable, company_name: str, task_id: Optional[int] = None, force: bool = False,
+             profile_dir: str = PROFILE_DIR) -> Callable:
+    """``func`` wrapped to run under a RunProfiler when forced or enabled by SIIGO_PROFILE"""
+    if not force and not profiling_enabled(company_name):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with RunProfiler(company_name, task_id, profile_dir=profile_dir):
+            return func(*args, **kwargs)
+    return wrapper
+
+def list_profiles(company_name: Optional[str] = None, limit: int = 10,
+                  profile_dir: str = PROFILE_DIR) -> List[Dict]:
+    """Saved profile summaries, newest first"""
+    reports = []
+    paths = sorted(glob.glob(os.path.join(glob.escape(profile_dir), '*.json')),
+                   key=os.path.getmtime, reverse=True)
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if company_name is None or report.get('company_name') == company_name:
+            reports.append(report)
+            if len(reports) >= limit:
+                break
+    return reports
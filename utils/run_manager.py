@@ -0,0 +1,184 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from utils.logger import error_logger
+
+# Finished runs kept for the UI to show their outcome
+FINISHED_RUNS_KEPT = int(os.getenv('SIIGO_FINISHED_RUNS_KEPT', '50'))
+
+class RunProgress:
+    """Live counters of one background run; also the result sink that updates them"""
+
+    def __init__(self, run_id: str, company_name: str, expected: Optional[int] = None):
+        self.run_id = run_id
+        self.company_name = company_name
+        self.expected = expected
+        self.state = 'queued'
+        self.done = 0
+        self.failed = 0
+        self.summary = None
+        self.stats = None
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def write(self, result: Dict):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.time()
+            self.done += 1
+            if result['status'] != 'Success':
+                self.failed += 1
+
+    def close(self):
+        pass
+
+    def _running(self):
+        with self._lock:
+            if self.state == 'queued':
+                self.state = 'running'
+            if self.started_at is None:
+                self.started_at = time.time()
+
+    def _finished(self, state: str, outcome=None, error: Optional[str] = None):
+        with self._lock:
+            self.state = state
+            self.finished_at = time.time()
+            if outcome is not None:
+                self.summary, self.stats = outcome
+            self.error = error
+
+    def snapshot(self) -> Dict:
+        """Counters with elapsed time, documents per second and estimated time left"""
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.expected - self.done, 0) if self.expected is not None else None
+            return {
+                'run_id': self.run_id,
+                'company_name': self.company_name,
+                'state': self.state,
+                'expected': self.expected,
+                'done': self.done,
+                'succeeded': self.done - self.failed,
+                'failed': self.failed,
+                'elapsed_seconds': round(elapsed, 1),
+                'rate_per_second': round(rate, 2),
+                'eta_seconds': round(remaining / rate, 1) if remaining is not None and rate > 0 else None,
+                'error': self.error,
+            }
+
+class RunManager:
+    """Background processing runs started from the UI.
+
+    Runs go through the runner's work queue as interactive work and are
+    tracked by run id in this process, not in a browser session, so they
+    outlive reruns and disconnects; any session can poll or cancel them.
+    Cancelling sets the run's stop event: the run stops after the documents
+    in flight and is left 'cancelled', resumable like an interrupted run.
+    """
+
+    def __init__(self, runner, finished_kept: int = FINISHED_RUNS_KEPT):
+        self.runner = runner
+        self.finished_kept = finished_kept
+        self._runs: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, company_name: str, func: Callable, source, api_client, recorder,
+              expected: Optional[int] = None) -> str:
+        """Start ``func(source, api_client, recorder, stop_event, sinks)`` in the background; returns the run id"""
+        progress = RunProgress(recorder.run_id, company_name, expected)
+        stop_event = threading.Event()
+
+        def run(*args):
+            progress._running()
+            return func(*args)
+
+        future = self.runner.submit(self.runner.run_interactive(
+            company_name, run, source, api_client, recorder, stop_event, [progress]
+        ))
+        with self._lock:
+            self._runs[progress.run_id] = (progress, stop_event, future)
+        future.add_done_callback(lambda f: self._done(progress, stop_event, f))
+        return progress.run_id
+
+    def _done(self, progress: RunProgress, stop_event: threading.Event, future):
+        if future.cancelled():
+            progress._finished('cancelled')
+        elif future.exception() is not None:
+            error = future.exception()
+            progress._finished('failed', error=str(error))
+            error_logger.log_error(
+                'processing_errors',
+                f"Background run failed: {str(error)}",
+                {'run_id': progress.run_id, 'company_name': progress.company_name}
+            )
+        else:
+            progress._finished('cancelled' if stop_event.is_set() else 'completed', outcome=future.result())
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [run_id for run_id, (progress, _, _) in self._runs.items()
+                        if progress.finished_at is not None]
+            for run_id in finished[:max(len(finished) - self.finished_kept, 0)]:
+                del self._runs[run_id]
+
+    def get(self, run_id: str) -> Optional[RunProgress]:
+        with self._lock:
+            entry = self._runs.get(run_id)
+        return entry[0] if entry else None
+
+    def list_runs(self, company_name: Optional[str] = None, active_only: bool = False) -> List[Dict]:
+        """Progress snapshots, newest first"""
+        with self._lock:
+            entries = list(self._runs.values())
+        snapshots = [progress.snapshot() for progress, _, _ in reversed(entries)
+                     if company_name is None or progress.company_name == company_name]
+        if active_only:
+            snapshots = [s for s in snapshots if s['state'] in ('queued', 'running', 'cancelling')]
+        return snapshots
+
+    def cancel(self, run_id: str) -> bool:
+        """Ask a run to stop; a run still waiting for a slot is dropped from the queue"""
+        with self._lock:
+            entry = self._runs.get(run_id)
+        if entry is None:
+            return False
+        progress, stop_event, future = entry
+        if progress.finished_at is not None:
+            return False
+        stop_event.set()
+        with progress._lock:
+            queued = progress.state == 'queued'
+            progress.state = 'cancelling'
+        if queued:
+            future.cancel()
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            run_ids = list(self._runs)
+        for run_id in run_ids:
+            self.cancel(run_id)
+
+_run_manager = None
+_run_manager_lock = threading.Lock()
+
+def get_run_manager():
+    """Get the process-wide RunManager, running on the process-wide scheduler"""
+    global _run_manager
+    with _run_manager_lock:
+        if _run_manager is None:
+            from utils.scheduler import get_scheduler
+            _run_manager = RunManager(get_scheduler())
+            # Registered after the scheduler, so it runs first at exit: runs stop
+            # at a document boundary before the event loop is drained
+            atexit.register(_run_manager.cancel_all)
+        return _run_manager
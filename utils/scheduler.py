@@ -1,87 +1,474 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from collections import Counter
 from datetime import datetime, timedelta
+import atexit
+import hashlib
+import os
+import socket
+import threading
+import time as time_module
 import pytz
 from utils.logger import error_logger
 from utils.database import task_db
+from utils.blob_store import blob_store
+from utils.event_loop import get_event_loop_thread
+from utils.metrics import start_exporters
+from utils.work_queue import FairWorkQueue, INTERACTIVE, SCHEDULED
 import asyncio
 from apscheduler.jobstores.base import JobLookupError
 
-class TaskScheduler:
-    def __init__(self):
-        self.scheduler = BackgroundScheduler()
+# Raw task_history rows older than this many days are pruned after rollup
+HISTORY_RETENTION_DAYS = int(os.getenv('SIIGO_HISTORY_RETENTION_DAYS', '90'))
+
+# Maximum number of scheduled files processed at the same time
+MAX_CONCURRENT_JOBS = int(os.getenv('SIIGO_MAX_CONCURRENT_JOBS', '4'))
+
+# A run missed by at most this many seconds (while running or across a restart)
+# is still executed; older misses are skipped to the next occurrence
+MISFIRE_GRACE_SECONDS = int(os.getenv('SIIGO_MISFIRE_GRACE_SECONDS', '3600'))
+# Collapse several missed occurrences of a task into a single run
+COALESCE_MISSED_RUNS = os.getenv('SIIGO_COALESCE_MISSED_RUNS', '1') == '1'
+# Run tasks missed during downtime on startup, this many seconds apart
+CATCHUP_MISSED_RUNS = os.getenv('SIIGO_CATCHUP_MISSED_RUNS', '1') == '1'
+CATCHUP_SPACING_SECONDS = int(os.getenv('SIIGO_CATCHUP_SPACING_SECONDS', '30'))
+
+# A claimed task stays leased this long without a heartbeat before another
+# worker may take it over
+LEASE_SECONDS = int(os.getenv('SIIGO_LEASE_SECONDS', '300'))
+# Run scheduled tasks inside this process; set to 0 when standalone workers
+# (python -m utils.worker) drain the schedule instead
+EMBEDDED_WORKER = os.getenv('SIIGO_EMBEDDED_WORKER', '1') == '1'
+
+# Default window (minutes after the chosen time) that task start times are
+# spread across, for tasks scheduled without their own window
+SPREAD_MINUTES = int(os.getenv('SIIGO_SPREAD_MINUTES', '0'))
+
+def build_trigger(frequency, hour, minute, day_of_week=None, day_of_month=None, second=0):
+    """Cron trigger for a task's frequency and time of day"""
+    if frequency == 'weekly' and day_of_week is not None:
+        return CronTrigger(day_of_week=day_of_week, hour=hour, minute=minute, second=second)
+    if frequency == 'monthly' and day_of_month is not None:
+        return CronTrigger(day=day_of_month, hour=hour, minute=minute, second=second)
+    return CronTrigger(hour=hour, minute=minute, second=second)
+
+def spread_offset(task_id, company_name, window_seconds):
+    """Deterministic offset in [0, window_seconds) for a task, stable across restarts and hosts"""
+    if window_seconds <= 0:
+        return 0
+    digest = hashlib.sha1(f"{company_name}:{task_id}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % window_seconds
+
+def task_start_time(task):
+    """(hour, minute, second) a task actually starts at: run_at plus its spread offset"""
+    hour, minute = (int(part) for part in task['run_at'].split(':'))
+    window = task.get('spread_minutes')
+    if window is None:
+        window = SPREAD_MINUTES
+    start = hour * 3600 + minute * 60
+    if task.get('id') is not None:
+        # Stay on the same day so weekly and monthly tasks keep their day
+        start += spread_offset(task['id'], task['company_name'], min(window * 60, 86400 - start))
+    return start // 3600, start % 3600 // 60, start % 60
+
+def task_trigger(task):
+    """Rebuild the trigger of a scheduled_tasks row"""
+    hour, minute, second = task_start_time(task)
+    return build_trigger(task['frequency'], hour, minute, task.get('day_of_week'),
+                         task.get('day_of_month'), second)
+
+def next_fire_time(trigger, after=None):
+    """Next naive local fire time of ``trigger`` strictly after ``after`` (default now)"""
+    after = after or datetime.now()
+    tz = trigger.timezone
+    after = tz.localize(after) if hasattr(tz, 'localize') else after.replace(tzinfo=tz)
+    fire_time = trigger.get_next_fire_time(None, after + timedelta(microseconds=1))
+    return fire_time.replace(tzinfo=None)
+
+def projected_load(tasks, start=None, hours=24):
+    """Count the runs of ``tasks`` per minute over the next ``hours``, keyed 'YYYY-MM-DD HH:MM'"""
+    start = start or datetime.now()
+    end = start + timedelta(hours=hours)
+    load = Counter()
+    for task in tasks:
+        if not task.get('run_at'):
+            continue
+        trigger = task_trigger(task)
+        fire_time = next_fire_time(trigger, start - timedelta(microseconds=1))
+        while fire_time < end:
+            load[fire_time.strftime('%Y-%m-%d %H:%M')] += 1
+            fire_time = next_fire_time(trigger, fire_time)
+    return dict(sorted(load.items()))
+
+def task_job_id(task_id, company_name):
+    """APScheduler job id of a task; task ids are only unique per company shard"""
+    return f"task:{company_name}:{task_id}"
+
+def default_worker_id():
+    """Lease owner id of this process, unique across hosts sharing the database"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class TaskRunner:
+    """Run leased scheduled tasks on the process event loop.
+    
+    Each run is admitted through a FairWorkQueue, which caps concurrency
+    overall and per company and shares slots fairly between companies, with
+    interactive runs ahead of scheduled ones. Blocking parts of a run use the
+    loop's bounded executor. A task only runs while this process holds its
+    lease in the database, so the embedded scheduler and any number of
+    standalone workers never run the same occurrence twice.
+    """
+    
+    def __init__(self, max_concurrent_jobs=MAX_CONCURRENT_JOBS, misfire_grace_time=MISFIRE_GRACE_SECONDS,
+                 lease_seconds=LEASE_SECONDS, worker_id=None):
+        self.loop = get_event_loop_thread()
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.work_queue = FairWorkQueue(max_concurrency=max_concurrent_jobs)
+        self.misfire_grace_time = misfire_grace_time
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or default_worker_id()
+    
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the runner's event loop and wait for its result"""
+        return self.loop.run(coro, timeout)
+    
+    def submit(self, coro):
+        """Start a coroutine on the runner's event loop without waiting for it"""
+        return self.loop.submit(coro)
+        
+    @staticmethod
+    def _log_job_failure(future):
+        if not future.cancelled() and future.exception():
+            error_logger.log_error(
+                'processing_errors',
+                f"Unhandled error in scheduled job: {str(future.exception())}"
+            )
+        
+    async def _add_task_history(self, task_id, company_name, status, result=None,
+                                duration_ms=None, documents_posted=None):
+        """Queue task execution history on the database write-behind buffer"""
+        task_db.write_buffer.add_task_history(
+            task_id, company_name, status, result, duration_ms, documents_posted
+        )
+    
+    async def run_interactive(self, company_name, func, *args):
+        """Run blocking UI-triggered work through the work queue ahead of scheduled runs"""
+        return await self.work_queue.run(
+            company_name,
+            lambda: self.loop.run_blocking(func, *args),
+            priority=INTERACTIVE
+        )
+    
+    async def get_queue_stats(self, company_name=None):
+        """Get work queue depth, running count and wait times per company"""
+        return self.work_queue.stats(company_name)
+    
+    async def _run_leased_task(self, task, catch_up=False):
+        """Run a task this process holds the lease for, then advance it and release the lease.
+        
+        A ``catch_up`` run was already judged recent enough by rehydrate, and
+        runs however late it fires against the missed time.
+        """
+        task_id, company_name = task['id'], task['company_name']
+        due = datetime.strptime(task['next_run'][:19], '%Y-%m-%d %H:%M:%S')
+        heartbeat = asyncio.create_task(self._heartbeat(task_id, company_name))
+        try:
+            if not catch_up and (datetime.now() - due).total_seconds() > self.misfire_grace_time:
+                error_logger.log_info(
+                    f"Task {task_id} of {company_name} missed its run at {due} by more than "
+                    f"{self.misfire_grace_time}s; skipping to the next occurrence"
+                )
+            else:
+                await self._run_scheduled_file(task['file_hash'], task_id, company_name)
+        finally:
+            # If the run is cancelled the lease is left to expire, so another worker retries it
+            heartbeat.cancel()
+        next_run = next_fire_time(task_trigger(task)).strftime('%Y-%m-%d %H:%M:%S')
+        if not await task_db.complete_task_run(task_id, company_name, self.worker_id, next_run):
+            error_logger.log_error(
+                'processing_errors',
+                f"Lease on task {task_id} was lost before the run finished",
+                {'company_name': company_name, 'worker_id': self.worker_id}
+            )
+    
+    async def _heartbeat(self, task_id, company_name):
+        """Keep a running task's lease alive until cancelled"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await task_db.renew_lease(task_id, company_name, self.worker_id, self.lease_seconds):
+                    error_logger.log_error(
+                        'processing_errors',
+                        f"Could not renew lease on task {task_id}; it expired",
+                        {'company_name': company_name, 'worker_id': self.worker_id}
+                    )
+                    return
+            except Exception as e:
+                error_logger.log_error(
+                    'processing_errors',
+                    f"Error renewing lease on task {task_id}: {str(e)}",
+                    {'company_name': company_name, 'worker_id': self.worker_id}
+                )
+    
+    def _run_scheduled_entries(self, file_hash, task_id, company_name):
+        """Read and submit a scheduled file; blocking, so it runs on the executor"""
+        from utils.api_client import SiigoAPI
+        from utils.processing import DocumentRecorder, process_documents, result_sinks
+        from utils.profiling import profiled
+        
+        # A run of this occurrence that died part way through continues where it stopped
+        unfinished = [
+            run for run in self.run(task_db.get_resumable_runs(company_name, 'scheduled', task_id))
+            if run['file_hash'] == file_hash
+        ]
+        if unfinished:
+            recorder = DocumentRecorder.resume(unfinished[0])
+        else:
+            recorder = DocumentRecorder(company_name, task_id=task_id, source='scheduled', file_hash=file_hash)
+        sinks = result_sinks(recorder.run_id)
+        try:
+            run_documents = profiled(process_documents, company_name, task_id)
+            summary, _ = run_documents(blob_store.open(file_hash), SiigoAPI.from_env(company_name), recorder, sinks=sinks)
+        finally:
+            for sink in sinks:
+                sink.close()
+        return summary
+    
+    async def _run_scheduled_file(self, file_hash, task_id, company_name):
+        started = time_module.monotonic()
+        try:
+            error_logger.log_info(f"Starting scheduled processing of file")
+            
+            summary = await self.loop.run_blocking(
+                self._run_scheduled_entries, file_hash, task_id, company_name
+            )
+            
+            # Calculate success/failure stats
+            success_count = summary.succeeded
+            error_count = summary.failed
+            
+            # Update task history
+            result_summary = summary.as_dict()
+            
+            await self._add_task_history(
+                task_id,
+                company_name,
+                'success' if error_count == 0 else 'partial' if success_count > 0 else 'failed',
+                result_summary,
+                duration_ms=(time_module.monotonic() - started) * 1000,
+                documents_posted=success_count
+            )
+            
+            error_logger.log_info(
+                f"Scheduled processing completed: {success_count} successful, {error_count} failed"
+            )
+            
+        except Exception as e:
+            await self._add_task_history(
+                task_id, company_name, 'failed', {'error': str(e)},
+                duration_ms=(time_module.monotonic() - started) * 1000,
+                documents_posted=0
+            )
+            error_logger.log_error(
+                'processing_errors',
+                f"Error in scheduled processing: {str(e)}",
+                {'file_hash': file_hash, 'task_id': task_id}
+            )
+
+class TaskScheduler(TaskRunner):
+    """Trigger scheduled tasks and run them on a dedicated event loop.
+    
+    APScheduler only fires triggers; each run is submitted as a coroutine to
+    the process event loop thread, claims the task's lease and runs as in
+    TaskRunner. With ``embedded_worker`` off no task jobs are registered and
+    standalone workers run the schedule; this process then only serves the UI
+    and housekeeping.
+    """
+    
+    def __init__(self, max_concurrent_jobs=MAX_CONCURRENT_JOBS, misfire_grace_time=MISFIRE_GRACE_SECONDS,
+                 coalesce=COALESCE_MISSED_RUNS, catchup=CATCHUP_MISSED_RUNS,
+                 catchup_spacing=CATCHUP_SPACING_SECONDS, rehydrate=True,
+                 embedded_worker=EMBEDDED_WORKER, lease_seconds=LEASE_SECONDS):
+        super().__init__(max_concurrent_jobs, misfire_grace_time, lease_seconds)
+        self.embedded_worker = embedded_worker
+        self.catchup = catchup
+        self.catchup_spacing = catchup_spacing
+        self.scheduler = BackgroundScheduler(job_defaults={
+            'misfire_grace_time': misfire_grace_time,
+            'coalesce': coalesce,
+            'max_instances': 1
+        })
         self.scheduler.start()
+        self.scheduler.add_job(
+            self._compact_history,
+            trigger='cron',
+            hour=0,
+            minute=15,
+            id='compact_history',
+            replace_existing=True
+        )
+        self.scheduler.add_job(
+            self._collect_blobs,
+            trigger='cron',
+            hour=0,
+            minute=30,
+            id='collect_blobs',
+            replace_existing=True
+        )
         error_logger.log_info("Task scheduler initialized")
+        if rehydrate:
+            self.rehydrate()
+    
+    def _add_task_job(self, task_id, company_name, file_hash, trigger, next_run_time=None, catchup_of=None):
+        """Register a task's job, replacing any existing one.
+        
+        ``catchup_of`` is the missed next_run a rehydrated job catches up on.
+        """
+        if not self.embedded_worker:
+            return None
+        job_args = {}
+        if next_run_time is not None:
+            job_args['next_run_time'] = next_run_time
+        if catchup_of is not None:
+            job_args['kwargs'] = {'catchup_of': catchup_of}
+        return self.scheduler.add_job(
+            self._dispatch_scheduled_file,
+            trigger=trigger,
+            args=[file_hash, task_id, company_name],
+            id=task_job_id(task_id, company_name),
+            replace_existing=True,
+            **job_args
+        )
+    
+    def rehydrate(self):
+        """Rebuild jobs for every active task from the database after a restart.
+        
+        Tasks whose next run is still ahead keep it, so nothing is reprocessed.
+        Runs missed during downtime are caught up once per task (however many
+        occurrences were missed) if within the misfire grace time, staggered
+        ``catchup_spacing`` seconds apart; older misses skip to the next occurrence.
+        """
+        if not self.embedded_worker:
+            error_logger.log_info("Embedded worker disabled; scheduled tasks run in standalone workers")
+            return {'restored': 0, 'caught_up': 0, 'skipped': 0}
+        try:
+            tasks = self.run(task_db.list_all_tasks(status='active'))
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error loading scheduled tasks for rehydration: {str(e)}"
+            )
+            return {'restored': 0, 'caught_up': 0, 'skipped': 0}
+            
+        now = datetime.now()
+        summary = {'restored': 0, 'caught_up': 0, 'skipped': 0}
+        for task in tasks:
+            if not task.get('file_hash') or not task.get('run_at'):
+                # Tasks scheduled before input files were persisted cannot run
+                task_db.write_buffer.update_task_status(
+                    task['id'], task['next_run'], 'missing_file', task['company_name']
+                )
+                continue
+            trigger = task_trigger(task)
+            next_run = datetime.strptime(task['next_run'][:19], '%Y-%m-%d %H:%M:%S')
+            catchup_of = None
+            if next_run <= now:
+                missed_by = (now - next_run).total_seconds()
+                if self.catchup and missed_by <= self.misfire_grace_time:
+                    next_run = now + timedelta(seconds=self.catchup_spacing * summary['caught_up'])
+                    catchup_of = task['next_run']
+                    summary['caught_up'] += 1
+                else:
+                    next_run = next_fire_time(trigger, now)
+                    # Written directly: claims and completed runs also write next_run directly,
+                    # so a later buffered flush could undo an advance made by a worker
+                    self.run(task_db.update_task_status(
+                        task['id'], next_run.strftime('%Y-%m-%d %H:%M:%S'), 'active', task['company_name']
+                    ))
+                    summary['skipped'] += 1
+            self._add_task_job(task['id'], task['company_name'], task['file_hash'], trigger, next_run,
+                               catchup_of)
+            summary['restored'] += 1
+            
+        error_logger.log_info(
+            f"Rehydrated {summary['restored']} scheduled tasks "
+            f"({summary['caught_up']} catching up, {summary['skipped']} skipped to next run)"
+        )
+        return summary
+    
+    def _dispatch_scheduled_file(self, file_hash, task_id, company_name, catchup_of=None):
+        """APScheduler job: hand the run to the event loop and return immediately"""
+        future = self.submit(self._process_scheduled_file(file_hash, task_id, company_name, catchup_of))
+        future.add_done_callback(self._log_job_failure)
     
     async def _save_task_to_db(self, task_data):
         """Save task to database"""
         return await task_db.add_task(task_data)
         
-    async def _update_task_status(self, task_id, next_run, status, company_name):
-        """Update task status in database"""
-        await task_db.update_task_status(task_id, next_run, status, company_name)
+    def _compact_history(self):
+        """Roll up closed periods of task history and prune expired raw rows"""
+        try:
+            summary = self.run(task_db.compact_history(HISTORY_RETENTION_DAYS))
+            error_logger.log_info(
+                f"Task history compacted: {summary['daily']} daily and {summary['monthly']} "
+                f"monthly rollups, {summary['pruned']} rows pruned"
+            )
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error compacting task history: {str(e)}"
+            )
         
-    async def _add_task_history(self, task_id, company_name, status, result=None):
-        """Add task execution history"""
-        await task_db.add_task_history(task_id, company_name, status, result)
+    def shutdown(self, wait=True, timeout=None):
+        """Stop triggering, let running jobs finish, then flush buffered task writes"""
+        self.scheduler.shutdown(wait=wait)
+        self.loop.stop(timeout)
+        # The last buffered writes are committed on the loop, which they restart
+        task_db.close()
+        self.loop.stop()
+        error_logger.log_info("Task scheduler shut down")
     
-    def schedule_task(self, time, file, company_name, frequency='daily', day_of_week=None, day_of_month=None):
-        """Schedule a task for recurring execution"""
+    def schedule_task(self, time, file, company_name, frequency='daily', day_of_week=None, day_of_month=None,
+                      spread_minutes=None):
+        """Schedule a task for recurring execution.
+        
+        With ``spread_minutes`` (or SIIGO_SPREAD_MINUTES) the task starts at a
+        fixed offset within that window after ``time``, derived from its id,
+        so tasks sharing a time do not all hit Siigo at once.
+        """
         try:
-            # Convert time to datetime
-            now = datetime.now()
-            schedule_time = datetime.combine(now.date(), time)
-            
-            # If the time has passed for today, schedule for next occurrence
-            if schedule_time <= now:
-                schedule_time += timedelta(days=1)
-            
-            trigger_args = {}
-            
-            if frequency == 'weekly' and day_of_week is not None:
-                trigger_args = {
-                    'trigger': 'cron',
-                    'day_of_week': day_of_week,
-                    'hour': time.hour,
-                    'minute': time.minute
-                }
-            elif frequency == 'monthly' and day_of_month is not None:
-                trigger_args = {
-                    'trigger': 'cron',
-                    'day': day_of_month,
-                    'hour': time.hour,
-                    'minute': time.minute
-                }
-            else:  # daily
-                trigger_args = {
-                    'trigger': 'interval',
-                    'days': 1,
-                    'start_date': schedule_time
-                }
+            schedule_time = next_fire_time(
+                build_trigger(frequency, time.hour, time.minute, day_of_week, day_of_month)
+            )
+            
+            # Persist the input so the job only needs to hold its content hash
+            file_hash = blob_store.put_file(file)
             
             task_data = {
                 'company_name': company_name,
                 'file': getattr(file, 'name', str(file)),
+                'file_hash': file_hash,
                 'frequency': frequency,
                 'next_run': schedule_time.strftime('%Y-%m-%d %H:%M:%S'),
                 'day_of_week': day_of_week,
-                'day_of_month': day_of_month
+                'day_of_month': day_of_month,
+                'run_at': time.strftime('%H:%M'),
+                'spread_minutes': spread_minutes
             }
             
             # Save to database
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            task_id = loop.run_until_complete(self._save_task_to_db(task_data))
+            task_id = self.run(self._save_task_to_db(task_data))
             
-            # Extract trigger type and create job
-            trigger = trigger_args.pop('trigger')
-            job = self.scheduler.add_job(
-                self._process_scheduled_file,
-                trigger=trigger,
-                **trigger_args,
-                args=[file, task_id, company_name]
-            )
-            # Set job_id after creation
-            job.id = str(task_id)
+            # The spread offset depends on the task id, so the first run is only known now
+            trigger = task_trigger({**task_data, 'id': task_id})
+            first_run = next_fire_time(trigger)
+            if first_run != schedule_time:
+                schedule_time = first_run
+                task_data['next_run'] = schedule_time.strftime('%Y-%m-%d %H:%M:%S')
+                self.run(task_db.update_task_status(task_id, task_data['next_run'], 'active', company_name))
+            
+            # Create the job under the task's id so it can be found again
+            self._add_task_job(task_id, company_name, file_hash, trigger, schedule_time)
             
             error_logger.log_info(
                 f"Task scheduled successfully for {schedule_time} with frequency {frequency}"
@@ -97,56 +484,66 @@ class TaskScheduler:
             )
             raise Exception(f"Error scheduling task: {str(e)}")
     
-    async def _process_scheduled_file(self, file, task_id, company_name):
-        """Process the scheduled file"""
-        try:
-            from main import process_entries
-            from utils.excel_processor import ExcelProcessor
-            
-            error_logger.log_info(f"Starting scheduled processing of file")
-            
-            processor = ExcelProcessor(file)
-            df = processor.read_excel()
-            results = process_entries(df)
-            
-            # Calculate success/failure stats
-            success_count = sum(1 for r in results if r['status'] == 'Success')
-            error_count = len(results) - success_count
-            
-            # Update task history
-            result_summary = {
-                'total': len(results),
-                'success': success_count,
-                'failed': error_count
-            }
+    async def _process_scheduled_file(self, file_hash, task_id, company_name, catchup_of=None):
+        """Once the work queue admits the run, claim the task's lease and run it.
+        
+        The claim fails if a standalone worker already holds the task or has
+        already advanced it past this occurrence; the run is then skipped. The
+        run is a catch-up only while the task is still due at ``catchup_of``;
+        the job keeps its arguments, so later occurrences are checked as usual.
+        """
+        async def claim_and_run():
+            task = await task_db.claim_task(task_id, company_name, self.worker_id, self.lease_seconds)
+            if task is None:
+                error_logger.log_info(f"Task {task_id} of {company_name} is claimed elsewhere or not due; skipping")
+                return
+            await self._run_leased_task(task, catch_up=catchup_of is not None and task['next_run'] == catchup_of)
             
-            await self._add_task_history(
-                task_id,
-                company_name,
-                'success' if error_count == 0 else 'partial' if success_count > 0 else 'failed',
-                result_summary
+        await self.work_queue.run(company_name, claim_and_run, priority=SCHEDULED)
+    
+    def _collect_blobs(self):
+        """Delete stored input files no longer referenced by any task"""
+        try:
+            referenced = self.run(task_db.get_referenced_file_hashes())
+            blob_store.collect_garbage(referenced)
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error collecting unreferenced blobs: {str(e)}"
             )
-            
-            # Update next run time
-            next_run = self.scheduler.get_job(str(task_id)).next_run_time
-            await self._update_task_status(
-                task_id,
-                next_run.strftime('%Y-%m-%d %H:%M:%S'),
-                'active',
-                company_name
+    
+    async def get_history_stats(self, company_name, granularity='daily', task_id=None,
+                                start_period=None, end_period=None):
+        """Get aggregated run statistics from the history rollups"""
+        try:
+            return await task_db.get_history_rollups(
+                company_name, granularity, task_id, start_period, end_period
             )
-            
-            error_logger.log_info(
-                f"Scheduled processing completed: {success_count} successful, {error_count} failed"
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error fetching history statistics: {str(e)}"
             )
-            
+            return []
+    
+    async def get_projected_load(self, hours=24, company_name=None):
+        """Get the projected number of scheduled runs per minute over the next ``hours``.
+        
+        With ``company_name`` only that company's tasks (and shard) are read;
+        without it the load of every company is projected, for admin views.
+        """
+        try:
+            if company_name:
+                tasks = await task_db.get_all_tasks(company_name, status='active')
+            else:
+                tasks = await task_db.list_all_tasks(status='active')
         except Exception as e:
-            await self._add_task_history(task_id, company_name, 'failed', {'error': str(e)})
             error_logger.log_error(
                 'processing_errors',
-                f"Error in scheduled processing: {str(e)}",
-                {'filename': getattr(file, 'name', 'unknown')}
+                f"Error projecting scheduled load: {str(e)}"
             )
+            return {}
+        return projected_load(tasks, hours=hours)
     
     async def get_scheduled_tasks(self, company_name):
         """Get list of all scheduled tasks with their details"""
@@ -180,7 +577,7 @@ class TaskScheduler:
                 
             # Remove from scheduler
             try:
-                self.scheduler.remove_job(str(task_id))
+                self.scheduler.remove_job(task_job_id(task_id, company_name))
             except JobLookupError:
                 error_logger.log_info(f"Job {task_id} not found in scheduler, continuing with database cleanup")
                 
@@ -195,20 +592,37 @@ class TaskScheduler:
             )
             raise Exception(f"Error cancelling task: {str(e)}")
 
-def init_scheduler():
-    """Initialize database with error handling"""
-    try:
-        # Initialize database
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(task_db.initialize())
-        error_logger.log_info("Database initialized successfully")
-    except Exception as e:
-        error_logger.log_error(
-            'processing_errors',
-            f"Error initializing database: {str(e)}"
-        )
-        raise
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Get the process-wide TaskScheduler, creating it on first use.
+    
+    Every Streamlit session shares this instance, so each job is registered
+    and run exactly once per process. It is shut down at interpreter exit.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            try:
+                get_event_loop_thread().run(task_db.initialize())
+                error_logger.log_info("Database initialized successfully")
+            except Exception as e:
+                error_logger.log_error(
+                    'processing_errors',
+                    f"Error initializing database: {str(e)}"
+                )
+                raise
+            _scheduler = TaskScheduler()
+            atexit.register(shutdown_scheduler)
+            start_exporters()
+        return _scheduler
 
-# Initialize scheduler and database
-init_scheduler()
+def shutdown_scheduler(timeout=30):
+    """Shut down the process-wide scheduler, if it was started"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            return
+        scheduler, _scheduler = _scheduler, None
+    scheduler.shutdown(timeout=timeout)
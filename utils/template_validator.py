@@ -1,7 +1,10 @@
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from utils.logger import error_logger
+from utils.metrics import ROWS_VALIDATED, VALIDATE_SECONDS
+from utils.tracing import traced
 
 class TemplateValidator:
     def __init__(self):
@@ -19,9 +22,11 @@ class TemplateValidator:
             'observations': {'type': 'string', 'max_length': 500}
         }
         
+    @traced()
     def validate_template(self, df):
         """Validate the Excel template structure and data"""
         errors = []
+        started = time.perf_counter()
         
         try:
             # Check template structure
@@ -53,7 +58,45 @@ class TemplateValidator:
                 {'template_version': self.template_version}
             )
             raise
+        finally:
+            self._count_validated(df, started)
             
+    def validate_columns(self, df):
+        """Validate only the column layout, before rows are checked document by document"""
+        errors = []
+        self._validate_columns(df, errors)
+        if errors:
+            error_logger.log_error(
+                'validation_errors',
+                "Template validation failed",
+                {'errors': errors}
+            )
+            raise ValueError("\n".join(errors))
+        return True
+        
+    @traced()
+    def validate_document(self, df_group):
+        """Validate the rows of a single document (formats and business rules)"""
+        errors = []
+        started = time.perf_counter()
+        self._validate_data_formats(df_group, errors)
+        self._validate_business_rules(df_group, errors)
+        self._count_validated(df_group, started)
+        if errors:
+            error_logger.log_error(
+                'validation_errors',
+                "Document validation failed",
+                {'document_id': str(df_group['document_id'].iloc[0]), 'errors': errors}
+            )
+            raise ValueError("\n".join(errors))
+        return True
+            
+    @staticmethod
+    def _count_validated(df, started):
+        """Add to the validation throughput metrics"""
+        VALIDATE_SECONDS.inc(time.perf_counter() - started)
+        ROWS_VALIDATED.inc(len(df))
+        
     def _validate_columns(self, df, errors):
         """Validate template columns"""
         # Check required columns
@@ -0,0 +1,205 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Dict, List, Optional
+
+# Fraction of runs traced; 0 turns tracing off
+TRACE_SAMPLE_RATE = float(os.getenv('SIIGO_TRACE_SAMPLE_RATE', '0'))
+# Directory sampled traces are written to, one Chrome trace file per run
+TRACE_DIR = os.getenv('SIIGO_TRACE_DIR', 'traces')
+# Spans kept per trace; later spans of a very large run are dropped
+TRACE_MAX_SPANS = int(os.getenv('SIIGO_TRACE_MAX_SPANS', '100000'))
+
+_current_span = contextvars.ContextVar('siigo_current_span', default=None)
+_NOT_TRACED = nullcontext()
+
+class Trace:
+    """Spans of one sampled run"""
+
+    def __init__(self, name: str, max_spans: int = TRACE_MAX_SPANS):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.max_spans = max_spans
+        self.spans: List['Span'] = []
+        self.dropped = 0
+        # Span times are perf_counter readings; anchor them to wall-clock microseconds
+        self._epoch_us = time.time() * 1e6 - time.perf_counter() * 1e6
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _add(self, span: 'Span') -> bool:
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return False
+            self._next_id += 1
+            span.span_id = self._next_id
+            self.spans.append(span)
+            return True
+
+    def to_chrome(self) -> Dict:
+        """The trace in Chrome's Trace Event format (chrome://tracing, Perfetto, speedscope)"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = []
+        threads = {}
+        for span in spans:
+            threads.setdefault(span.thread_id, span.thread_name)
+            end = span.end if span.end is not None else time.perf_counter()
+            events.append({
+                'name': span.name,
+                'cat': 'siigo',
+                'ph': 'X',
+                'ts': round(self._epoch_us + span.start * 1e6, 3),
+                'dur': round((end - span.start) * 1e6, 3),
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': {'trace_id': self.trace_id, 'span_id': span.span_id,
+                         'parent_id': span.parent_id, **span.attributes}
+            })
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                   for tid, name in threads.items()]
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.trace_id, 'name': self.name, 'dropped_spans': self.dropped}
+        }
+
+class Span:
+    """A timed operation within a trace; nests under its parent"""
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[int] = None, **attributes):
+        self.trace = trace
+        self.name = name
+        self.parent_id = parent_id
+        self.span_id = None
+        self.attributes = attributes
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.start = time.perf_counter()
+        self.end = None
+        self.recorded = trace._add(self)
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+
+class _ActiveSpan:
+    """Context manager running a span as the current one of this thread"""
+
+    def __init__(self, tracer: 'Tracer', span: Span, root: bool = False, finish: bool = True):
+        self.tracer = tracer
+        self.span = span
+        self.root = root
+        self.finish = finish
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.span.set(error=f"{exc_type.__name__}: {exc}")
+        if self.finish:
+            self.span.finish()
+        _current_span.reset(self._token)
+        if self.root:
+            self.tracer.export(self.span.trace)
+        return False
+
+class Tracer:
+    """Sampled, per-run tracing.
+
+    trace() decides once per run whether it is sampled. Unsampled runs, and
+    code running outside any run, get a shared no-op context from span(), so
+    instrumented code costs one context variable lookup. Threads do not
+    inherit the current span: work handed to another thread carries its span
+    along and either names it as ``parent`` or makes it current with use().
+    """
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, trace_dir: Optional[str] = TRACE_DIR):
+        self.sample_rate = sample_rate
+        self.trace_dir = trace_dir
+
+    def trace(self, name: str, **attributes):
+        """Start a root span for a run if it is sampled; yields the span or None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return _NOT_TRACED
+        return _ActiveSpan(self, Span(Trace(name), name, **attributes), root=True)
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes):
+        """Child span of ``parent`` (default: the current span); a no-op outside a sampled run"""
+        parent = parent or _current_span.get()
+        if parent is None:
+            return _NOT_TRACED
+        return _ActiveSpan(self, Span(parent.trace, name, parent.span_id, **attributes))
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Optional[Span]:
+        """Span left open past a ``with`` block (e.g. a document crossing pipeline threads); call finish()"""
+        parent = parent or _current_span.get()
+        if parent is None:
+            return None
+        return Span(parent.trace, name, parent.span_id, **attributes)
+
+    def use(self, span: Optional[Span]):
+        """Make an existing span current in this thread, e.g. after handing work to another thread"""
+        if span is None:
+            return _NOT_TRACED
+        return _ActiveSpan(self, span, finish=False)
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    def export(self, trace: Trace) -> Optional[str]:
+        """Write ``trace`` to ``<trace_dir>/<trace_id>.json``"""
+        if not self.trace_dir:
+            return None
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            path = os.path.join(self.trace_dir, f"{trace.trace_id}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(trace.to_chrome(), f, default=str)
+            return path
+        except Exception as e:
+            logging.getLogger('siigo_journal_processor').error(
+                f"processing_errors: Error writing trace {trace.trace_id}: {str(e)}"
+            )
+            return None
+
+def traced(name: Optional[str] = None):
+    """Decorator running the function in a span of the current trace"""
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+# Initialize global tracer instance
+tracer = Tracer()
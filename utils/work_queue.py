@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+from utils.metrics import QUEUE_DEPTH, RUNNING
+
+# Priority classes; lower runs first
+INTERACTIVE = 0
+SCHEDULED = 1
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', SCHEDULED: 'scheduled'}
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Parse 'CompanyA=2,CompanyB=0.5' into a weight per company"""
+    weights = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            company, weight = part.rsplit('=', 1)
+            weights[company.strip()] = float(weight)
+    return weights
+
+class _WorkItem:
+    __slots__ = ('company_name', 'priority', 'enqueued_at', 'admitted')
+
+    def __init__(self, company_name: str, priority: int, admitted: asyncio.Future):
+        self.company_name = company_name
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.admitted = admitted
+
+class FairWorkQueue:
+    """Admit work across companies fairly, within concurrency caps.
+
+    At most ``max_concurrency`` items run at once, and at most
+    ``per_company_limit`` per company. Among companies with admissible work,
+    the highest priority class goes first (interactive before scheduled),
+    then the company with the lowest virtual time. Each admission advances a
+    company's virtual time by ``1 / weight``, so a company with weight 2 gets
+    twice the share of one with weight 1 while both have work queued, and a
+    company that was idle cannot bank credit.
+
+    All methods must be called on the event loop that runs the work.
+    """
+
+    def __init__(self, max_concurrency: int = 4, per_company_limit: Optional[int] = None,
+                 weights: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max_concurrency
+        self.per_company_limit = per_company_limit or int(os.getenv('SIIGO_COMPANY_CONCURRENCY', '1'))
+        self.weights = weights if weights is not None else parse_weights(os.getenv('SIIGO_COMPANY_WEIGHTS'))
+        self._queues: Dict[str, Dict[int, deque]] = {}
+        self._running: Dict[str, int] = {}
+        self._virtual_time: Dict[str, float] = {}
+        self._virtual_clock = 0.0
+        self._admitted: Dict[str, int] = {}
+        self._total_wait: Dict[str, float] = {}
+        self._max_wait: Dict[str, float] = {}
+
+    def _weight(self, company_name: str) -> float:
+        return self.weights.get(company_name, 1.0)
+
+    async def run(self, company_name: str, work: Callable[[], Awaitable], priority: int = SCHEDULED):
+        """Wait for a slot, then await ``work()`` and return its result"""
+        item = _WorkItem(company_name, priority, asyncio.get_running_loop().create_future())
+        queues = self._queues.setdefault(company_name, {})
+        if not any(queues.values()) and not self._running.get(company_name):
+            # A company becoming active starts at the current clock, not with saved-up credit
+            self._virtual_time[company_name] = max(
+                self._virtual_time.get(company_name, 0.0), self._virtual_clock
+            )
+        queues.setdefault(priority, deque()).append(item)
+        self._dispatch()
+        try:
+            await item.admitted
+        except asyncio.CancelledError:
+            if item in queues[priority]:
+                queues[priority].remove(item)
+            elif not item.admitted.cancelled():
+                # Admitted just before the cancellation landed: give the slot back
+                self._release(company_name)
+            raise
+        try:
+            return await work()
+        finally:
+            self._release(company_name)
+
+    def _release(self, company_name: str):
+        self._running[company_name] -= 1
+        self._dispatch()
+
+    def _next_item(self) -> Optional[_WorkItem]:
+        best = None
+        for company_name, queues in self._queues.items():
+            if self._running.get(company_name, 0) >= self.per_company_limit:
+                continue
+            for priority in sorted(queues):
+                if queues[priority]:
+                    key = (priority, self._virtual_time.get(company_name, 0.0),
+                           queues[priority][0].enqueued_at)
+                    if best is None or key < best[0]:
+                        best = (key, queues[priority])
+                    break
+        return best[1].popleft() if best else None
+
+    def _dispatch(self):
+        while sum(self._running.values()) < self.max_concurrency:
+            item = self._next_item()
+            if item is None:
+                break
+            if item.admitted.done():
+                # Waiter was cancelled while queued
+                continue
+            company_name = item.company_name
+            self._running[company_name] = self._running.get(company_name, 0) + 1
+            self._virtual_clock = self._virtual_time.get(company_name, 0.0)
+            self._virtual_time[company_name] = self._virtual_clock + 1.0 / self._weight(company_name)
+            waited = time.monotonic() - item.enqueued_at
+            self._admitted[company_name] = self._admitted.get(company_name, 0) + 1
+            self._total_wait[company_name] = self._total_wait.get(company_name, 0.0) + waited
+            self._max_wait[company_name] = max(self._max_wait.get(company_name, 0.0), waited)
+            item.admitted.set_result(None)
+        self._record_depth()
+
+    def _record_depth(self):
+        QUEUE_DEPTH.set(sum(len(q) for queues in self._queues.values() for q in queues.values()),
+                        queue='work-queue')
+        RUNNING.set(sum(self._running.values()))
+
+    def stats(self, company_name: Optional[str] = None) -> Dict[str, Dict]:
+        """Queue depth, running count and wait times per company"""
+        now = time.monotonic()
+        companies = [company_name] if company_name else sorted(
+            set(self._queues) | set(self._running) | set(self._admitted)
+        )
+        stats = {}
+        for company in companies:
+            queues = self._queues.get(company, {})
+            waiting = [item for queue in queues.values() for item in queue]
+            admitted = self._admitted.get(company, 0)
+            stats[company] = {
+                'queued': {PRIORITY_NAMES.get(p, str(p)): len(q) for p, q in sorted(queues.items())},
+                'running': self._running.get(company, 0),
+                'admitted': admitted,
+                'avg_wait_seconds': self._total_wait.get(company, 0.0) / admitted if admitted else 0.0,
+                'max_wait_seconds': self._max_wait.get(company, 0.0),
+                'oldest_queued_seconds': max((now - item.enqueued_at for item in waiting), default=0.0),
+            }
+        return stats
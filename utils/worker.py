@@ -0,0 +1,149 @@
+import asyncio
+import os
+import signal
+from utils.logger import error_logger
+from utils.database import task_db
+from utils.metrics import start_exporters
+from utils.scheduler import TaskRunner, MAX_CONCURRENT_JOBS, MISFIRE_GRACE_SECONDS, LEASE_SECONDS
+from utils.work_queue import SCHEDULED
+
+# Seconds between polls for due tasks while the worker has free slots
+POLL_INTERVAL_SECONDS = float(os.getenv('SIIGO_WORKER_POLL_SECONDS', '5'))
+
+class TaskWorker(TaskRunner):
+    """Headless worker that drains due scheduled tasks from the shared database.
+
+    Any number of workers, on one or more hosts, can point at the same
+    database (and blob directory). Each poll lists due, unleased tasks and
+    queues at most as many as the worker has free slots; a task is only
+    leased once the work queue admits it, and skipped if another worker
+    claimed it first. The lease is renewed while the task runs and released
+    when the task is advanced to its next run, so every occurrence runs once.
+    If a worker dies its leases expire and another worker picks the tasks up
+    again.
+    """
+
+    def __init__(self, max_concurrent_jobs=MAX_CONCURRENT_JOBS, misfire_grace_time=MISFIRE_GRACE_SECONDS,
+                 lease_seconds=LEASE_SECONDS, worker_id=None, poll_interval=POLL_INTERVAL_SECONDS):
+        super().__init__(max_concurrent_jobs, misfire_grace_time, lease_seconds, worker_id)
+        self.poll_interval = poll_interval
+        self._in_flight = set()
+        self._in_flight_keys = set()
+        self._stopping = None
+        self._wake = None
+
+    async def poll_once(self):
+        """Queue due tasks up to the free capacity; returns how many were queued.
+        
+        A task is only leased once the work queue admits it, so a task waiting
+        for a slot here (e.g. behind another run of its company) holds no lease
+        that could expire, and another worker with a free slot may take it.
+        """
+        free = self.max_concurrent_jobs - len(self._in_flight)
+        if free <= 0:
+            return 0
+        try:
+            tasks = await task_db.get_due_tasks(free + len(self._in_flight_keys))
+        except Exception as e:
+            error_logger.log_error(
+                'processing_errors',
+                f"Error polling due tasks: {str(e)}",
+                {'worker_id': self.worker_id}
+            )
+            return 0
+        tasks = [task for task in tasks if (task['company_name'], task['id']) not in self._in_flight_keys][:free]
+        for task in tasks:
+            key = (task['company_name'], task['id'])
+            run = asyncio.create_task(self.work_queue.run(
+                task['company_name'], lambda task=task: self._claim_and_run(task), priority=SCHEDULED
+            ))
+            self._in_flight_keys.add(key)
+            self._in_flight.add(run)
+            run.add_done_callback(lambda run, key=key: self._in_flight_keys.discard(key))
+            run.add_done_callback(self._finished)
+        return len(tasks)
+        
+    async def _claim_and_run(self, task):
+        """Lease an admitted task and run it; skipped if another worker got it first"""
+        claimed = await task_db.claim_task(task['id'], task['company_name'], self.worker_id, self.lease_seconds)
+        if claimed is None:
+            error_logger.log_info(
+                f"Task {task['id']} of {task['company_name']} was claimed elsewhere or is no longer due; skipping"
+            )
+            return
+        await self._run_leased_task(claimed)
+        
+    def _finished(self, run):
+        self._in_flight.discard(run)
+        self._log_job_failure(run)
+        if self._wake is not None:
+            # A slot freed up: poll again now instead of after the interval
+            self._wake.set()
+
+    async def serve(self, once=False):
+        """Poll and run due tasks until stop() is called, then wait for running tasks"""
+        self._stopping = asyncio.Event()
+        self._wake = asyncio.Event()
+        error_logger.log_info(f"Worker {self.worker_id} started with {self.max_concurrent_jobs} slots")
+        while not self._stopping.is_set():
+            self._wake.clear()
+            await self.poll_once()
+            if once:
+                break
+            waiters = [asyncio.create_task(self._stopping.wait()), asyncio.create_task(self._wake.wait())]
+            await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+        if self._in_flight:
+            await asyncio.wait(list(self._in_flight))
+        error_logger.log_info(f"Worker {self.worker_id} stopped")
+
+    def stop(self):
+        """Stop claiming new tasks; safe to call from any thread or a signal handler"""
+        if self._stopping is not None:
+            self.loop.loop.call_soon_threadsafe(self._stopping.set)
+
+    def shutdown(self, timeout=None):
+        """Stop the event loop and flush buffered task writes"""
+        self.loop.stop(timeout)
+        # The last buffered writes are committed on the loop, which they restart
+        task_db.close()
+        self.loop.stop()
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run scheduled tasks from the shared task database")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_JOBS,
+                        help="Tasks run at once by this worker")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL_SECONDS,
+                        help="Seconds between polls for due tasks")
+    parser.add_argument('--lease-seconds', type=int, default=LEASE_SECONDS,
+                        help="Lease length; a crashed worker's tasks are retried after this")
+    parser.add_argument('--worker-id', help="Lease owner id (defaults to host:pid)")
+    parser.add_argument('--once', action='store_true', help="Claim due tasks once, run them and exit")
+    args = parser.parse_args(argv)
+
+    worker = TaskWorker(
+        max_concurrent_jobs=args.concurrency,
+        lease_seconds=args.lease_seconds,
+        worker_id=args.worker_id,
+        poll_interval=args.poll_interval
+    )
+    worker.run(task_db.initialize())
+    start_exporters()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    future = worker.submit(worker.serve(once=args.once))
+    try:
+        # Wait in short slices so signal handlers run on the main thread
+        while not future.done():
+            try:
+                future.result(timeout=1)
+            except TimeoutError:
+                continue
+    finally:
+        worker.shutdown()
+
+if __name__ == '__main__':
+    main()